@@ -0,0 +1,76 @@
+"""
+Administrative commands that run outside the web server.
+
+Usage (from the backend directory)::
+
+    python -m app.cli semester-rollover --department "Computer Science" --semester 3 --advance-by 1
+    python -m app.cli semester-rollover --set-to 1 --semester 12 --dry-run
+    python -m app.cli migrate
+"""
+import argparse
+import asyncio
+import sys
+
+from pydantic import ValidationError
+
+from app.db.database import AsyncSessionLocal, dispose_db_engine, engine, create_missing_indexes
+from app.db.migrations import run_migrations
+from app.crud import crud_student
+from app.schemas.student import SemesterRolloverRequest
+
+
+async def _semester_rollover(args: argparse.Namespace) -> int:
+    try:
+        rollover = SemesterRolloverRequest(
+            department=args.department, semester=args.semester,
+            advance_by=args.advance_by, set_to=args.set_to, dry_run=args.dry_run
+        )
+    except ValidationError as e:
+        print(f"Invalid arguments: {e}", file=sys.stderr)
+        return 2
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await crud_student.rollover_semesters(db, rollover)
+    finally:
+        await dispose_db_engine()
+    prefix = "[dry run] " if result.dry_run else ""
+    print(f"{prefix}matched={result.matched} updated={result.updated} skipped_at_max={result.skipped_at_max}")
+    return 0
+
+
+async def _migrate(args: argparse.Namespace) -> int:
+    try:
+        async with engine.begin() as conn:
+            applied = await conn.run_sync(run_migrations)
+        await create_missing_indexes() # E.g. the GIN index on a column that was just added
+    finally:
+        await dispose_db_engine()
+    print(f"applied={','.join(applied) or 'none'}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Library management admin commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollover = commands.add_parser("semester-rollover", help="Advance or set the semester of a cohort of students")
+    rollover.add_argument("--department", help="Only this department (case-insensitive)")
+    rollover.add_argument("--semester", type=int, help="Only students currently in this semester")
+    operation = rollover.add_mutually_exclusive_group(required=True)
+    operation.add_argument("--advance-by", type=int, help="Add this many semesters")
+    operation.add_argument("--set-to", type=int, help="Set the semester to this value")
+    rollover.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    rollover.set_defaults(handler=_semester_rollover)
+
+    migrate = commands.add_parser("migrate", help="Apply the schema changes too heavy for startup (see app/db/migrations.py)")
+    migrate.set_defaults(handler=_migrate)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
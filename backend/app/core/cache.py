@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Hit/miss bookkeeping for a cache instance."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class TTLCache:
+    """
+    Bounded in-process mapping with LRU eviction and a per-entry time-to-live.
+
+    Meant for the single event loop of one worker; it does no locking of its own.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.stats = CacheStats()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.stats.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the stored value without touching LRU order, expiry or the stats."""
+        entry = self._entries.get(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        if self._entries.pop(key, _MISSING) is _MISSING:
+            return False
+        self.stats.invalidations += 1
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def keys(self) -> list[Hashable]:
+        """Snapshot of the stored keys, expired ones included."""
+        return list(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key, _MISSING)
+        return entry is not _MISSING and entry[0] > self._clock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Snapshot:
+    """
+    One expensive value (e.g. dashboard figures) kept in memory and refreshed by a single caller at a time.
+
+    A caller whose freshness bound is not met starts the refresh; callers arriving while it runs
+    with the default bound get the current, slightly older value instead of running the same
+    computation again. Callers that asked for a bound of their own (e.g. max_age=0) and callers
+    finding no value yet wait for that refresh instead. The loader runs in a task of its own,
+    which outlives a cancelled caller, so it must not use anything scoped to the caller (such as
+    a request's database session). Like TTLCache it belongs to one worker's event loop.
+    """
+
+    def __init__(self, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._value: Any = _MISSING
+        self._loaded_at = 0.0
+        self._refresh: asyncio.Task | None = None
+        self.stats = CacheStats()
+
+    def age(self) -> float | None:
+        return None if self._value is _MISSING else self._clock() - self._loaded_at
+
+    async def get(self, loader: Callable[[], Awaitable[Any]], max_age: float | None = None) -> tuple[Any, float]:
+        """Return ``(value, age in seconds)``, calling `loader` only when the value is older than max_age (default: the TTL)."""
+        stale_ok = max_age is None
+        max_age = self.ttl_seconds if max_age is None else max_age
+        age = self.age()
+        if age is not None and age <= max_age:
+            self.stats.hits += 1
+            return self._value, age
+        if self._refresh is not None:
+            if age is not None and stale_ok:
+                self.stats.hits += 1 # Someone is already refreshing; serve what we have
+                return self._value, age
+            return await asyncio.shield(self._refresh), 0.0
+        self.stats.misses += 1
+        # A task of its own: cancelling the caller that started it (client gone) must not fail the waiters
+        self._refresh = asyncio.ensure_future(self._load(loader))
+        return await asyncio.shield(self._refresh), 0.0
+
+    async def _load(self, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self._value, self._loaded_at = value, self._clock()
+            return value
+        finally:
+            self._refresh = None
+
+    def clear(self) -> None:
+        self._value = _MISSING
+
+
+class InvalidationBus(ABC):
+    """
+    Fan-out channel used by per-worker caches to tell each other which keys went stale.
+
+    Each worker process keeps its own cache, so a write handled by one worker must reach the
+    others. A production deployment plugs in a shared transport (Redis pub/sub, PostgreSQL
+    LISTEN/NOTIFY, ...) by implementing `publish` and `subscribe`.
+    """
+
+    @abstractmethod
+    def publish(self, channel: str, message: dict) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[dict], None]) -> None:
+        ...
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """In-process stand-in for a pub/sub bus: delivers every message to all subscribers synchronously."""
+
+    def __init__(self):
+        self._subscribers: dict[str, list[Callable[[dict], None]]] = {}
+
+    def publish(self, channel: str, message: dict) -> None:
+        for callback in list(self._subscribers.get(channel, [])):
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Invalidation subscriber failed on channel '{channel}': {e}", exc_info=True)
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]) -> None:
+        self._subscribers.setdefault(channel, []).append(callback)
+
+
+def create_invalidation_bus(backend: str) -> InvalidationBus:
+    """Build the invalidation bus named by the CACHE_INVALIDATION_BUS setting."""
+    if backend == "local":
+        return LocalInvalidationBus()
+    raise ValueError(f"Unknown cache invalidation bus backend '{backend}'")
@@ -58,6 +58,26 @@ class Settings(BaseSettings):
     DUE_SOON_WINDOW_DAYS: int = Field(default=5)  # Start sending reminders 5 days before due date
     REMINDER_JOB_HOUR: int = Field(default=9)     # Run reminder check at 9 AM UTC
 
+    # Catalog cache settings
+    BOOK_CACHE_MAX_ENTRIES: int = Field(default=10000)
+    BOOK_CACHE_TTL_SECONDS: float = Field(default=300)
+    CACHE_INVALIDATION_BUS: str = Field(default="local")  # Transport shared by the worker caches
+    STUDENT_LOOKUP_CACHE_MAX_ENTRIES: int = Field(default=4096)  # identifier -> student id
+    STUDENT_LOOKUP_CACHE_TTL_SECONDS: float = Field(default=600)
+    STATS_SNAPSHOT_TTL_SECONDS: float = Field(default=30)  # Freshness of /stats/collection unless max_age says otherwise
+    CIRCULATION_ROLLUP_MAX_DAYS: int = Field(default=90)  # Days the rollup job aggregates per run (bounds the first backfill)
+    LIVE_COUNTER_SHARDS: int = Field(default=8)  # Rows per library total that concurrent writers spread their updates over
+    LIVE_COUNTER_RECONCILE_MINUTES: float = Field(default=15)  # How often the totals are checked against COUNT(*)
+
+    # Idempotency-Key support for issue/return mutations
+    IDEMPOTENCY_STORE: str = Field(default="memory")  # "memory" (per worker LRU) or "database" (shared table)
+    IDEMPOTENCY_MAX_ENTRIES: int = Field(default=10000)  # Bound of the in-memory store
+    IDEMPOTENCY_TTL_SECONDS: float = Field(default=86400)  # How long a key is remembered
+
+    # Sharded availability counters (PostgreSQL only, opt-in); 1 keeps every claim on the books row
+    AVAILABILITY_SLOTS: int = Field(default=1)  # Counter slots per book that concurrent issues spread over, e.g. 8 during exam-season rushes
+    AVAILABILITY_SYNC_SECONDS: float = Field(default=5)  # How often slot totals are folded into books.num_copies_available
+
     # AI Assistant settings
     GEMINI_API_KEY: str | None = Field(default="YOUR_GEMINI_API_KEY_HERE")
 
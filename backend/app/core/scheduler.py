@@ -7,12 +7,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.db.session import AsyncSessionLocal
+from app.db.utils import single_worker
 from app.services.email_service import (
     send_overdue_reminder_email,
     send_due_soon_reminder_email,
     email_service_conf
 )
-from app.crud import crud_book_issue
+from app.crud import crud_book_issue, availability, counters
+from app.services.idempotency import idempotency_store, DatabaseIdempotencyStore
+from app.services.circulation_rollup import refresh_circulation_rollup
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +67,59 @@ async def check_due_dates_and_send_reminders():
         finally:
             await db.close()
 
+async def purge_expired_idempotency_keys():
+    """Delete stored Idempotency-Key responses older than IDEMPOTENCY_TTL_SECONDS."""
+    async with AsyncSessionLocal() as db:
+        try:
+            purged = await idempotency_store.purge_expired(db)
+            if purged:
+                logger.info(f"Purged {purged} expired idempotency keys.")
+        except Exception as e:
+            logger.error(f"Error during idempotency key purge job: {e}", exc_info=True)
+
+async def sync_available_copies(full: bool = False):
+    """Fold availability slot totals into books.num_copies_available (changed books, or all when full)."""
+    async with AsyncSessionLocal() as db:
+        try:
+            if full:
+                changed = await availability.sync_available_copies(db)
+            else:
+                changed = await availability.sync_dirty_available_copies(db)
+            if changed:
+                logger.debug(f"Synced available copies of {changed} books.")
+        except Exception as e:
+            logger.error(f"Error during availability sync job: {e}", exc_info=True)
+
+async def retire_availability_slots():
+    """Fold slots left from a run with AVAILABILITY_SLOTS > 1 back into the books rows."""
+    async with AsyncSessionLocal() as db:
+        try:
+            folded = await availability.retire_slots(db)
+            if folded:
+                logger.info(f"Availability slots are off; folded the slots of {folded} books back into the books rows.")
+        except Exception as e:
+            logger.error(f"Error while retiring availability slots: {e}", exc_info=True)
+
+async def roll_up_circulation():
+    """Extend the daily circulation rollup through yesterday (one worker at a time)."""
+    async with single_worker(AsyncSessionLocal, "circulation_rollup") as leader, AsyncSessionLocal() as db:
+        if not leader:
+            return
+        try:
+            await refresh_circulation_rollup(db)
+        except Exception as e:
+            logger.error(f"Error during circulation rollup job: {e}", exc_info=True)
+
+async def reconcile_library_counters():
+    """Check the live library totals against COUNT(*) and correct any drift (one worker at a time)."""
+    async with single_worker(AsyncSessionLocal, "library_counter_reconcile") as leader, AsyncSessionLocal() as db:
+        if not leader:
+            return
+        try:
+            await counters.reconcile_counters(db)
+        except Exception as e:
+            logger.error(f"Error during library counter reconciliation: {e}", exc_info=True)
+
 def initialize_scheduler():
     """Initialize and start the scheduler with the daily reminder job."""
     if not scheduler.get_job("daily_reminder_check"):
@@ -81,6 +137,62 @@ def initialize_scheduler():
             logger.info("Scheduled daily reminder job to run at 10 AM IST (04:30 UTC).")
         else:
             logger.warning("Mail server settings not configured. Email reminders will not be sent.")
+
+    if isinstance(idempotency_store, DatabaseIdempotencyStore) and not scheduler.get_job("idempotency_key_purge"):
+        scheduler.add_job(
+            purge_expired_idempotency_keys,
+            'interval',
+            hours=1,
+            id="idempotency_key_purge",
+            replace_existing=True
+        )
+        logger.info("Scheduled hourly purge of expired idempotency keys.")
+
+    if not scheduler.get_job("circulation_rollup"):
+        # Hourly, so a closed day is rolled up soon after midnight UTC; runs that find nothing new are one query
+        scheduler.add_job(
+            roll_up_circulation,
+            'interval',
+            hours=1,
+            next_run_time=datetime.now(timezone.utc),
+            id="circulation_rollup",
+            replace_existing=True
+        )
+        logger.info("Scheduled hourly circulation rollup.")
+
+    if not scheduler.get_job("library_counter_reconcile"):
+        # The first run (right away) initializes the counters; workers that find another one reconciling skip the run
+        scheduler.add_job(
+            reconcile_library_counters,
+            'interval',
+            minutes=settings.LIVE_COUNTER_RECONCILE_MINUTES,
+            next_run_time=datetime.now(timezone.utc),
+            id="library_counter_reconcile",
+            replace_existing=True
+        )
+        logger.info(f"Scheduled library counter reconciliation every {settings.LIVE_COUNTER_RECONCILE_MINUTES} minutes.")
+
+    if settings.AVAILABILITY_SLOTS > 1 and not scheduler.get_job("availability_sync"):
+        scheduler.add_job(
+            sync_available_copies,
+            'interval',
+            seconds=settings.AVAILABILITY_SYNC_SECONDS,
+            id="availability_sync",
+            replace_existing=True
+        )
+        # Catches books changed by workers that stopped before their next sync, also right at startup
+        scheduler.add_job(
+            sync_available_copies,
+            'interval',
+            hours=1,
+            next_run_time=datetime.now(timezone.utc),
+            kwargs={"full": True},
+            id="availability_full_sync",
+            replace_existing=True
+        )
+        logger.info(f"Scheduled availability sync every {settings.AVAILABILITY_SYNC_SECONDS} seconds.")
+    elif settings.AVAILABILITY_SLOTS <= 1 and not scheduler.get_job("availability_retire"):
+        scheduler.add_job(retire_availability_slots, 'date', run_date=datetime.now(timezone.utc), id="availability_retire")
     
     if not scheduler.running:
         try:
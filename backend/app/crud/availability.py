@@ -0,0 +1,300 @@
+"""
+Available-copy accounting that does not serialize concurrent issues of the same book.
+
+With a single counter on the books row, every desk issuing a popular textbook queues on that
+row's lock. That is the default (``AVAILABILITY_SLOTS = 1``): issues and returns are the
+single-statement conditional UPDATE / CTE paths and ``books.num_copies_available`` is always
+exact. Deployments that see that queue can opt in by setting ``AVAILABILITY_SLOTS`` above 1;
+on PostgreSQL a book's available copies are then split over that many rows of
+``book_copy_slots``: an issue claims a copy from a random slot that has one, skipping slots
+other transactions hold locked (``FOR UPDATE SKIP LOCKED``), so up to that many issues proceed
+in parallel. A slot never goes below zero, so copies are never
+handed out twice.
+
+A book gets its slots the first time a copy is claimed or returned; until then the books row
+counter is the only figure. After that the slots are authoritative and
+``books.num_copies_available`` is a mirror, refreshed by `sync_available_copies` (a scheduler
+job) for the books this worker touched, and for every book with slots at startup and hourly,
+which also covers books left unsynced by a worker that stopped. Code that must be exact reads
+`available_copies`.
+
+Other databases (SQLite in tests) keep updating the books row directly.
+"""
+import logging
+import random
+from typing import Callable, Iterable, Mapping
+
+from sqlalchemy import select, insert, delete, func, case, tuple_, values, column, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.db.utils import is_postgres
+from app.models.book import Book
+from app.models.book_copy_slot import BookCopySlot
+from app.services.catalog_cache import book_cache
+
+logger = logging.getLogger(__name__)
+
+# Books whose slots changed in this worker since the last sync
+_dirty_books: set[int] = set()
+
+
+def slots_enabled(db: AsyncSession) -> bool:
+    return settings.AVAILABILITY_SLOTS > 1 and is_postgres(db)
+
+
+def available_copies(db: AsyncSession):
+    """Live available-copies expression for a query over Book: the slot total once the book has slots."""
+    if not slots_enabled(db):
+        return Book.num_copies_available
+    slot_total = select(func.sum(BookCopySlot.available)).where(BookCopySlot.book_id == Book.id).scalar_subquery()
+    return func.coalesce(slot_total, Book.num_copies_available)
+
+
+def _split(copies: int, parts: int) -> list[int]:
+    return [copies // parts + (1 if i < copies % parts else 0) for i in range(parts)]
+
+
+async def _seed_slots(db: AsyncSession, book_ids: Iterable[int]) -> set[int]:
+    """Give the books that have no slots yet their slots, dividing the row counter; returns the IDs of existing books."""
+    book_ids = list(book_ids)
+    # The row lock makes concurrent seeders of the same book wait for each other
+    books = (await db.execute(
+        select(Book.id, Book.num_copies_available).where(Book.id.in_(book_ids)).with_for_update()
+    )).all()
+    seeded = set((await db.execute(
+        select(BookCopySlot.book_id).where(BookCopySlot.book_id.in_(book_ids)).distinct()
+    )).scalars())
+    rows = [
+        {"book_id": book.id, "slot": slot, "available": copies}
+        for book in books if book.id not in seeded
+        for slot, copies in enumerate(_split(max(book.num_copies_available, 0), settings.AVAILABILITY_SLOTS))
+    ]
+    if rows:
+        await db.execute(insert(BookCopySlot), rows)
+    return {book.id for book in books}
+
+
+async def _claim(db: AsyncSession, book_id: int, conditions: tuple) -> bool:
+    """Claim from a random slot that has a copy, skipping slots other transactions hold locked."""
+    slots = BookCopySlot.__table__
+    slot = (
+        select(slots.c.book_id, slots.c.slot)
+        .where(slots.c.book_id == book_id, slots.c.available > 0, *conditions)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = await db.execute(
+        slots.update()
+        .where(tuple_(slots.c.book_id, slots.c.slot).in_(slot))
+        .values(available=slots.c.available - 1)
+        .returning(slots.c.slot)
+    )
+    return claimed.first() is not None
+
+
+async def _claim_waiting(db: AsyncSession, book_id: int, conditions: tuple) -> bool:
+    """
+    Claim from the first slot, in slot order, that still has a copy once its lock is ours.
+
+    Each UPDATE waits for the slot's lock and re-checks ``available > 0`` against the committed
+    row, so a slot emptied meanwhile just moves the claim on to the next one.
+    """
+    slots = BookCopySlot.__table__
+    slot_numbers = (await db.execute(
+        select(slots.c.slot).where(slots.c.book_id == book_id).order_by(slots.c.slot)
+    )).scalars().all()
+    for slot in slot_numbers:
+        claimed = await db.execute(
+            slots.update()
+            .where(slots.c.book_id == book_id, slots.c.slot == slot, slots.c.available > 0, *conditions)
+            .values(available=slots.c.available - 1)
+            .returning(slots.c.slot)
+        )
+        if claimed.first() is not None:
+            return True
+    return False
+
+
+async def claim_copy(db: AsyncSession, book_id: int, *conditions) -> bool:
+    """
+    Take one available copy of a book (in the caller's transaction) if `conditions` hold.
+
+    Slots locked by other issues are skipped first; only when that finds nothing does the claim
+    seed missing slots and then wait on every slot in turn, so "no copies left" is never
+    reported just because the slots with copies were busy.
+    """
+    if not await _claim(db, book_id, conditions):
+        has_slots = (await db.execute(select(BookCopySlot.book_id).where(BookCopySlot.book_id == book_id).limit(1))).first()
+        if has_slots is None and not await _seed_slots(db, [book_id]):
+            return False
+        if not await _claim_waiting(db, book_id, conditions):
+            return False
+    _dirty_books.add(book_id)
+    return True
+
+
+async def claim_copies(db: AsyncSession, book_ids: list[int], condition: Callable) -> set[int]:
+    """
+    Take one available copy of each book (in the caller's transaction) where ``condition(book_id
+    column)`` holds, and return the IDs of the books claimed.
+
+    Every book is claimed in one ``UPDATE ... FROM (VALUES ...), LATERAL (pick a free slot FOR
+    UPDATE SKIP LOCKED)``; only the books that finds nothing for (no slots yet, or every slot
+    busy) go through `claim_copy` one by one.
+    """
+    slots = BookCopySlot.__table__
+    cart = values(column("book_id", Integer), name="cart").data([(book_id,) for book_id in book_ids])
+    candidate = slots.alias("candidate")
+    pick = (
+        select(candidate.c.slot)
+        .where(candidate.c.book_id == cart.c.book_id, candidate.c.available > 0)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .lateral("pick")
+    )
+    claimed = set((await db.execute(
+        slots.update()
+        .where(slots.c.book_id == cart.c.book_id, slots.c.slot == pick.c.slot, condition(cart.c.book_id))
+        .values(available=slots.c.available - 1)
+        .returning(slots.c.book_id)
+    )).scalars())
+    for book_id in book_ids:
+        if book_id not in claimed and await claim_copy(db, book_id, condition(book_id)):
+            claimed.add(book_id)
+    _dirty_books.update(claimed)
+    return claimed
+
+
+async def release_copies(db: AsyncSession, increments: Mapping[int, int]) -> None:
+    """Put returned copies back (in the caller's transaction), each book's into one randomly chosen slot."""
+    slots = BookCopySlot.__table__
+    added = case(dict(increments), value=slots.c.book_id, else_=0)
+    picks = [(book_id, random.randrange(settings.AVAILABILITY_SLOTS)) for book_id in increments]
+    released = set((await db.execute(
+        slots.update()
+        .where(tuple_(slots.c.book_id, slots.c.slot).in_(picks))
+        .values(available=slots.c.available + added)
+        .returning(slots.c.book_id)
+    )).scalars())
+    unseeded = [book_id for book_id in increments if book_id not in released]
+    if unseeded:
+        await _seed_slots(db, unseeded)
+        await db.execute(
+            slots.update()
+            .where(slots.c.book_id.in_(unseeded), slots.c.slot == 0)
+            .values(available=slots.c.available + added)
+        )
+    _dirty_books.update(increments)
+
+
+async def lock_available_copies(db: AsyncSession, book_id: int) -> int | None:
+    """Lock a book's slots against claims and return their total, or None if the book has no slots."""
+    if not slots_enabled(db):
+        return None
+    copies = (await db.execute(
+        select(BookCopySlot.available).where(BookCopySlot.book_id == book_id).with_for_update()
+    )).scalars().all()
+    return sum(copies) if copies else None
+
+
+async def set_available_copies(db: AsyncSession, book_id: int, copies: int) -> None:
+    """Redistribute a book's (locked) slots so they hold `copies` in total, e.g. after a stock change."""
+    await db.execute(delete(BookCopySlot).where(BookCopySlot.book_id == book_id))
+    await db.execute(insert(BookCopySlot), [
+        {"book_id": book_id, "slot": slot, "available": available}
+        for slot, available in enumerate(_split(copies, settings.AVAILABILITY_SLOTS))
+    ])
+    _dirty_books.add(book_id)
+
+
+async def load_books(db: AsyncSession, book_ids: Iterable[int]) -> dict[int, Book]:
+    """Load books for a response with their live available copies in num_copies_available."""
+    rows = await db.execute(
+        select(Book, available_copies(db).label("live_available"))
+        .where(Book.id.in_(list(book_ids)))
+        .execution_options(populate_existing=True)
+    )
+    books = {}
+    for book, live_available in rows:
+        set_committed_value(book, "num_copies_available", live_available)
+        books[book.id] = book
+    return books
+
+
+async def sync_available_copies(db: AsyncSession, book_ids: Iterable[int] | None = None) -> int:
+    """
+    Fold slot totals into books.num_copies_available for the given books (all books with slots
+    when None), capped at num_copies_total; slots holding more than the total are trimmed back.
+    Returns the number of books whose mirror changed.
+    """
+    if not slots_enabled(db):
+        return 0
+    slots, books = BookCopySlot.__table__, Book.__table__
+    totals = select(slots.c.book_id, func.sum(slots.c.available).label("available")).group_by(slots.c.book_id)
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        if not book_ids:
+            return 0
+        totals = totals.where(slots.c.book_id.in_(book_ids))
+    totals = totals.subquery()
+
+    over_total = (await db.execute(
+        select(books.c.id, books.c.num_copies_total)
+        .join(totals, totals.c.book_id == books.c.id)
+        .where(totals.c.available > books.c.num_copies_total)
+    )).all()
+    for book_id, num_copies_total in over_total:
+        await lock_available_copies(db, book_id)
+        await set_available_copies(db, book_id, num_copies_total)
+
+    mirrored = func.least(totals.c.available, books.c.num_copies_total)
+    changed = (await db.execute(
+        books.update()
+        .where(books.c.id == totals.c.book_id, books.c.num_copies_available != mirrored)
+        .values(num_copies_available=mirrored, updated_at=func.now())
+        .returning(books.c.id)
+    )).scalars().all()
+    await db.commit()
+    for book_id in changed:
+        book_cache.invalidate(book_id)
+    return len(changed)
+
+
+async def sync_dirty_available_copies(db: AsyncSession) -> int:
+    """`sync_available_copies` for the books this worker changed since the last run."""
+    book_ids = list(_dirty_books)
+    _dirty_books.difference_update(book_ids)
+    try:
+        return await sync_available_copies(db, book_ids)
+    except Exception:
+        _dirty_books.update(book_ids) # Retry them next time
+        raise
+
+
+async def retire_slots(db: AsyncSession) -> int:
+    """
+    With slots switched off, fold the slots left from when they were on back into the books
+    rows and drop them, so the books row is exact again and a later opt-in starts afresh.
+    Returns the number of books folded.
+    """
+    if slots_enabled(db) or not is_postgres(db):
+        return 0
+    slots, books = BookCopySlot.__table__, Book.__table__
+    if (await db.execute(select(slots.c.book_id).limit(1))).first() is None:
+        return 0
+    totals = select(slots.c.book_id, func.sum(slots.c.available).label("available")).group_by(slots.c.book_id).subquery()
+    folded = (await db.execute(
+        books.update()
+        .where(books.c.id == totals.c.book_id)
+        .values(num_copies_available=func.least(totals.c.available, books.c.num_copies_total), updated_at=func.now())
+        .returning(books.c.id)
+    )).scalars().all()
+    await db.execute(delete(BookCopySlot))
+    await db.commit()
+    for book_id in folded:
+        book_cache.invalidate(book_id)
+    return len(folded)
@@ -0,0 +1,120 @@
+"""
+Running library totals kept up to date by the write paths.
+
+The CRUD functions that change a total call `bump` in their own transaction, so the counter
+commits (or rolls back) together with the change. Each total is spread over
+``LIVE_COUNTER_SHARDS`` rows and a writer updates a random one, so concurrent writers rarely
+wait on the same row; a read sums a handful of rows whatever the size of the library.
+
+`reconcile_counters` (a scheduler job, also run at startup, on one worker at a time)
+initializes the counters and corrects any total that drifted from ``COUNT(*)``, e.g. after rows
+were changed outside the application. Until it has run, `read_totals` returns None and callers count instead.
+"""
+import logging
+import random
+
+from sqlalchemy import select, insert, delete, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.utils import is_postgres
+from app.models.book import Book
+from app.models.book_issue import BookIssue
+from app.models.counter import LibraryCounter
+from app.models.student import Student
+
+logger = logging.getLogger(__name__)
+
+# books: book records, copies_total: sum of num_copies_total, students: registered students, issued: active issues
+COUNTERS = ("books", "copies_total", "students", "issued")
+
+
+async def bump(db: AsyncSession, **deltas: int) -> None:
+    """Add to library totals in the caller's transaction, e.g. ``bump(db, books=1, copies_total=3)``."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    unknown = set(deltas) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown library counter(s): {', '.join(sorted(unknown))}")
+    counters = LibraryCounter.__table__
+    # Shard rows only exist once reconcile_counters has initialized the totals; until then this matches nothing
+    await db.execute(
+        counters.update()
+        .where(counters.c.name.in_(deltas), counters.c.shard == random.randrange(settings.LIVE_COUNTER_SHARDS))
+        .values(value=counters.c.value + case(deltas, value=counters.c.name, else_=0))
+    )
+
+
+async def read_totals(db: AsyncSession) -> dict[str, int] | None:
+    """All totals from the counter rows, or None while they are not initialized."""
+    rows = await db.execute(
+        select(LibraryCounter.name, func.sum(LibraryCounter.value)).group_by(LibraryCounter.name)
+    )
+    totals = {name: int(value) for name, value in rows}
+    return totals if all(name in totals for name in COUNTERS) else None
+
+
+async def count_totals(db: AsyncSession) -> dict[str, int]:
+    """All totals counted from the tables, in one statement."""
+    row = (await db.execute(select(
+        select(func.count()).select_from(Book).scalar_subquery().label("books"),
+        select(func.coalesce(func.sum(Book.num_copies_total), 0)).scalar_subquery().label("copies_total"),
+        select(func.count()).select_from(Student).scalar_subquery().label("students"),
+        # Served by the partial index on active issues
+        select(func.count()).select_from(BookIssue).filter(BookIssue.is_returned == False).scalar_subquery().label("issued")
+    ))).one()
+    return {name: int(row._mapping[name]) for name in COUNTERS}
+
+
+async def reconcile_counters(db: AsyncSession) -> dict[str, int]:
+    """
+    Compare every total with COUNT(*) and correct the ones that drifted; create missing ones.
+
+    Returns the drift (stored - actual) of each corrected total. Nothing is locked: the counts
+    and the stored totals are read in one snapshot (REPEATABLE READ on PostgreSQL), in which
+    every committed change and its `bump` are either both visible or both not, so a difference
+    is real drift. The correction is then applied as a delta to one shard in a short
+    transaction, which stays right whatever was committed in the meantime. Run it from one
+    worker at a time (the scheduler job takes an advisory lock), or two would both apply it.
+    """
+    if is_postgres(db):
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    actual = await count_totals(db)
+    shards: dict[str, dict[int, int]] = {name: {} for name in COUNTERS}
+    for name, shard, value in await db.execute(select(LibraryCounter.name, LibraryCounter.shard, LibraryCounter.value)):
+        if name in shards:
+            shards[name][shard] = value
+    await db.commit() # End the snapshot; the correction runs in a fresh, short transaction
+
+    drift: dict[str, int] = {}
+    counters = LibraryCounter.__table__
+    for name in COUNTERS:
+        stored = shards[name]
+        missing = [shard for shard in range(settings.LIVE_COUNTER_SHARDS) if shard not in stored]
+        if missing:
+            # A new total starts at its count; shards added by a larger LIVE_COUNTER_SHARDS start at 0
+            await db.execute(insert(LibraryCounter), [
+                {"name": name, "shard": shard, "value": actual[name] if not stored and shard == 0 else 0}
+                for shard in missing
+            ])
+        extra = [shard for shard in stored if shard >= settings.LIVE_COUNTER_SHARDS]
+        if extra:
+            # Shards beyond a smaller LIVE_COUNTER_SHARDS are folded into shard 0
+            await db.execute(
+                counters.update()
+                .where(counters.c.name == name, counters.c.shard == 0)
+                .values(value=counters.c.value + sum(stored[shard] for shard in extra))
+            )
+            await db.execute(delete(LibraryCounter).filter(LibraryCounter.name == name, LibraryCounter.shard.in_(extra)))
+        if stored and sum(stored.values()) != actual[name]:
+            drift[name] = sum(stored.values()) - actual[name]
+            await db.execute(
+                counters.update()
+                .where(counters.c.name == name, counters.c.shard == 0)
+                .values(value=counters.c.value - drift[name])
+            )
+    await db.commit()
+    if drift:
+        logger.warning(f"Library counters drifted and were corrected: {drift}")
+    return drift
@@ -1,11 +1,27 @@
+import html
+import re
+from datetime import datetime
+from typing import AsyncIterator, Mapping
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal, column, case, cast, and_, or_, tuple_, union_all
+from sqlalchemy.dialects.postgresql import TSVECTOR, REGCONFIG, insert as pg_insert
+from sqlalchemy import insert, String
+from pydantic import ValidationError
 from fastapi import HTTPException, status
 
-from app.models.book import Book
-from app.schemas.book import BookCreate, BookUpdate
+from app.db.utils import is_postgres
+from app.crud.pagination import apply_keyset, fetch_page
+from app.crud import availability, counters
+from app.models.book import Book, BOOK_SEARCH_CONFIG
+from app.schemas.book import BookCreate, BookUpdate, BookResponse
+from app.schemas.bulk import BulkRowError, BulkImportReport
+from app.utils.bulk_import import RowParseError, chunked, record_key, validation_messages
+from app.services.catalog_cache import book_cache
+from app.services.circulation_rollup import record_book_deletion
+from app.services.suggestion_index import book_suggestions, index_book
 
 async def get_book_by_isbn(db: AsyncSession, isbn: str) -> Book | None:
     result = await db.execute(select(Book).filter(Book.isbn == isbn))
@@ -34,6 +50,7 @@ async def create_book(db: AsyncSession, book_in: BookCreate) -> Book:
     )
     db.add(db_book)
     try:
+        await counters.bump(db, books=1, copies_total=db_book.num_copies_total)
         await db.commit()
         await db.refresh(db_book)
     except IntegrityError as e:
@@ -49,6 +66,8 @@ async def create_book(db: AsyncSession, book_in: BookCreate) -> Book:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected database error occurred: {str(e.orig)}"
         )
+    book_cache.invalidate(db_book.id)
+    index_book(db_book)
     return db_book
 
 # Placeholder for other CRUD functions (get, get_multi, update, delete)
@@ -56,42 +75,432 @@ async def get_book(db: AsyncSession, book_id: int) -> Book | None:
     result = await db.execute(select(Book).filter(Book.id == book_id))
     return result.scalars().first()
 
-async def get_books(
-    db: AsyncSession, skip: int = 0, limit: int = 100, 
+async def get_book_updated_at(db: AsyncSession, book_id: int) -> datetime | None:
+    """Just the row version used for ETags; answered from the (id, updated_at) index alone."""
+    result = await db.execute(select(Book.updated_at).filter(Book.id == book_id))
+    return result.scalar_one_or_none()
+
+async def get_book_response(db: AsyncSession, book_id: int) -> BookResponse | None:
+    """Read-only book payload, served from the catalog cache when possible."""
+    cached = book_cache.get(book_id)
+    if cached is not None:
+        return cached
+    token = book_cache.read_token()
+    db_book = await get_book(db, book_id=book_id)
+    if not db_book:
+        return None
+    book = BookResponse.model_validate(db_book)
+    book_cache.put(book, token)
+    return book
+
+# Sort keys accepted by get_books; each has a matching (column, id) index for keyset pagination
+BOOK_SORT_COLUMNS = {
+    "id": Book.id,
+    "title": Book.title,
+    "author": Book.author,
+    "created_at": Book.created_at,
+}
+
+def _apply_book_filters(
+    query,
     book_id: int | None = None,
     title: str | None = None, author: str | None = None, category: str | None = None,
-    isbn: str | None = None
-) -> tuple[list[Book], int]:
-    query = select(Book)
-    count_query = select(func.count()).select_from(Book)
+    isbn: str | None = None,
+    trigram: bool = False
+):
+    """
+    Apply the list/search filters shared by the book listing queries.
 
+    With ``trigram=True`` (PostgreSQL only) title, author and category use pg_trgm's
+    word-similarity operator, which tolerates typos and is served by the trigram GIN indexes.
+    Otherwise they are case-insensitive partial matches.
+    """
     if book_id:
         query = query.filter(Book.id == book_id)
-        count_query = count_query.filter(Book.id == book_id)
-    if title:
-        query = query.filter(Book.title.ilike(f"%{title}%"))
-        count_query = count_query.filter(Book.title.ilike(f"%{title}%"))
-    if author:
-        query = query.filter(Book.author.ilike(f"%{author}%"))
-        count_query = count_query.filter(Book.author.ilike(f"%{author}%"))
-    if category:
-        query = query.filter(Book.category.ilike(f"%{category}%"))
-        count_query = count_query.filter(Book.category.ilike(f"%{category}%"))
+    for column, term in ((Book.title, title), (Book.author, author), (Book.category, category)):
+        if not term:
+            continue
+        if trigram:
+            # `term <% column`: some extent of the column is similar to the term
+            query = query.filter(literal(term).bool_op("<%")(column))
+        else:
+            query = query.filter(column.ilike(f"%{term}%"))
     if isbn:
         # Use exact matching for ISBN (after removing hyphens) since ISBN is a unique identifier
         query = query.filter(Book.isbn == isbn)
-        count_query = count_query.filter(Book.isbn == isbn)
+    return query
+
+def _similarity_rank(title: str | None, author: str | None, category: str | None):
+    """Sum of the pg_trgm word similarities of the fuzzy terms, used to rank fuzzy results."""
+    scores = [
+        func.word_similarity(term, column)
+        for column, term in ((Book.title, title), (Book.author, author), (Book.category, category))
+        if term
+    ]
+    if not scores:
+        return None
+    rank = scores[0]
+    for score in scores[1:]:
+        rank = rank + score
+    return rank
+
+async def get_books(
+    db: AsyncSession, skip: int = 0, limit: int = 100, 
+    book_id: int | None = None,
+    title: str | None = None, author: str | None = None, category: str | None = None,
+    isbn: str | None = None,
+    fuzzy: bool = False,
+    sort_by: str = "id",
+    after: str | None = None,
+    total_mode: str = "exact"
+) -> tuple[list[Book], int | None]:
+    """
+    List books matching the given filters.
+
+    ``fuzzy=True`` switches title/author/category to typo-tolerant trigram matching and orders
+    the results by similarity. Databases without pg_trgm (e.g. SQLite test databases) fall back
+    to the regular partial matching.
+
+    Results are ordered by (``sort_by``, id). Passing an ``after`` cursor (see
+    `app.crud.pagination`) seeks past that row instead of using ``skip``.
+
+    ``total_mode`` is one of exact/estimate/none (see `app.crud.pagination.TOTAL_MODES`);
+    the total is None in "none" mode.
+    """
+    if sort_by not in BOOK_SORT_COLUMNS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cannot sort books by '{sort_by}'.")
+    if fuzzy and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor pagination is not available for fuzzy (similarity ranked) searches; use page instead."
+        )
+    trigram = fuzzy and is_postgres(db)
+    filtered_query = _apply_book_filters(
+        select(Book), book_id=book_id, title=title, author=author, category=category, isbn=isbn, trigram=trigram
+    )
+
+    rank = _similarity_rank(title, author, category) if trigram else None
+    if rank is not None:
+        query = filtered_query.order_by(rank.desc(), Book.id).offset(skip)
+    else:
+        query = apply_keyset(db, filtered_query, BOOK_SORT_COLUMNS[sort_by], Book.id, after=after, sort_by=sort_by)
+        if not after:
+            query = query.offset(skip)
+    query = query.limit(limit)
+    return await fetch_page(db, query, filtered_query, total_mode=total_mode, skip=skip, seeked=bool(after))
+
+BOOK_FACETS = ("category", "author", "available")
+
+# Largest buckets kept per facet; authors in particular can have a very long tail
+FACET_BUCKET_LIMIT = 20
+
+def parse_facets(facets: str | None) -> list[str]:
+    """Split a ``facets=category,available`` query value, rejecting unknown facet names."""
+    names = [name.strip() for name in (facets or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in BOOK_FACETS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown facet(s): {', '.join(unknown)}. Available facets: {', '.join(BOOK_FACETS)}."
+        )
+    return list(dict.fromkeys(names))
+
+async def get_book_facets(
+    db: AsyncSession, facets: list[str],
+    book_id: int | None = None,
+    title: str | None = None, author: str | None = None, category: str | None = None,
+    isbn: str | None = None,
+    fuzzy: bool = False
+) -> dict[str, list[dict]]:
+    """
+    Grouped counts over every book matching the get_books filters (not just the current page).
+
+    All requested facets come out of a single scan: GROUPING SETS on PostgreSQL, a UNION ALL
+    of per-column GROUP BYs elsewhere. Each bucket carries its match count and, via a FILTER
+    aggregate, how many of those books have a copy available right now; only the
+    FACET_BUCKET_LIMIT largest buckets per facet are returned, ranked with row_number() in the
+    same query. The "available" facet splits the whole result set into "true"/"false".
+    """
+    if not facets:
+        return {}
+    trigram = fuzzy and is_postgres(db)
+    available = func.count().filter(Book.num_copies_available > 0)
+    grouped = [name for name in facets if name in ("category", "author")]
+
+    def facet_select(*columns):
+        return _apply_book_filters(
+            select(*columns, func.count().label("count"), available.label("available")),
+            book_id=book_id, title=title, author=author, category=category, isbn=isbn, trigram=trigram
+        )
+
+    if is_postgres(db):
+        sets = [tuple_(getattr(Book, name)) for name in grouped] + [tuple_()]
+        labels = [
+            case((func.grouping(getattr(Book, name)) == 0, literal(name)), else_=None) for name in grouped
+        ]
+        facet_name = func.coalesce(*labels, literal("")) if labels else literal("")
+        value = func.coalesce(*[cast(getattr(Book, name), String) for name in grouped]) if grouped else literal(None, String)
+        query = facet_select(facet_name.label("facet"), value.label("value")).group_by(func.grouping_sets(*sets))
+    else:
+        parts = [
+            facet_select(literal(name).label("facet"), getattr(Book, name).label("value")).group_by(getattr(Book, name))
+            for name in grouped
+        ]
+        parts.append(facet_select(literal("").label("facet"), literal(None, String).label("value")))
+        query = union_all(*parts)
 
-    total_books_result = await db.execute(count_query)
-    total_books = total_books_result.scalar_one_or_none() or 0
+    buckets = query.subquery("buckets")
+    rank = func.row_number().over(
+        partition_by=buckets.c.facet,
+        order_by=(buckets.c.count.desc(), func.coalesce(buckets.c.value, ""))
+    )
+    ranked = select(buckets, rank.label("rank")).subquery("ranked")
+    query = (
+        select(ranked.c.facet, ranked.c.value, ranked.c.count, ranked.c.available)
+        .filter(ranked.c.rank <= FACET_BUCKET_LIMIT)
+        .order_by(ranked.c.facet, ranked.c.rank)
+    )
+
+    result: dict[str, list[dict]] = {name: [] for name in facets}
+    for row in (await db.execute(query)).all():
+        if row.facet == "":
+            if "available" in result:
+                result["available"] = [
+                    {"value": "true", "count": row.available, "available": row.available},
+                    {"value": "false", "count": row.count - row.available, "available": 0},
+                ]
+            continue
+        result[row.facet].append({"value": row.value, "count": row.count, "available": row.available})
+    return result
+
+BOOK_EXPORT_COLUMNS = (
+    "id", "title", "author", "isbn", "num_copies_total", "num_copies_available", "category", "created_at", "updated_at"
+)
+
+async def stream_books(
+    db: AsyncSession,
+    book_id: int | None = None,
+    title: str | None = None, author: str | None = None, category: str | None = None,
+    isbn: str | None = None,
+    yield_per: int = 1000
+) -> AsyncIterator[Mapping]:
+    """
+    Yield every book matching the get_books filters, in id order, as plain row mappings.
+
+    Rows come from a server-side cursor `yield_per` at a time and are not ORM objects,
+    so memory stays flat however large the table is.
+    """
+    query = _apply_book_filters(
+        select(*(getattr(Book, name) for name in BOOK_EXPORT_COLUMNS)),
+        book_id=book_id, title=title, author=author, category=category, isbn=isbn
+    ).order_by(Book.id).execution_options(yield_per=yield_per)
+    result = await db.stream(query)
+    async for row in result.mappings():
+        yield row
+
+def _search_tokens(q: str) -> list[str]:
+    return re.findall(r"\w+", q.lower())
+
+def _highlight(text: str | None, tokens: list[str]) -> str | None:
+    """
+    HTML-escape the text and wrap the words starting with any of the tokens in <mark> tags
+    (fallback for ts_headline).
+    """
+    if not text:
+        return text
+    if not tokens:
+        return html.escape(text, quote=False)
+    # re.split with one group alternates unmatched text and matched words
+    pattern = re.compile(r"\b((?:" + "|".join(re.escape(t) for t in tokens) + r")\w*)", re.IGNORECASE)
+    return "".join(
+        f"<mark>{html.escape(piece, quote=False)}</mark>" if i % 2 else html.escape(piece, quote=False)
+        for i, piece in enumerate(pattern.split(text))
+    )
+
+def _html_escaped(expr):
+    """SQL counterpart of html.escape(quote=False), so ts_headline's <mark> tags are the only markup."""
+    for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")):
+        expr = func.replace(expr, char, entity)
+    return expr
+
+async def search_books(
+    db: AsyncSession, q: str, skip: int = 0, limit: int = 10
+) -> tuple[list[tuple[Book, float, str | None]], int]:
+    """
+    Relevance-ranked search over title, author and category in one go.
+
+    On PostgreSQL this is a single lookup on the `search_vector` GIN index (see models/book.py):
+    every word of ``q`` is matched as a prefix, so partially typed words already match, and results
+    are ranked with ts_rank_cd (title hits weigh more than author, author more than category).
+    Highlights come from ts_headline and are only computed for the returned page; they are HTML with
+    the book text escaped and the matches in <mark> tags.
+    Other databases fall back to partial matching with a simple field-weighted rank.
+
+    Returns ``([(book, rank, highlight), ...], total)``.
+    """
+    tokens = _search_tokens(q)
+    if not tokens:
+        return [], 0
+
+    if is_postgres(db):
+        search_vector = column("search_vector", TSVECTOR)
+        config = cast(literal(BOOK_SEARCH_CONFIG), REGCONFIG)
+        ts_query = func.to_tsquery(config, " & ".join(f"{token}:*" for token in tokens))
+        rank = func.ts_rank_cd(search_vector, ts_query)
+        ranked = (
+            select(Book.id, rank.label("rank"), func.count().over().label("total_count"))
+            .where(search_vector.bool_op("@@")(ts_query))
+            .order_by(rank.desc(), Book.id)
+            .offset(skip)
+            .limit(limit)
+            .subquery()
+        )
+        highlight = func.ts_headline(
+            config,
+            func.concat_ws(" · ", *(_html_escaped(col) for col in (Book.title, Book.author, Book.category))),
+            ts_query,
+            "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"
+        )
+        stmt = (
+            select(Book, ranked.c.rank, highlight.label("highlight"), ranked.c.total_count)
+            .join(ranked, ranked.c.id == Book.id)
+            .order_by(ranked.c.rank.desc(), Book.id)
+        )
+        rows = (await db.execute(stmt)).all()
+        total = rows[0].total_count if rows else 0
+        return [(row.Book, float(row.rank), row.highlight) for row in rows], total
+
+    # Fallback: every token has to appear in at least one of the fields
+    weights = ((Book.title, 1.0), (Book.author, 0.4), (Book.category, 0.2))
+    conditions = [or_(*(col.ilike(f"%{token}%") for col, _ in weights)) for token in tokens]
+    rank = sum(
+        case((col.ilike(f"%{token}%"), weight), else_=0.0)
+        for token in tokens for col, weight in weights
+    )
+    stmt = (
+        select(Book, rank.label("rank"), func.count().over().label("total_count"))
+        .where(and_(*conditions))
+        .order_by(rank.desc(), Book.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    rows = (await db.execute(stmt)).all()
+    total = rows[0].total_count if rows else 0
+    results = []
+    for row in rows:
+        text_ = " · ".join(part for part in (row.Book.title, row.Book.author, row.Book.category) if part)
+        results.append((row.Book, float(row.rank), _highlight(text_, tokens)))
+    return results, total
+
+BOOK_IMPORT_COLUMNS = ("title", "author", "isbn", "num_copies_total", "num_copies_available", "category")
+
+async def _insert_book_rows(db: AsyncSession, rows: list[dict]) -> set[str]:
+    """
+    Insert validated book rows in bulk and return the ISBNs that were actually inserted.
+
+    PostgreSQL loads through asyncpg's COPY. If a concurrent writer took one of the ISBNs after
+    the conflict check, COPY fails as a whole and the chunk is retried as a multi-row
+    INSERT ... ON CONFLICT DO NOTHING, which skips just the taken ISBNs.
+    Other databases use a multi-row INSERT.
+    """
+    if not is_postgres(db):
+        await db.execute(insert(Book), rows)
+        return {row["isbn"] for row in rows}
+
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    savepoint = await db.begin_nested()
+    try:
+        await raw.driver_connection.copy_records_to_table(
+            Book.__tablename__,
+            records=[tuple(row[name] for name in BOOK_IMPORT_COLUMNS) for row in rows],
+            columns=list(BOOK_IMPORT_COLUMNS),
+        )
+        await savepoint.commit()
+        return {row["isbn"] for row in rows}
+    except Exception as e:
+        await savepoint.rollback()
+        if "unique" not in str(e).lower():
+            raise
+    result = await db.execute(
+        pg_insert(Book).values(rows).on_conflict_do_nothing(index_elements=[Book.isbn]).returning(Book.isbn)
+    )
+    return set(result.scalars().all())
+
+async def import_books(
+    db: AsyncSession, records: AsyncIterator[tuple[int, dict | RowParseError]], chunk_size: int = 1000
+) -> BulkImportReport:
+    """
+    Bulk-create books from a stream of ``(row_number, record)`` pairs (see app.utils.bulk_import).
+
+    Each chunk is validated against BookCreate, checked for ISBN conflicts with one set-based
+    query, inserted in one go and committed, so memory stays bounded by the chunk size and an
+    error in one chunk does not undo the chunks before it. Rows that fail validation or whose
+    ISBN already exists (in the database or earlier in the upload) are reported, not imported.
+    """
+    received = imported = 0
+    errors: list[BulkRowError] = []
+
+    async for chunk in chunked(records, chunk_size):
+        received += len(chunk)
+        candidates: dict[str, tuple[int, dict]] = {}
+        for row_number, record in chunk:
+            if isinstance(record, RowParseError):
+                errors.append(BulkRowError(row=row_number, errors=validation_messages(record)))
+                continue
+            try:
+                book_in = BookCreate.model_validate(record)
+            except ValidationError as e:
+                errors.append(BulkRowError(row=row_number, key=record_key(record, "isbn"), errors=validation_messages(e)))
+                continue
+            if book_in.isbn in candidates:
+                errors.append(BulkRowError(
+                    row=row_number, key=book_in.isbn,
+                    errors=[f"ISBN {book_in.isbn} appears more than once in the upload (first at row {candidates[book_in.isbn][0]})."]
+                ))
+                continue
+            num_available = book_in.num_copies_available if book_in.num_copies_available is not None else book_in.num_copies_total
+            candidates[book_in.isbn] = (row_number, {
+                "title": book_in.title,
+                "author": book_in.author,
+                "isbn": book_in.isbn,
+                "num_copies_total": book_in.num_copies_total,
+                "num_copies_available": num_available,
+                "category": book_in.category,
+            })
+        if not candidates:
+            continue
+
+        existing = await db.execute(select(Book.isbn).filter(Book.isbn.in_(list(candidates))))
+        for isbn in existing.scalars().all():
+            row_number, _ = candidates.pop(isbn)
+            errors.append(BulkRowError(row=row_number, key=isbn, errors=[f"Book with ISBN {isbn} already exists."]))
+        if not candidates:
+            continue
+
+        inserted = await _insert_book_rows(db, [row for _, row in candidates.values()])
+        await counters.bump(db, books=len(inserted), copies_total=sum(candidates[isbn][1]["num_copies_total"] for isbn in inserted))
+        await db.commit()
+        imported += len(inserted)
+        if inserted:
+            new_books = await db.execute(select(Book.id, Book.title, Book.author).filter(Book.isbn.in_(list(inserted))))
+            book_suggestions.upsert_many((row.id, row.title, row.author, (row.title, row.author)) for row in new_books)
+        for isbn, (row_number, _) in candidates.items():
+            if isbn not in inserted:
+                errors.append(BulkRowError(row=row_number, key=isbn, errors=[f"Book with ISBN {isbn} already exists (database constraint)."]))
 
-    query = query.offset(skip).limit(limit).order_by(Book.id)
-    books_result = await db.execute(query)
-    books = books_result.scalars().all()
-    return list(books), total_books
+    errors.sort(key=lambda error: error.row)
+    return BulkImportReport(received=received, imported=imported, failed=len(errors), errors=errors)
 
 async def update_book(db: AsyncSession, db_book: Book, book_in: BookUpdate) -> Book:
     update_data = book_in.model_dump(exclude_unset=True)
+    previous_total = db_book.num_copies_total
+    # With availability slots the live count is in the slots; lock them while the stock changes
+    slot_copies = None
+    if 'num_copies_total' in update_data or 'num_copies_available' in update_data:
+        slot_copies = await availability.lock_available_copies(db, db_book.id)
+    if slot_copies is not None:
+        db_book.num_copies_available = slot_copies
     for field, value in update_data.items():
         setattr(db_book, field, value)
     
@@ -104,10 +513,15 @@ async def update_book(db: AsyncSession, db_book: Book, book_in: BookUpdate) -> B
         # If both are set, ensure available is not more than total
         if db_book.num_copies_available > db_book.num_copies_total:
              db_book.num_copies_available = db_book.num_copies_total # Or raise error
+    if slot_copies is not None:
+        await availability.set_available_copies(db, db_book.id, db_book.num_copies_available)
 
     db.add(db_book)
+    await counters.bump(db, copies_total=db_book.num_copies_total - previous_total)
     await db.commit()
     await db.refresh(db_book)
+    book_cache.invalidate(db_book.id)
+    index_book(db_book)
     return db_book
 
 async def delete_book(db: AsyncSession, book_id: int) -> Book | None:
@@ -115,5 +529,9 @@ async def delete_book(db: AsyncSession, book_id: int) -> Book | None:
     if not db_book:
         return None
     await db.delete(db_book)
+    await counters.bump(db, books=-1, copies_total=-db_book.num_copies_total)
+    await record_book_deletion(db, db_book)
     await db.commit()
+    book_cache.invalidate(book_id)
+    book_suggestions.remove(book_id)
     return db_book 
\ No newline at end of file
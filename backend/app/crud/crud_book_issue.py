@@ -1,105 +1,232 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload # For eager loading related book/student
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta, date, timezone
-from typing import List # For type hinting
-from sqlalchemy import func
+from typing import List, AsyncIterator, Mapping # For type hinting
+from sqlalchemy import func, and_, or_, case, update, insert, tuple_
 
+from app.db.utils import is_postgres
+from app.crud.pagination import apply_keyset, fetch_page
 from app.models.book_issue import BookIssue
 from app.models.book import Book # For updating num_copies_available
 from app.models.student import Student # For checking student existence
-from app.schemas.issue import BookIssueCreate
+from app.schemas.issue import BookIssueCreate, BatchIssueCreate, BatchItemError, BulkReturnRequest, BulkReturnItemResult, BulkReturnResponse
 from app.crud import crud_book, crud_student # To get book/student by id
+from app.crud import availability, counters
+from app.services.catalog_cache import book_cache, student_lookup_cache
 
 DEFAULT_ISSUE_DAYS = 14 # Same as in schemas
 
+def _utc_midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+
+def _expected_return_datetime(return_day: date | None, issue_date: datetime) -> datetime:
+    """Midnight UTC of the requested return day (or of the default loan period)."""
+    if not isinstance(return_day, date):
+        # If no expected date provided, use default
+        return_day = (issue_date + timedelta(days=DEFAULT_ISSUE_DAYS)).date()
+    return _utc_midnight(return_day)
+
+def _active_issue_exists(book_id, student_id):
+    return (
+        select(BookIssue.id)
+        .filter(BookIssue.book_id == book_id, BookIssue.student_id == student_id, BookIssue.is_returned == False)
+        .exists()
+    )
+
+async def _raise_issue_refusal(db: AsyncSession, book_id: int, student_id: int) -> None:
+    """Work out why the conditional decrement matched no row (one query) and raise the matching error."""
+    row = (await db.execute(
+        select(Book.id, Book.title, availability.available_copies(db).label("num_copies_available"))
+        .filter(Book.id == book_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Book with ID {book_id} not found.")
+    if row.num_copies_available <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Book '{row.title}' (ID: {row.id}) has no available copies.")
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Student (ID: {student_id}) already has an active issue for Book '{row.title}' (ID: {row.id})."
+    )
+
 async def create_book_issue(db: AsyncSession, issue_in: BookIssueCreate) -> BookIssue:
-    """Issue a book to a student."""
+    """
+    Issue a book to a student.
+
+    The availability check, the duplicate-issue check and the decrement are a single
+    conditional ``UPDATE books ... WHERE num_copies_available > 0 AND NOT EXISTS (active issue)
+    RETURNING``, and the issue is inserted with RETURNING, so the happy path is three statements
+    (student lookup, update, insert) plus the commit. The response is assembled from those rows.
+    Only when the update matches nothing is an extra query run to report the reason.
+
+    With availability slots enabled (AVAILABILITY_SLOTS > 1 on PostgreSQL) the copy is claimed
+    from the book's slots instead (see app.crud.availability), so desks issuing the same title
+    do not queue on its books row.
+    """
     # 1. Check if student exists
     student = await crud_student.get_student(db, student_id=issue_in.student_id)
     if not student:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Student with ID {issue_in.student_id} not found.")
 
-    # 2. Check if book exists
-    book = await crud_book.get_book(db, book_id=issue_in.book_id)
-    if not book:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Book with ID {issue_in.book_id} not found.")
-
-    # 3. Check if num_copies_available > 0
-    if book.num_copies_available <= 0:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Book '{book.title}' (ID: {book.id}) has no available copies.")
-
-    # 4. Check if student already has this specific book issued and not returned
-    existing_issue = await db.execute(
-        select(BookIssue).filter_by(
-            book_id=issue_in.book_id,
-            student_id=issue_in.student_id,
-            is_returned=False
+    # 2. Claim a copy: book exists, has a copy available and is not already issued to this student
+    if availability.slots_enabled(db):
+        book = None
+        if await availability.claim_copy(db, issue_in.book_id, ~_active_issue_exists(issue_in.book_id, issue_in.student_id)):
+            book = (await availability.load_books(db, [issue_in.book_id]))[issue_in.book_id]
+    else:
+        claimed = await db.execute(
+            update(Book)
+            .filter(
+                Book.id == issue_in.book_id,
+                Book.num_copies_available > 0,
+                ~_active_issue_exists(issue_in.book_id, issue_in.student_id),
+            )
+            .values(num_copies_available=Book.num_copies_available - 1, updated_at=func.now())
+            .returning(Book)
+            .execution_options(synchronize_session=False, populate_existing=True)
         )
-    )
-    if existing_issue.scalars().first():
+        book = claimed.scalars().first()
+    if book is None:
+        await db.rollback()
+        await _raise_issue_refusal(db, issue_in.book_id, issue_in.student_id)
+
+    # 3. Create the issue record
+    issue_date = datetime.now(timezone.utc)
+    try:
+        inserted = await db.execute(
+            insert(BookIssue)
+            .values(
+                book_id=issue_in.book_id,
+                student_id=issue_in.student_id,
+                issue_date=issue_date,
+                expected_return_date=_expected_return_datetime(issue_in.expected_return_date, issue_date),
+                is_returned=False
+            )
+            .returning(BookIssue)
+        )
+        db_book_issue = inserted.scalars().one()
+        await counters.bump(db, issued=1)
+        await db.commit()
+    except Exception as e:
+        await db.rollback() # Rollback changes to both book and book_issue table
+        # Log the exception e
         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"Student (ID: {issue_in.student_id}) already has an active issue for Book '{book.title}' (ID: {book.id})."
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while issuing the book: {str(e)}"
         )
-    
-    # 5. Decrement num_copies_available in books table
-    book.num_copies_available -= 1
-    db.add(book) # Add to session for commit
 
-    # 6. Create a new record in book_issues
-    issue_date = datetime.now(timezone.utc)
-    
-    # Convert date to datetime with UTC timezone and zero time components
-    if isinstance(issue_in.expected_return_date, date):
-        # Create a date-only datetime with UTC timezone
-        expected_return_date = datetime.combine(
-            issue_in.expected_return_date, 
-            datetime.min.time(),
-            tzinfo=timezone.utc
+    # The rows are already in hand; attach them instead of reloading the issue with its relations
+    set_committed_value(db_book_issue, "book", book)
+    set_committed_value(db_book_issue, "student", student)
+    book_cache.invalidate(book.id) # num_copies_available changed
+    return db_book_issue
+
+async def create_book_issues_batch(db: AsyncSession, batch: BatchIssueCreate) -> list[BookIssue]:
+    """
+    Issue several books to one student at once (a checkout "cart"), all or nothing.
+
+    The student is checked once, every book is claimed with one conditional
+    ``UPDATE books ... WHERE id IN (...) AND num_copies_available > 0 AND NOT EXISTS (active
+    issue) RETURNING`` and all issues are inserted with one multi-row INSERT ... RETURNING.
+    If any book cannot be claimed nothing is changed and a 409 lists the reason for each
+    refused book. With availability slots enabled the copies are claimed from the books' slots,
+    also in one statement (see `availability.claim_copies`).
+    """
+    book_ids = [item.book_id for item in batch.items]
+    duplicates = sorted({book_id for book_id in book_ids if book_ids.count(book_id) > 1})
+    if duplicates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": "Each book can only be issued once per checkout.",
+                "errors": [BatchItemError(book_id=book_id, reason="Listed more than once.").model_dump() for book_id in duplicates],
+            }
         )
+
+    student = await crud_student.get_student(db, student_id=batch.student_id)
+    if not student:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Student with ID {batch.student_id} not found.")
+
+    if availability.slots_enabled(db):
+        claimed_ids = await availability.claim_copies(db, book_ids, lambda book_id: ~_active_issue_exists(book_id, batch.student_id))
+        books = await availability.load_books(db, claimed_ids) if claimed_ids else {}
     else:
-        # If no expected date provided, use default
-        expected_return_date = (issue_date + timedelta(days=DEFAULT_ISSUE_DAYS))
-        # Remove time components
-        expected_return_date = datetime.combine(
-            expected_return_date.date(),
-            datetime.min.time(),
-            tzinfo=timezone.utc
+        claimed = await db.execute(
+            update(Book)
+            .filter(
+                Book.id.in_(book_ids),
+                Book.num_copies_available > 0,
+                ~_active_issue_exists(Book.id, batch.student_id),
+            )
+            .values(num_copies_available=Book.num_copies_available - 1, updated_at=func.now())
+            .returning(Book)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        books = {book.id: book for book in claimed.scalars().all()}
+    if len(books) != len(book_ids):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "No books were issued: some books in the checkout cannot be issued.",
+                "errors": [error.model_dump() for error in await _batch_refusals(db, [b for b in book_ids if b not in books], batch.student_id)],
+            }
         )
 
-    db_book_issue = BookIssue(
-        book_id=issue_in.book_id,
-        student_id=issue_in.student_id,
-        issue_date=issue_date,
-        expected_return_date=expected_return_date,
-        is_returned=False
-    )
-    db.add(db_book_issue)
-    
+    issue_date = datetime.now(timezone.utc)
     try:
-        await db.commit()
-        await db.refresh(db_book_issue)
-        # Eagerly load book and student for the response after commit
-        # This ensures the relationships are populated for the BookIssueResponse schema
-        result = await db.execute(
-            select(BookIssue)
-            .options(selectinload(BookIssue.book), selectinload(BookIssue.student))
-            .filter(BookIssue.id == db_book_issue.id)
+        inserted = await db.execute(
+            insert(BookIssue).returning(BookIssue, sort_by_parameter_order=True),
+            [
+                {
+                    "book_id": item.book_id,
+                    "student_id": batch.student_id,
+                    "issue_date": issue_date,
+                    "expected_return_date": _expected_return_datetime(item.expected_return_date, issue_date),
+                    "is_returned": False,
+                }
+                for item in batch.items
+            ]
         )
-        refreshed_issue_with_relations = result.scalar_one_or_none()
-        if refreshed_issue_with_relations is None: # Should not happen if refresh worked
-            raise HTTPException(status_code=500, detail="Failed to reload book issue with relations after creation.")
-        return refreshed_issue_with_relations
+        issues = list(inserted.scalars().all())
+        await counters.bump(db, issued=len(issues))
+        await db.commit()
     except Exception as e:
-        await db.rollback() # Rollback changes to both book and book_issue table
+        await db.rollback()
         # Log the exception e
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An error occurred while issuing the book: {str(e)}"
+            detail=f"An error occurred while issuing the books: {str(e)}"
         )
 
+    for issue in issues:
+        set_committed_value(issue, "book", books[issue.book_id])
+        set_committed_value(issue, "student", student)
+    for book in books.values():
+        book_cache.invalidate(book.id) # num_copies_available changed
+    return issues
+
+async def _batch_refusals(db: AsyncSession, book_ids: list[int], student_id: int) -> list[BatchItemError]:
+    """Reasons (one query for all of them) why the given books could not be claimed for the student."""
+    rows = await db.execute(
+        select(Book.id, Book.title, availability.available_copies(db).label("num_copies_available")).filter(Book.id.in_(book_ids))
+    )
+    found = {row.id: row for row in rows}
+    errors = []
+    for book_id in book_ids:
+        row = found.get(book_id)
+        if row is None:
+            reason = f"Book with ID {book_id} not found."
+        elif row.num_copies_available <= 0:
+            reason = f"Book '{row.title}' (ID: {row.id}) has no available copies."
+        else:
+            reason = f"Student (ID: {student_id}) already has an active issue for Book '{row.title}' (ID: {row.id})."
+        errors.append(BatchItemError(book_id=book_id, reason=reason))
+    return errors
+
 # Placeholder for other book_issue CRUD operations
 async def get_book_issue_by_id(db: AsyncSession, issue_id: int) -> BookIssue | None:
     result = await db.execute(
@@ -109,72 +236,89 @@ async def get_book_issue_by_id(db: AsyncSession, issue_id: int) -> BookIssue | N
     )
     return result.scalars().first()
 
-async def return_book_issue(db: AsyncSession, issue_id: int) -> BookIssue:
-    """Marks a book issue as returned and updates book copy count."""
-    # 1. Fetch the book_issue record, including related book for updating num_copies
-    db_issue = await db.execute(
-        select(BookIssue)
-        .options(selectinload(BookIssue.book), selectinload(BookIssue.student)) # Eager load student too for response
-        .filter(BookIssue.id == issue_id)
+async def _raise_return_refusal(db: AsyncSession, issue_id: int) -> None:
+    """Work out why a return matched no row (one query) and raise the matching error."""
+    is_returned = (await db.execute(select(BookIssue.is_returned).filter(BookIssue.id == issue_id))).scalar_one_or_none()
+    if is_returned is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Book issue with ID {issue_id} not found.")
+    if is_returned:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Book issue ID {issue_id} has already been returned.")
+    # The issue exists and is active, so its book row must be missing
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Book related to issue ID {issue_id} not found. Cannot update copy count."
     )
-    issue_to_return = db_issue.scalars().first()
 
-    if not issue_to_return:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Book issue with ID {issue_id} not found.")
+def _restocked_copies(books, increment=1):
+    """num_copies_available + increment, never above num_copies_total."""
+    return case(
+        (books.c.num_copies_available + increment > books.c.num_copies_total, books.c.num_copies_total),
+        else_=books.c.num_copies_available + increment
+    )
 
-    # 2. Handle "already returned"
-    if issue_to_return.is_returned:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Book issue ID {issue_id} has already been returned.")
+async def return_book_issue(db: AsyncSession, issue_id: int) -> BookIssue:
+    """
+    Marks a book issue as returned and updates book copy count.
 
-    # 3. Mark is_returned = true, set actual_return_date with UTC timezone
-    issue_to_return.is_returned = True
-    issue_to_return.actual_return_date = datetime.now(timezone.utc)
-
-    # 4. Increment num_copies_available in the corresponding books table
-    # Ensure the book relationship was loaded
-    if not issue_to_return.book:
-        # This should not happen if eager loading worked and FK is valid
-        # As a fallback, fetch the book manually, though it's less efficient
-        book_to_update = await crud_book.get_book(db, book_id=issue_to_return.book_id)
-        if not book_to_update:
-            # This indicates a data integrity issue if the book_id in issue is invalid
-            # and wasn't caught by FK constraints (if they are deferred or not enforced)
-            await db.rollback() # Rollback the change to is_returned
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-                                detail=f"Book with ID {issue_to_return.book_id} related to issue ID {issue_id} not found. Cannot update copy count.")
-    else:
-        book_to_update = issue_to_return.book
-    
-    book_to_update.num_copies_available += 1
-    # We should also check if num_copies_available exceeds num_copies_total, which would be an anomaly.
-    if book_to_update.num_copies_available > book_to_update.num_copies_total:
-        # This indicates a potential logic error or data inconsistency.
-        # Decide on handling: cap it, log it, or raise an error.
-        # For now, let's cap it and perhaps log a warning (logging not implemented here).
-        print(f"Warning: num_copies_available ({book_to_update.num_copies_available}) for book ID {book_to_update.id} exceeded total ({book_to_update.num_copies_total}). Capping.")
-        book_to_update.num_copies_available = book_to_update.num_copies_total
-
-    db.add(issue_to_return) # Add updated issue to session
-    db.add(book_to_update) # Add updated book to session
+    On PostgreSQL this is one statement: a data-modifying CTE marks the issue returned (only if
+    it is still active), increments the book's available copies (capped at the total) and joins
+    the student, returning every row BookIssueResponse needs. Other databases run the same two
+    UPDATE ... RETURNING statements one after the other. Either way an extra query only runs
+    to explain a refusal (unknown or already returned issue). With availability slots the
+    copy goes back into one of the book's slots instead of the books row.
+    """
+    issues, books = BookIssue.__table__, Book.__table__
+    now = datetime.now(timezone.utc)
+    mark_returned = (
+        issues.update()
+        .where(issues.c.id == issue_id, issues.c.is_returned == False)
+        .values(is_returned=True, actual_return_date=now, updated_at=func.now())
+    )
 
     try:
+        if is_postgres(db) and not availability.slots_enabled(db):
+            returned = mark_returned.returning(*issues.c).cte("returned")
+            restocked = (
+                books.update()
+                .where(books.c.id == returned.c.book_id)
+                .values(num_copies_available=_restocked_copies(books), updated_at=func.now())
+                .returning(*books.c)
+                .cte("restocked")
+            )
+            returned_issue, restocked_book = aliased(BookIssue, returned), aliased(Book, restocked)
+            row = (await db.execute(
+                select(returned_issue, restocked_book, Student)
+                .join(restocked_book, restocked_book.id == returned_issue.book_id)
+                .join(Student, Student.id == returned_issue.student_id)
+                .execution_options(populate_existing=True)
+            )).first()
+            issue, book, student = row if row else (None, None, None)
+        else:
+            issue = (await db.execute(
+                select(BookIssue).from_statement(mark_returned.returning(*issues.c)).execution_options(populate_existing=True)
+            )).scalars().first()
+            book = student = None
+            if issue is not None and availability.slots_enabled(db):
+                await availability.release_copies(db, {issue.book_id: 1})
+                book = (await availability.load_books(db, [issue.book_id])).get(issue.book_id)
+                student = await db.get(Student, issue.student_id)
+            elif issue is not None:
+                book = (await db.execute(
+                    select(Book).from_statement(
+                        books.update()
+                        .where(books.c.id == issue.book_id)
+                        .values(num_copies_available=_restocked_copies(books), updated_at=func.now())
+                        .returning(*books.c)
+                    ).execution_options(populate_existing=True)
+                )).scalars().first()
+                student = await db.get(Student, issue.student_id)
+        if issue is None or book is None or student is None:
+            await db.rollback()
+            await _raise_return_refusal(db, issue_id)
+        await counters.bump(db, issued=-1)
         await db.commit()
-        await db.refresh(issue_to_return) # Refresh to get DB state
-        # Re-fetch with relations for the response, as refresh might not populate them if not already loaded by this point for issue_to_return
-        # or if the session state is complex after multiple adds.
-        # The previous selectinload on the initial fetch of issue_to_return should ideally cover this.
-        # If student/book are not populated, the BookIssueResponse model will show them as None.
-        # To be absolutely sure for the response, explicitly load again:
-        result = await db.execute(
-            select(BookIssue)
-            .options(selectinload(BookIssue.book), selectinload(BookIssue.student))
-            .filter(BookIssue.id == issue_to_return.id)
-        )
-        final_issue_state = result.scalar_one_or_none()
-        if final_issue_state is None:
-             raise HTTPException(status_code=500, detail="Failed to reload book issue with relations after return.")
-        return final_issue_state
-
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         # Log the exception e
@@ -183,52 +327,187 @@ async def return_book_issue(db: AsyncSession, issue_id: int) -> BookIssue:
             detail=f"An error occurred while returning the book: {str(e)}"
         )
 
+    set_committed_value(issue, "book", book)
+    set_committed_value(issue, "student", student)
+    book_cache.invalidate(book.id) # num_copies_available changed
+    return issue
+
+async def return_book_issues_bulk(db: AsyncSession, request: BulkReturnRequest) -> BulkReturnResponse:
+    """
+    Return many issues in one transaction, e.g. everything scanned from the drop box.
+
+    Items name an issue by ID or by ISBN + student (their active issue). Three statements do
+    all the work whatever the number of items: one query resolves every item, one UPDATE marks
+    the active issues returned (RETURNING what it actually changed), and one UPDATE adds the
+    per-book return counts through a CASE, capped at num_copies_total. Items that are unknown
+    or already returned are reported per item and do not stop the others.
+    """
+    issue_ids = {item.issue_id for item in request.items if item.issue_id is not None}
+    pairs = {(item.isbn, item.student_id) for item in request.items if item.issue_id is None}
+    references = []
+    if issue_ids:
+        references.append(BookIssue.id.in_(issue_ids))
+    if pairs:
+        references.append(tuple_(Book.isbn, BookIssue.student_id).in_(pairs))
+    rows = (await db.execute(
+        select(BookIssue.id, BookIssue.book_id, BookIssue.student_id, BookIssue.is_returned, Book.isbn)
+        .join(Book, Book.id == BookIssue.book_id)
+        .filter(or_(*references))
+    )).all()
+
+    by_id = {row.id: row for row in rows}
+    by_pair: dict[tuple[str, int], object] = {}
+    for row in rows:
+        # Prefer the active issue of an ISBN + student pair over its past, returned ones
+        current = by_pair.get((row.isbn, row.student_id))
+        if current is None or (current.is_returned and not row.is_returned):
+            by_pair[(row.isbn, row.student_id)] = row
+
+    resolved = [by_id.get(item.issue_id) if item.issue_id is not None else by_pair.get((item.isbn, item.student_id)) for item in request.items]
+    to_return = {row.id for row in resolved if row is not None and not row.is_returned}
+
+    returned_ids: set[int] = set()
+    if to_return:
+        issues, books = BookIssue.__table__, Book.__table__
+        try:
+            returned = await db.execute(
+                issues.update()
+                .where(issues.c.id.in_(to_return), issues.c.is_returned == False)
+                .values(is_returned=True, actual_return_date=datetime.now(timezone.utc), updated_at=func.now())
+                .returning(issues.c.id, issues.c.book_id)
+            )
+            increments: dict[int, int] = {}
+            for issue_id, book_id in returned.all():
+                returned_ids.add(issue_id)
+                increments[book_id] = increments.get(book_id, 0) + 1
+            if increments and availability.slots_enabled(db):
+                await availability.release_copies(db, increments)
+            elif increments:
+                await db.execute(
+                    books.update()
+                    .where(books.c.id.in_(increments))
+                    .values(
+                        num_copies_available=_restocked_copies(books, case(increments, value=books.c.id, else_=0)),
+                        updated_at=func.now()
+                    )
+                )
+            await counters.bump(db, issued=-len(returned_ids))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            # Log the exception e
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"An error occurred while returning the books: {str(e)}"
+            )
+        for row in rows:
+            if row.id in returned_ids:
+                book_cache.invalidate(row.book_id) # num_copies_available changed
+
+    results = []
+    reported: set[int] = set()
+    for item, row in zip(request.items, resolved):
+        if row is None:
+            reference = f"ID {item.issue_id}" if item.issue_id is not None else f"for ISBN {item.isbn} and student ID {item.student_id}"
+            results.append(BulkReturnItemResult(
+                issue_id=item.issue_id, isbn=item.isbn, student_id=item.student_id,
+                status="not_found", detail=f"Book issue {reference} not found."
+            ))
+        elif row.id in returned_ids and row.id not in reported:
+            reported.add(row.id)
+            results.append(BulkReturnItemResult(issue_id=row.id, isbn=row.isbn, student_id=row.student_id, status="returned"))
+        else:
+            # Returned before, by a concurrent request, or listed twice in this batch
+            results.append(BulkReturnItemResult(
+                issue_id=row.id, isbn=row.isbn, student_id=row.student_id,
+                status="already_returned", detail=f"Book issue ID {row.id} has already been returned."
+            ))
+    returned_count = sum(1 for result in results if result.status == "returned")
+    return BulkReturnResponse(returned=returned_count, failed=len(results) - returned_count, results=results)
+
+# Largest value a PostgreSQL INTEGER primary key can hold
+_MAX_STUDENT_ID = 2**31 - 1
+
+def _classify_student_identifier(identifier: str):
+    """
+    Turn a front-desk identifier into (where clause, preference order) for a student lookup.
+
+    Numeric identifiers may be an ID, a roll number or a phone number (an ID match wins, as it
+    always has); anything with an "@" can only be an email; everything else is a roll number
+    or a phone number. Each branch only touches columns with a unique index.
+    """
+    if "@" in identifier:
+        return Student.email == identifier, Student.id
+    candidates = [Student.roll_number == identifier, Student.phone == identifier]
+    if identifier.isascii() and identifier.isdigit() and int(identifier) <= _MAX_STUDENT_ID:
+        student_id = int(identifier)
+        return or_(Student.id == student_id, *candidates), case((Student.id == student_id, 0), else_=1)
+    return or_(*candidates), Student.id
+
+async def _load_student_with_active_issues(db: AsyncSession, condition, preference) -> tuple[Student | None, List[BookIssue]]:
+    """Fetch the best matching student together with their active issues (and books) in one statement."""
+    stmt = (
+        select(Student, BookIssue, Book)
+        .outerjoin(BookIssue, and_(BookIssue.student_id == Student.id, BookIssue.is_returned == False))
+        .outerjoin(Book, Book.id == BookIssue.book_id)
+        .filter(condition)
+        .order_by(preference, Student.id, BookIssue.issue_date.desc())
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return None, []
+    student = rows[0].Student
+    issues = []
+    for row in rows:
+        if row.Student is not student:
+            break # A lower-preference match; only the first student is wanted
+        if row.BookIssue is None:
+            continue
+        # Attach the already loaded rows so the response never triggers a lazy load
+        set_committed_value(row.BookIssue, "student", student)
+        set_committed_value(row.BookIssue, "book", row.Book)
+        issues.append(row.BookIssue)
+    return student, issues
+
 async def get_active_issues_by_student_identifier(db: AsyncSession, identifier: str) -> List[BookIssue]:
-    """Get all active (not returned) book issues for a student, identified by ID, roll number, email, or phone."""
-    student: Student | None = None
-    
-    # 1. Identify student
-    # Try to convert identifier to int for ID search first
-    try:
-        student_id_int = int(identifier)
-        student = await crud_student.get_student(db, student_id=student_id_int)
-    except ValueError:
-        # Identifier is not an integer, try other fields
-        pass # student remains None, will be handled below
+    """
+    Get all active (not returned) book issues for a student, identified by ID, roll number, email, or phone.
 
-    if not student:
-        # If not found by ID or identifier was not an int, search by unique string fields
-        student = await crud_student.get_student_by_unique_fields(db, roll_number=identifier, email=identifier, phone=identifier)
+    The student and their issues come back from a single query. Resolved identifiers are
+    remembered in `student_lookup_cache`, so repeat scans become a primary-key lookup.
+    """
+    cached_id = student_lookup_cache.get(identifier)
+    if cached_id is not None:
+        student, issues = await _load_student_with_active_issues(db, Student.id == cached_id, Student.id)
+        if student:
+            return issues
+        student_lookup_cache.discard(identifier)
 
+    condition, preference = _classify_student_identifier(identifier)
+    student, issues = await _load_student_with_active_issues(db, condition, preference)
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Student with identifier '{identifier}' not found."
         )
-
-    # 2. Query book_issues for active issues for that student, joining with books table
-    stmt = (
-        select(BookIssue)
-        .join(BookIssue.book) # Ensure book details are loaded (can also use selectinload for separate query)
-        .filter(BookIssue.student_id == student.id)
-        .filter(BookIssue.is_returned == False) # Active issues only
-        .options(selectinload(BookIssue.book), selectinload(BookIssue.student)) # Eager load for response
-        .order_by(BookIssue.issue_date.desc()) # Optional: order by issue date
-    )
-    result = await db.execute(stmt)
-    active_issues = result.scalars().all()
-    return list(active_issues)
+    student_lookup_cache.put(identifier, student.id)
+    return issues
 
 async def get_overdue_book_issues(db: AsyncSession) -> List[BookIssue]:
-    """Get all active book issues that are overdue."""
-    today = datetime.utcnow().date() # Use .date() for comparison with expected_return_date
-    
+    """
+    Get all active book issues that are overdue.
+
+    Due dates are stored as midnight UTC, so "due before today" is the plain range
+    ``expected_return_date < today 00:00 UTC``, which the partial index on active issues'
+    due dates answers directly (wrapping the column in date() would force a full scan).
+    """
+    start_of_today = _utc_midnight(datetime.now(timezone.utc).date())
+
     stmt = (
         select(BookIssue)
         .options(selectinload(BookIssue.book), selectinload(BookIssue.student))
         .filter(BookIssue.is_returned == False)
-        # Only include books where the expected return date (converted to date) is earlier than today
-        .filter(func.date(BookIssue.expected_return_date) < today) 
+        .filter(BookIssue.expected_return_date < start_of_today)
         .order_by(BookIssue.expected_return_date.asc())
     )
     result = await db.execute(stmt)
@@ -237,11 +516,8 @@ async def get_overdue_book_issues(db: AsyncSession) -> List[BookIssue]:
 
 async def get_due_soon_book_issues(db: AsyncSession, days_window: int = 5) -> List[BookIssue]:
     """Get all active book issues that are due from today up to `days_window` days from now."""
-    today_utc = datetime.utcnow()
-    # Ensure we are comparing date parts if needed, or full datetime if appropriate
-    # Start of today (00:00:00 UTC)
-    start_of_today = today_utc.replace(hour=0, minute=0, second=0, microsecond=0)
-    # End of the Nth day from now (effectively start of N+1th day)
+    # From the start of today (00:00:00 UTC) up to the start of the day after the Nth day from now
+    start_of_today = _utc_midnight(datetime.now(timezone.utc).date())
     end_date_utc = start_of_today + timedelta(days=days_window + 1)
 
     stmt = (
@@ -254,4 +530,120 @@ async def get_due_soon_book_issues(db: AsyncSession, days_window: int = 5) -> Li
     )
     result = await db.execute(stmt)
     due_soon_issues = result.scalars().all()
-    return list(due_soon_issues) 
\ No newline at end of file
+    return list(due_soon_issues)
+
+def _apply_issue_filters(
+    query,
+    student_id: int | None = None,
+    book_id: int | None = None,
+    is_returned: bool | None = None,
+    issued_from: date | None = None,
+    issued_to: date | None = None,
+    department: str | None = None,
+    overdue: bool | None = None,
+    due_from: date | None = None,
+    due_to: date | None = None
+):
+    """
+    Apply the filters shared by the issue listing/export queries. Date bounds are inclusive days (UTC).
+
+    Every filter is a plain range or equality on a book_issues column (department becomes an
+    IN over the matching students), so none of them needs a join and all of them can use an index.
+    """
+    if student_id is not None:
+        query = query.filter(BookIssue.student_id == student_id)
+    if book_id is not None:
+        query = query.filter(BookIssue.book_id == book_id)
+    if is_returned is not None:
+        query = query.filter(BookIssue.is_returned == is_returned)
+    if issued_from:
+        query = query.filter(BookIssue.issue_date >= _utc_midnight(issued_from))
+    if issued_to:
+        query = query.filter(BookIssue.issue_date < _utc_midnight(issued_to + timedelta(days=1)))
+    if department:
+        query = query.filter(BookIssue.student_id.in_(select(Student.id).filter(Student.department.ilike(f"%{department}%"))))
+    if overdue is not None:
+        # Overdue: still out and due before today (UTC), the same rule as BookIssue.is_overdue
+        start_of_today = _utc_midnight(datetime.now(timezone.utc).date())
+        if overdue:
+            query = query.filter(BookIssue.is_returned == False, BookIssue.expected_return_date < start_of_today)
+        else:
+            query = query.filter(or_(BookIssue.is_returned == True, BookIssue.expected_return_date >= start_of_today))
+    if due_from:
+        query = query.filter(BookIssue.expected_return_date >= _utc_midnight(due_from))
+    if due_to:
+        query = query.filter(BookIssue.expected_return_date < _utc_midnight(due_to + timedelta(days=1)))
+    return query
+
+ISSUE_SUMMARY_COLUMNS = (
+    BookIssue.id, BookIssue.book_id, BookIssue.student_id, BookIssue.issue_date,
+    BookIssue.expected_return_date, BookIssue.actual_return_date, BookIssue.is_returned,
+    Book.title.label("book_title"), Book.isbn.label("book_isbn"),
+    Student.name.label("student_name"), Student.roll_number.label("student_roll_number"),
+    Student.department.label("student_department"),
+)
+
+async def get_book_issues(
+    db: AsyncSession, skip: int = 0, limit: int = 20,
+    student_id: int | None = None,
+    book_id: int | None = None,
+    is_returned: bool | None = None,
+    issued_from: date | None = None,
+    issued_to: date | None = None,
+    department: str | None = None,
+    overdue: bool | None = None,
+    due_from: date | None = None,
+    due_to: date | None = None,
+    after: str | None = None,
+    total_mode: str = "exact"
+) -> tuple[list, int | None]:
+    """
+    Issue history, newest first, as summary rows (see ISSUE_SUMMARY_COLUMNS).
+
+    The page is one statement: the issues joined to just the book and student columns a listing
+    shows, instead of loading both related rows per issue. Results are ordered by
+    (issue_date, id) descending; an ``after`` cursor seeks past a row on the matching index
+    instead of using ``skip``. The total follows ``total_mode`` as in the other list endpoints.
+    """
+    filters = dict(
+        student_id=student_id, book_id=book_id, is_returned=is_returned, issued_from=issued_from,
+        issued_to=issued_to, department=department, overdue=overdue, due_from=due_from, due_to=due_to
+    )
+    filtered_query = _apply_issue_filters(select(BookIssue.id), **filters)
+    query = _apply_issue_filters(
+        select(*ISSUE_SUMMARY_COLUMNS)
+        .join(Book, Book.id == BookIssue.book_id)
+        .join(Student, Student.id == BookIssue.student_id),
+        **filters
+    )
+    query = apply_keyset(db, query, BookIssue.issue_date, BookIssue.id, after=after, sort_by="issue_date", descending=True)
+    if not after:
+        query = query.offset(skip)
+    query = query.limit(limit)
+    return await fetch_page(
+        db, query, filtered_query, total_mode=total_mode, skip=skip, seeked=bool(after), single_entity=False
+    )
+
+ISSUE_EXPORT_COLUMNS = (
+    "id", "book_id", "student_id", "issue_date", "expected_return_date", "actual_return_date",
+    "is_returned", "created_at", "updated_at"
+)
+
+async def stream_book_issues(
+    db: AsyncSession,
+    student_id: int | None = None,
+    book_id: int | None = None,
+    is_returned: bool | None = None,
+    issued_from: date | None = None,
+    issued_to: date | None = None,
+    yield_per: int = 1000
+) -> AsyncIterator[Mapping]:
+    """Yield every issue record matching the filters, in id order, from a server-side cursor."""
+    query = _apply_issue_filters(
+        select(*(getattr(BookIssue, column) for column in ISSUE_EXPORT_COLUMNS)),
+        student_id=student_id, book_id=book_id, is_returned=is_returned,
+        issued_from=issued_from, issued_to=issued_to
+    ).order_by(BookIssue.id).execution_options(yield_per=yield_per)
+    result = await db.stream(query)
+    async for row in result.mappings():
+        yield row
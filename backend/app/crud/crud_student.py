@@ -1,11 +1,23 @@
+from datetime import datetime
+from typing import AsyncIterator, Mapping
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import insert, update
+from pydantic import ValidationError
 from fastapi import HTTPException, status
 
+from app.db.utils import is_postgres
 from app.models.student import Student
-from app.schemas.student import StudentCreate, StudentUpdate # StudentUpdate will be used later
+from app.crud.pagination import apply_keyset, fetch_page
+from app.crud import counters
+from app.services.suggestion_index import index_student, student_suggestions
+from app.services.catalog_cache import student_lookup_cache
+from app.schemas.student import StudentCreate, StudentUpdate, SemesterRolloverRequest, SemesterRolloverResult # StudentUpdate will be used later
+from app.schemas.bulk import BulkRowError, BulkImportReport
+from app.utils.bulk_import import RowParseError, chunked, record_key, validation_messages
 
 async def get_student_by_unique_fields(db: AsyncSession, roll_number: str | None = None, email: str | None = None, phone: str | None = None) -> Student | None:
     conditions = []
@@ -22,6 +34,10 @@ async def get_student_by_unique_fields(db: AsyncSession, roll_number: str | None
     result = await db.execute(select(Student).filter(or_(*conditions)))
     return result.scalars().first()
 
+def _lookup_identifiers(student_id: int, *values: str | None) -> list[str]:
+    """What a student can be looked up by at the issue desk: their ID and each of roll number, email and phone."""
+    return [str(student_id), *(value for value in values if value)]
+
 async def create_student(db: AsyncSession, student_in: StudentCreate) -> Student:
     """Create a new student in the database."""
     # Check for uniqueness of roll_number, email, and phone
@@ -54,6 +70,7 @@ async def create_student(db: AsyncSession, student_in: StudentCreate) -> Student
     )
     db.add(db_student)
     try:
+        await counters.bump(db, students=1)
         await db.commit()
         await db.refresh(db_student)
     except IntegrityError as e:
@@ -72,48 +89,202 @@ async def create_student(db: AsyncSession, student_in: StudentCreate) -> Student
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Student with {conflict_field} already exists (database constraint)."
         )
+    student_lookup_cache.forget(_lookup_identifiers(db_student.id, db_student.roll_number, db_student.email, db_student.phone))
+    index_student(db_student)
     return db_student
 
+# Unique student fields and how conflicts on them are worded, as in create_student
+STUDENT_UNIQUE_FIELDS = (("roll_number", "Roll Number"), ("email", "Email"), ("phone", "Phone"))
+
+def _conflict_message(record: dict, taken: dict[str, dict[str, str]], suffix: str = "already exists") -> str | None:
+    """``"Student with conflicting unique field(s) ...: Roll Number (x) Email (y)"`` or None without conflicts."""
+    conflicts = [
+        f"{label} ({record[field]})" + (f" {taken[field][record[field]]}" if taken[field][record[field]] else "")
+        for field, label in STUDENT_UNIQUE_FIELDS if record[field] in taken[field]
+    ]
+    if not conflicts:
+        return None
+    return f"Student with conflicting unique field(s) {suffix}: " + " ".join(conflicts)
+
+async def _insert_student_rows(db: AsyncSession, rows: list[dict]) -> list:
+    """
+    Insert validated student rows in one multi-row statement; returns (id, name, roll_number) of the inserted rows.
+
+    On PostgreSQL rows that lost a race against a concurrent insert are skipped via
+    ON CONFLICT DO NOTHING instead of failing the whole chunk.
+    """
+    returning = (Student.id, Student.name, Student.roll_number)
+    if is_postgres(db):
+        statement = pg_insert(Student).on_conflict_do_nothing().returning(*returning)
+    else:
+        statement = insert(Student).returning(*returning)
+    result = await db.execute(statement, rows)
+    return result.all()
+
+async def import_students(
+    db: AsyncSession, records: AsyncIterator[tuple[int, dict | RowParseError]], chunk_size: int = 1000
+) -> BulkImportReport:
+    """
+    Bulk-enroll students from a stream of ``(row_number, record)`` pairs (see app.utils.bulk_import).
+
+    Each chunk is validated against StudentCreate, checked for roll number / email / phone
+    conflicts with one query (an OR of three IN lists), inserted in one multi-row statement and
+    committed. Conflicts with existing students or with earlier rows of the upload are reported
+    per row, worded like create_student's 409, and the row is skipped.
+    """
+    received = imported = 0
+    errors: list[BulkRowError] = []
+
+    async for chunk in chunked(records, chunk_size):
+        received += len(chunk)
+        candidates: dict[str, tuple[int, dict]] = {}
+        # value -> "" (existing student) or "(row N of the upload)", per unique field
+        seen: dict[str, dict[str, str]] = {field: {} for field, _ in STUDENT_UNIQUE_FIELDS}
+        for row_number, record in chunk:
+            if isinstance(record, RowParseError):
+                errors.append(BulkRowError(row=row_number, errors=validation_messages(record)))
+                continue
+            try:
+                student_in = StudentCreate.model_validate(record)
+            except ValidationError as e:
+                errors.append(BulkRowError(row=row_number, key=record_key(record, "roll_number"), errors=validation_messages(e)))
+                continue
+            row = student_in.model_dump()
+            duplicate = _conflict_message(row, seen, suffix="appears more than once in the upload")
+            if duplicate:
+                errors.append(BulkRowError(row=row_number, key=row["roll_number"], errors=[duplicate]))
+                continue
+            for field, _ in STUDENT_UNIQUE_FIELDS:
+                seen[field][row[field]] = f"(first at row {row_number})"
+            candidates[row["roll_number"]] = (row_number, row)
+        if not candidates:
+            continue
+
+        rows = [row for _, row in candidates.values()]
+        existing = await db.execute(
+            select(Student.roll_number, Student.email, Student.phone).filter(or_(
+                Student.roll_number.in_([row["roll_number"] for row in rows]),
+                Student.email.in_([row["email"] for row in rows]),
+                Student.phone.in_([row["phone"] for row in rows]),
+            ))
+        )
+        taken: dict[str, dict[str, str]] = {field: {} for field, _ in STUDENT_UNIQUE_FIELDS}
+        for student in existing.all():
+            for field, _ in STUDENT_UNIQUE_FIELDS:
+                taken[field][getattr(student, field)] = ""
+        for roll_number, (row_number, row) in list(candidates.items()):
+            conflict = _conflict_message(row, taken)
+            if conflict:
+                del candidates[roll_number]
+                errors.append(BulkRowError(row=row_number, key=roll_number, errors=[conflict]))
+        if not candidates:
+            continue
+
+        inserted = await _insert_student_rows(db, [row for _, row in candidates.values()])
+        await counters.bump(db, students=len(inserted))
+        await db.commit()
+        imported += len(inserted)
+        inserted_rolls = {student.roll_number for student in inserted}
+        student_lookup_cache.forget(
+            identifier for student in inserted
+            for identifier in _lookup_identifiers(student.id, *(candidates[student.roll_number][1][field] for field, _ in STUDENT_UNIQUE_FIELDS))
+        )
+        student_suggestions.upsert_many(
+            (student.id, student.name, student.roll_number, (student.name, student.roll_number)) for student in inserted
+        )
+        for roll_number, (row_number, _) in candidates.items():
+            if roll_number not in inserted_rolls:
+                errors.append(BulkRowError(
+                    row=row_number, key=roll_number,
+                    errors=["Student with conflicting unique field(s) already exists (database constraint)."]
+                ))
+
+    errors.sort(key=lambda error: error.row)
+    return BulkImportReport(received=received, imported=imported, failed=len(errors), errors=errors)
+
 async def get_student(db: AsyncSession, student_id: int) -> Student | None:
     result = await db.execute(select(Student).filter(Student.id == student_id))
     return result.scalars().first()
 
-async def get_students(
-    db: AsyncSession, 
-    skip: int = 0, 
-    limit: int = 100,
+async def get_student_updated_at(db: AsyncSession, student_id: int) -> datetime | None:
+    """Just the row version used for ETags; answered from the (id, updated_at) index alone."""
+    result = await db.execute(select(Student.updated_at).filter(Student.id == student_id))
+    return result.scalar_one_or_none()
+
+# Sort keys accepted by get_students; each has a matching (column, id) index for keyset pagination
+STUDENT_SORT_COLUMNS = {
+    "id": Student.id,
+    "name": Student.name,
+    "roll_number": Student.roll_number,
+    "created_at": Student.created_at,
+}
+
+def _apply_student_filters(
+    query,
     department: str | None = None,
     semester: int | None = None,
-    name: str | None = None, # For partial match search
-    roll_number: str | None = None, # For partial match search
-    phone: str | None = None # For partial match search
-) -> tuple[list[Student], int]:
-    query = select(Student)
-    count_query = select(func.count()).select_from(Student)
-
+    name: str | None = None,
+    roll_number: str | None = None,
+    phone: str | None = None
+):
+    """Apply the list/search filters shared by the student listing queries."""
     if department:
         query = query.filter(Student.department.ilike(f"%{department}%"))
-        count_query = count_query.filter(Student.department.ilike(f"%{department}%"))
     if semester is not None:
         query = query.filter(Student.semester == semester)
-        count_query = count_query.filter(Student.semester == semester)
     if name:
         query = query.filter(Student.name.ilike(f"%{name}%"))
-        count_query = count_query.filter(Student.name.ilike(f"%{name}%"))
     if roll_number:
         query = query.filter(Student.roll_number.ilike(f"%{roll_number}%"))
-        count_query = count_query.filter(Student.roll_number.ilike(f"%{roll_number}%"))
     if phone:
         query = query.filter(Student.phone.ilike(f"%{phone}%"))
-        count_query = count_query.filter(Student.phone.ilike(f"%{phone}%"))
+    return query
+
+async def get_students(
+    db: AsyncSession, 
+    skip: int = 0, 
+    limit: int = 100,
+    department: str | None = None,
+    semester: int | None = None,
+    name: str | None = None, # For partial match search
+    roll_number: str | None = None, # For partial match search
+    phone: str | None = None, # For partial match search
+    sort_by: str = "id",
+    after: str | None = None, # Keyset cursor; takes precedence over skip
+    total_mode: str = "exact" # exact | estimate | none, see app.crud.pagination.TOTAL_MODES
+) -> tuple[list[Student], int | None]:
+    if sort_by not in STUDENT_SORT_COLUMNS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cannot sort students by '{sort_by}'.")
+    filtered_query = _apply_student_filters(
+        select(Student),
+        department=department, semester=semester, name=name, roll_number=roll_number, phone=phone
+    )
 
-    total_students_result = await db.execute(count_query)
-    total_students = total_students_result.scalar_one_or_none() or 0
+    query = apply_keyset(db, filtered_query, STUDENT_SORT_COLUMNS[sort_by], Student.id, after=after, sort_by=sort_by)
+    if not after:
+        query = query.offset(skip)
+    query = query.limit(limit)
+    return await fetch_page(db, query, filtered_query, total_mode=total_mode, skip=skip, seeked=bool(after))
 
-    query = query.order_by(Student.id).offset(skip).limit(limit)
-    students_result = await db.execute(query)
-    students = students_result.scalars().all()
-    return list(students), total_students
+STUDENT_EXPORT_COLUMNS = ("id", "name", "roll_number", "department", "semester", "phone", "email", "created_at", "updated_at")
+
+async def stream_students(
+    db: AsyncSession,
+    department: str | None = None,
+    semester: int | None = None,
+    name: str | None = None,
+    roll_number: str | None = None,
+    phone: str | None = None,
+    yield_per: int = 1000
+) -> AsyncIterator[Mapping]:
+    """Yield every student matching the get_students filters, in id order, from a server-side cursor."""
+    query = _apply_student_filters(
+        select(*(getattr(Student, column) for column in STUDENT_EXPORT_COLUMNS)),
+        department=department, semester=semester, name=name, roll_number=roll_number, phone=phone
+    ).order_by(Student.id).execution_options(yield_per=yield_per)
+    result = await db.stream(query)
+    async for row in result.mappings():
+        yield row
 
 async def update_student(db: AsyncSession, db_student: Student, student_in: StudentUpdate) -> Student:
     update_data = student_in.model_dump(exclude_unset=True)
@@ -156,4 +327,49 @@ async def update_student(db: AsyncSession, db_student: Student, student_in: Stud
             conflict_field = f"Phone ({student_in.phone})"
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Student with {conflict_field} already exists (DB constraint).")
 
-    return db_student 
\ No newline at end of file
+    student_lookup_cache.invalidate(db_student.id) # Email/phone may have changed
+    student_lookup_cache.forget(_lookup_identifiers(db_student.id, db_student.roll_number, db_student.email, db_student.phone))
+    index_student(db_student)
+    return db_student 
+
+# Highest semester a student can be in (matches the StudentBase validation)
+MAX_SEMESTER = 12
+
+async def rollover_semesters(db: AsyncSession, rollover: SemesterRolloverRequest) -> SemesterRolloverResult:
+    """
+    Advance or set the semester of a whole cohort with one set-based UPDATE.
+
+    The cohort is every student matching ``department`` / ``semester`` (both optional). Students
+    who would pass MAX_SEMESTER are left unchanged and reported as ``skipped_at_max``. The counts
+    come from a single aggregate over the cohort, so a dry run costs one query. The department
+    is matched case-insensitively, served by the lower(department), semester index.
+    """
+    conditions = []
+    if rollover.department:
+        conditions.append(func.lower(Student.department) == rollover.department.lower())
+    if rollover.semester is not None:
+        conditions.append(Student.semester == rollover.semester)
+
+    if rollover.set_to is not None:
+        new_semester = rollover.set_to
+        changes = Student.semester != rollover.set_to
+    else:
+        new_semester = Student.semester + rollover.advance_by
+        changes = Student.semester + rollover.advance_by <= MAX_SEMESTER
+
+    counts = (await db.execute(
+        select(func.count().label("matched"), func.count().filter(changes).label("changing")).filter(*conditions)
+    )).one()
+    # With set_to, students already in the target semester are simply unchanged, not skipped
+    skipped = 0 if rollover.set_to is not None else counts.matched - counts.changing
+    if rollover.dry_run:
+        return SemesterRolloverResult(matched=counts.matched, updated=counts.changing, skipped_at_max=skipped, dry_run=True)
+
+    result = await db.execute(
+        update(Student)
+        .filter(*conditions, changes)
+        .values(semester=new_semester, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return SemesterRolloverResult(matched=counts.matched, updated=result.rowcount, skipped_at_max=skipped, dry_run=False)
@@ -0,0 +1,161 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_, func, select, literal, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.utils import is_postgres
+
+# How list endpoints report `total`:
+# - exact:    counted in the same statement as the page (window count)
+# - estimate: the planner's row estimate for the filtered query (PostgreSQL; exact elsewhere)
+# - none:     not computed at all
+TOTAL_MODES = ("exact", "estimate", "none")
+
+
+def default_total_mode(total_mode: str | None, after: str | None) -> str:
+    """
+    The total mode of a list request that did not ask for one: exact for offset pages, none for
+    cursor pages, which would otherwise pay a count over every match to fetch a single page.
+    """
+    if total_mode is not None:
+        return total_mode
+    return "none" if after else "exact"
+
+
+def encode_cursor(sort_by: str, sort_value: Any, row_id: int) -> str:
+    """Build an opaque keyset cursor pointing just after the row (sort_value, row_id)."""
+    payload: dict[str, Any] = {"s": sort_by, "i": row_id}
+    if isinstance(sort_value, datetime):
+        payload["v"] = sort_value.isoformat()
+        payload["t"] = "dt"
+    else:
+        payload["v"] = sort_value
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple[Any, int]:
+    """Decode a cursor produced by `encode_cursor`, checking it was issued for the same sort order."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        sort_value = payload["v"]
+        if payload.get("t") == "dt":
+            sort_value = datetime.fromisoformat(sort_value)
+        row_id = int(payload["i"])
+        cursor_sort_by = payload["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    if cursor_sort_by != sort_by:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cursor was issued for sort_by='{cursor_sort_by}', not '{sort_by}'."
+        )
+    return sort_value, row_id
+
+
+def _sort_key(db: AsyncSession, column):
+    """
+    SQLite keeps timestamps as text, with fractional seconds when SQLAlchemy wrote them and
+    without when a server default (CURRENT_TIMESTAMP) did, so they are compared by julianday().
+    """
+    if not is_postgres(db) and isinstance(column.type, DateTime):
+        return func.julianday(column)
+    return column
+
+
+def apply_keyset(db: AsyncSession, query, sort_column, id_column, after: str | None, sort_by: str, descending: bool = False):
+    """
+    Order `query` by (sort_column, id) and, when a cursor is given, seek past it.
+
+    The row-value comparison lets the (sort_column, id) index jump straight to the next page,
+    so the cost of a page does not grow with its depth the way OFFSET does. With `descending`
+    both keys are reversed (newest first), which the same index serves by scanning backwards.
+    """
+    sort_key = sort_column if sort_column is id_column else _sort_key(db, sort_column)
+    if after:
+        sort_value, row_id = decode_cursor(after, sort_by)
+        if sort_column is id_column:
+            query = query.filter(id_column < row_id if descending else id_column > row_id)
+        else:
+            key = tuple_(sort_key, id_column)
+            cursor_key = tuple_(_sort_key(db, literal(sort_value, sort_column.type)), row_id)
+            query = query.filter(key < cursor_key if descending else key > cursor_key)
+    columns = [id_column] if sort_column is id_column else [sort_key, id_column]
+    return query.order_by(*(column.desc() if descending else column for column in columns))
+
+
+def next_cursor(rows: Sequence[Any], limit: int, sort_by: str) -> str | None:
+    """Cursor for the page following `rows`, or None when this page was the last one."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(sort_by, getattr(last, sort_by), last.id)
+
+
+async def estimate_count(db: AsyncSession, filtered_query) -> int:
+    """
+    Row count of `filtered_query` as estimated by the PostgreSQL planner (EXPLAIN, nothing is executed).
+    Other databases have no comparable estimate, so they get an exact count.
+    """
+    if not is_postgres(db):
+        return await exact_count(db, filtered_query)
+    compiled = filtered_query.compile(dialect=db.get_bind().dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    conn = await db.connection()
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def exact_count(db: AsyncSession, filtered_query) -> int:
+    result = await db.execute(select(func.count()).select_from(filtered_query.subquery()))
+    return result.scalar_one_or_none() or 0
+
+
+async def fetch_page(
+    db: AsyncSession, page_query, filtered_query, total_mode: str = "exact",
+    skip: int = 0, seeked: bool = False, single_entity: bool = True
+) -> tuple[list[Any], int | None]:
+    """
+    Run a list query and work out its total according to `total_mode` (see TOTAL_MODES).
+
+    `page_query` is the ordered, limited query for a single entity; `filtered_query` is the same
+    selection without ordering, paging or keyset seek (`seeked` tells whether the page query has one).
+    In exact mode the total rides along on every row of the page, so page and total cost one
+    round trip: as `count(*) OVER ()` for offset pages, or as an uncorrelated count subquery when
+    the keyset seek would otherwise hide the rows before the cursor from the window. Only an empty
+    page past the first one needs a separate count, since it has no rows to carry the total.
+    With ``single_entity=False`` the items are the selected rows themselves (attribute access by
+    column label) rather than the single entity of each row.
+    """
+    if total_mode not in TOTAL_MODES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown total mode '{total_mode}'.")
+
+    if total_mode == "exact":
+        if seeked:
+            total_column = select(func.count()).select_from(filtered_query.subquery()).scalar_subquery()
+        else:
+            total_column = func.count().over()
+        result = await db.execute(page_query.add_columns(total_column.label("total_count")))
+        rows = result.all()
+        if rows:
+            return [row[0] if single_entity else row for row in rows], rows[0].total_count
+        total = await exact_count(db, filtered_query) if (skip or seeked) else 0
+        return [], total
+
+    result = await db.execute(page_query)
+    items = list(result.scalars().all() if single_entity else result.all())
+    if total_mode == "estimate":
+        return items, await estimate_count(db, filtered_query)
+    return items, None
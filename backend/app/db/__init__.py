@@ -9,6 +9,10 @@ from .base_class import Base
 from app.models.book import Book # noqa
 from app.models.student import Student # noqa
 from app.models.book_issue import BookIssue # noqa
+from app.models.idempotency import IdempotencyRecord # noqa
+from app.models.book_copy_slot import BookCopySlot # noqa
+from app.models.circulation import CirculationDaily, RollupWatermark # noqa
+from app.models.counter import LibraryCounter # noqa
 
 # You can also make engine and SessionLocal available through backend.app.db
 # from .database import engine, AsyncSessionLocal, create_db_and_tables # Optional convenience
@@ -19,6 +23,11 @@ __all__ = [
     "Book",
     "Student",
     "BookIssue",
+    "IdempotencyRecord",
+    "BookCopySlot",
+    "CirculationDaily",
+    "RollupWatermark",
+    "LibraryCounter",
     # "engine", # Uncomment if you want to re-export
     # "AsyncSessionLocal", # Uncomment if you want to re-export
     # "create_db_and_tables", # Uncomment if you want to re-export
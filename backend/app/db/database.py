@@ -1,4 +1,8 @@
 # backend/app/db/database.py
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -8,6 +12,7 @@ from app.core.config import settings
 # import app.db
 # from app.db.base_class import Base # Base is needed for Base.metadata.create_all
 from app.db import Base
+from app.models.book import has_search_vector
 
 # Commented out model imports are no longer needed here as app.db handles it
 # # import app.models.book # noqa
@@ -16,6 +21,8 @@ from app.db import Base
 # If you have an app.models.__init__.py that imports all models,
 # you could potentially just import app.models here.
 
+logger = logging.getLogger(__name__)
+
 # Create an async engine instance
 # The engine is typically defined here and imported by main.py or session.py
 engine = create_async_engine(
@@ -45,8 +52,63 @@ async def create_db_and_tables():
     async with engine.begin() as conn:
         # await conn.run_sync(Base.metadata.drop_all) # Use with caution: drops all data!
         await conn.run_sync(Base.metadata.create_all)
+    await create_missing_indexes()
     print("Database tables created (if they didn't exist).")
 
+async def create_missing_indexes():
+    """Build the indexes declared on the models that the database lacks (see _create_missing_indexes)."""
+    if engine.dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.run_sync(_create_missing_indexes)
+            if not await conn.run_sync(has_search_vector):
+                logger.warning("books.search_vector is missing, so book search will fail; run `python -m app.cli migrate`.")
+    else:
+        async with engine.begin() as conn:
+            await conn.run_sync(_create_missing_indexes)
+
+def _create_missing_indexes(sync_conn):
+    """
+    create_all() only creates indexes together with their (new) table, so indexes
+    added to a model after its table already exists would never be built.
+    Create any index that is declared on the models but missing in the database.
+
+    On PostgreSQL (in autocommit) they are built CONCURRENTLY, so a large existing table stays
+    writable while e.g. its trigram indexes build. An index left INVALID by an interrupted
+    build is dropped and built again; a build that fails (say, another worker is building the
+    same index) is logged and retried at the next startup.
+    """
+    # Existing index names straight from the catalog: reflection (checkfirst) skips expression indexes on SQLite
+    if sync_conn.dialect.name != "postgresql":
+        existing = set(sync_conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(sync_conn)
+        return
+
+    existing = set(sync_conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+    )).scalars())
+    invalid = set(sync_conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+    )).scalars())
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in existing and index.name not in invalid:
+                continue
+            options = index.dialect_options["postgresql"]
+            options["concurrently"] = True
+            try:
+                if index.name in invalid:
+                    sync_conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                index.create(sync_conn)
+            except DBAPIError as e:
+                logger.warning(f"Could not build index {index.name}: {e}")
+            finally:
+                options["concurrently"] = False
+
 async def dispose_db_engine():
     """
     Disposes of the database engine.
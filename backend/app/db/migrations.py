@@ -0,0 +1,45 @@
+"""
+Schema changes that create_all() cannot make to existing tables and that are too heavy to run
+at every startup. Each one is idempotent; run them with ``python -m app.cli migrate``.
+"""
+import logging
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.models.book import ADD_BOOK_SEARCH_VECTOR_SQL, has_search_vector
+
+logger = logging.getLogger(__name__)
+
+
+def add_book_search_vector(sync_conn: Connection) -> bool:
+    """
+    Add the generated `books.search_vector` column (full-text search).
+
+    PostgreSQL computes the column for every row by rewriting the table under an ACCESS
+    EXCLUSIVE lock, so this belongs in a maintenance window on a large catalog. The lock is only
+    waited for briefly: if long transactions hold the table, it fails instead of queueing every
+    reader behind it, and can simply be run again.
+    """
+    if sync_conn.dialect.name != "postgresql" or has_search_vector(sync_conn):
+        return False
+    sync_conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+    sync_conn.execute(text(ADD_BOOK_SEARCH_VECTOR_SQL))
+    return True
+
+
+# In the order they must run
+MIGRATIONS: list[tuple[str, Callable[[Connection], bool]]] = [
+    ("add_book_search_vector", add_book_search_vector),
+]
+
+
+def run_migrations(sync_conn: Connection) -> list[str]:
+    """Apply the migrations that still have something to do, in the caller's transaction; returns their names."""
+    applied = []
+    for name, migration in MIGRATIONS:
+        if migration(sync_conn):
+            logger.info(f"Applied migration {name}.")
+            applied.append(name)
+    return applied
@@ -0,0 +1,33 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def is_postgres(db: AsyncSession) -> bool:
+    """True when the session is bound to PostgreSQL (as opposed to e.g. a SQLite test database)."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+@asynccontextmanager
+async def single_worker(session_factory: Callable[[], AsyncSession], name: str) -> AsyncIterator[bool]:
+    """
+    Yield True in exactly one of the workers running a background job named `name` at once.
+
+    On PostgreSQL this holds a session-level advisory lock on a connection of its own (in
+    autocommit, so it is not left idle in a transaction); the lock goes away with the
+    connection if the worker dies. Other databases have a single worker and always get True.
+    """
+    async with session_factory() as lock_session:
+        if not is_postgres(lock_session):
+            yield True
+            return
+        conn = await lock_session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        key = func.hashtext(name)
+        acquired = (await conn.execute(select(func.pg_try_advisory_lock(key)))).scalar_one()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(select(func.pg_advisory_unlock(key)))
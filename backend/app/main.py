@@ -4,7 +4,7 @@ from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from app.db.database import create_db_and_tables, engine, dispose_db_engine
+from app.db.database import create_db_and_tables, engine, dispose_db_engine, AsyncSessionLocal
 from app.routers.book_routes import router as books_router
 from app.routers.student_routes import router as students_router
 from app.routers.book_issue_routes import router as issues_router
@@ -13,6 +13,7 @@ from app.routers.health_check import router as health_router
 from app.routers.stats_routes import router as stats_router
 from app.core.scheduler import initialize_scheduler, scheduler
 from app.core.config import settings
+from app.services.suggestion_index import load_suggestion_indexes
 
 # Custom middleware to add CORS headers to every response manually
 class CORSMiddlewareManual(BaseHTTPMiddleware):
@@ -47,6 +48,9 @@ async def lifespan(app_instance: FastAPI):
     # For now, create_db_and_tables handles its own engine context.
     await create_db_and_tables() # Create tables using the function from database.py
     print("Database tables checked/created.")
+    async with AsyncSessionLocal() as db:
+        await load_suggestion_indexes(db) # Typeahead indexes are served from memory
+    print("Suggestion indexes loaded.")
     initialize_scheduler() # Initialize and start the scheduler
     print("Scheduler initialized.")
     yield
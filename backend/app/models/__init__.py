@@ -4,6 +4,10 @@
 from app.models.book import Book
 from app.models.student import Student
 from app.models.book_issue import BookIssue  # This is our primary BookIssue model
+from app.models.idempotency import IdempotencyRecord
+from app.models.book_copy_slot import BookCopySlot
+from app.models.circulation import CirculationDaily, RollupWatermark
+from app.models.counter import LibraryCounter
 
 # Note: There are two files defining the BookIssue model:
 # - book_issue.py (this is the primary one we use)
@@ -12,5 +16,10 @@ from app.models.book_issue import BookIssue  # This is our primary BookIssue mod
 __all__ = [
     "Book",
     "Student",
-    "BookIssue"
+    "BookIssue",
+    "IdempotencyRecord",
+    "BookCopySlot",
+    "CirculationDaily",
+    "RollupWatermark",
+    "LibraryCounter"
 ] 
\ No newline at end of file
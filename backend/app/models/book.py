@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, UniqueConstraint, ForeignKey
+from sqlalchemy import String, Integer, UniqueConstraint, ForeignKey, Index, DDL, event, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from typing import List, TYPE_CHECKING
 
@@ -20,7 +20,58 @@ class Book(Base, TableModelMixin):
 
     issues: Mapped[List["BookIssue"]] = relationship("BookIssue", back_populates="book")
 
-    __table_args__ = (UniqueConstraint('isbn', name='uq_book_isbn'),)
+    __table_args__ = (
+        UniqueConstraint('isbn', name='uq_book_isbn'),
+        # Trigram GIN indexes back ILIKE '%term%' and fuzzy (similarity) searches on PostgreSQL.
+        # The plain B-tree indexes above cannot serve infix or typo-tolerant matches.
+        Index('ix_books_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_books_author_trgm', 'author', postgresql_using='gin', postgresql_ops={'author': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_books_category_trgm', 'category', postgresql_using='gin', postgresql_ops={'category': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        # (sort key, id) indexes for keyset pagination in get_books
+        Index('ix_books_title_id', 'title', 'id'),
+        Index('ix_books_author_id', 'author', 'id'),
+        Index('ix_books_created_at_id', 'created_at', 'id'),
+        # Lets ETag validation (id -> updated_at) run as an index-only scan
+        Index('ix_books_id_updated_at', 'id', 'updated_at'),
+        # Full-text search (see BOOK_SEARCH_VECTOR_SQL below); built once the column exists
+        Index('ix_books_search_vector', text('search_vector'), postgresql_using='gin').ddl_if(
+            dialect='postgresql', callable_=lambda ddl, target, bind, **kw: bind is not None and has_search_vector(bind)
+        ),
+    )
 
     def __repr__(self):
-        return f"<Book(id={self.id}, title='{self.title}', isbn='{self.isbn}')>" 
\ No newline at end of file
+        return f"<Book(id={self.id}, title='{self.title}', isbn='{self.isbn}')>"
+
+# pg_trgm must exist before the trigram indexes are created.
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+# Full-text search column over title/author/category, weighted in that order.
+# It is a generated column maintained by PostgreSQL itself and is deliberately not mapped on
+# the model, so regular Book loads do not carry it and other databases never see it.
+BOOK_SEARCH_CONFIG = "english"
+BOOK_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{BOOK_SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{BOOK_SEARCH_CONFIG}', coalesce(author, '')), 'B') || "
+    f"setweight(to_tsvector('{BOOK_SEARCH_CONFIG}', coalesce(category, '')), 'C')"
+)
+ADD_BOOK_SEARCH_VECTOR_SQL = (
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({BOOK_SEARCH_VECTOR_SQL}) STORED"
+)
+
+
+def has_search_vector(bind) -> bool:
+    return bind.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'books' AND column_name = 'search_vector'"
+    )).first() is not None
+
+
+# Adding a stored generated column rewrites the table, which is free only while it is empty:
+# a books table created right now gets the column here, existing ones through the `migrate`
+# command (app/db/migrations.py). The GIN index follows via _create_missing_indexes.
+event.listen(Book.__table__, "after_create", DDL(ADD_BOOK_SEARCH_VECTOR_SQL).execute_if(dialect="postgresql"))
@@ -0,0 +1,19 @@
+from sqlalchemy import Integer, ForeignKey, CheckConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base_class import Base
+
+class BookCopySlot(Base):
+    """One shard of a book's available copies; see app.crud.availability."""
+    __tablename__ = "book_copy_slots"
+
+    book_id: Mapped[int] = mapped_column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    slot: Mapped[int] = mapped_column(Integer, primary_key=True)
+    available: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint("available >= 0", name="ck_book_copy_slots_available"),
+    )
+
+    def __repr__(self):
+        return f"<BookCopySlot(book_id={self.book_id}, slot={self.slot}, available={self.available})>"
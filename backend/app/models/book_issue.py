@@ -38,6 +38,19 @@ class BookIssue(Base):
 
     __table_args__ = (
         Index('ix_book_issues_book_student_is_returned', "book_id", "student_id", "is_returned"),
+        # Active issues of one student (issued-books lookups)
+        Index('ix_book_issues_student_is_returned', "student_id", "is_returned"),
+        # Keyset pagination of the issue history (newest first), overall and per student / book.
+        # On PostgreSQL the status columns ride along so those filters are checked in the index.
+        Index('ix_book_issues_issue_date_id', "issue_date", "id", postgresql_include=["is_returned", "expected_return_date"]),
+        Index('ix_book_issues_student_issue_date_id', "student_id", "issue_date", "id", postgresql_include=["is_returned", "expected_return_date"]),
+        Index('ix_book_issues_book_issue_date_id', "book_id", "issue_date", "id", postgresql_include=["is_returned", "expected_return_date"]),
+        # Only active issues are ever searched by due date (overdue, due soon, overdue count), and
+        # they are a small slice of the history, so the index leaves returned issues out entirely.
+        Index(
+            'ix_book_issues_active_expected_return', "expected_return_date",
+            postgresql_where=(is_returned == False), sqlite_where=(is_returned == False)
+        ),
     )
 
     def __repr__(self):
@@ -0,0 +1,31 @@
+from datetime import date
+
+from sqlalchemy import String, Integer, Date
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base_class import Base
+
+class CirculationDaily(Base):
+    """Circulation per UTC day, student department and book category; maintained by app.services.circulation_rollup."""
+    __tablename__ = "circulation_daily"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    department: Mapped[str] = mapped_column(String(50), primary_key=True) # "" on rows that only count new books
+    category: Mapped[str] = mapped_column(String(50), primary_key=True) # "" for books without a category
+    issues: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    returns: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    overdue: Mapped[int] = mapped_column(Integer, nullable=False, default=0) # Active and past due at the end of the day
+    new_books: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CirculationDaily(day={self.day}, department='{self.department}', category='{self.category}')>"
+
+class RollupWatermark(Base):
+    """Last day a rollup table is complete through."""
+    __tablename__ = "rollup_watermarks"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    rolled_through: Mapped[date] = mapped_column(Date, nullable=False)
+
+    def __repr__(self):
+        return f"<RollupWatermark(name='{self.name}', rolled_through={self.rolled_through})>"
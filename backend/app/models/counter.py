@@ -0,0 +1,15 @@
+from sqlalchemy import String, Integer, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base_class import Base
+
+class LibraryCounter(Base):
+    """One shard of a running library total; a total is the sum of its shards (see app.crud.counters)."""
+    __tablename__ = "library_counters"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<LibraryCounter(name='{self.name}', shard={self.shard}, value={self.value})>"
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlalchemy import String, Integer, Text, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+class IdempotencyRecord(Base):
+    """Stored outcome of a mutation sent with an Idempotency-Key (table-backed idempotency store)."""
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(400), primary_key=True) # "<METHOD> <path> <client key>"
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    response_body: Mapped[str] = mapped_column(Text, nullable=False) # JSON
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyRecord(key={self.key!r}, status_code={self.status_code})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, UniqueConstraint, ForeignKey
+from sqlalchemy import String, Integer, UniqueConstraint, ForeignKey, Index, func, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from typing import List, TYPE_CHECKING
 
@@ -24,6 +24,14 @@ class Student(Base, TableModelMixin):
         UniqueConstraint('roll_number', name='uq_student_roll_number'),
         UniqueConstraint('phone', name='uq_student_phone'),
         UniqueConstraint('email', name='uq_student_email'),
+        # (sort key, id) indexes for keyset pagination in get_students
+        Index('ix_students_name_id', 'name', 'id'),
+        Index('ix_students_roll_number_id', 'roll_number', 'id'),
+        Index('ix_students_created_at_id', 'created_at', 'id'),
+        # Lets ETag validation (id -> updated_at) run as an index-only scan
+        Index('ix_students_id_updated_at', 'id', 'updated_at'),
+        # Case-insensitive cohort lookups (department, semester) in rollover_semesters
+        Index('ix_students_department_lower_semester', func.lower(text('department')), 'semester'),
     )
 
     def __repr__(self):
@@ -1,30 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date
 from app.db.session import get_db
-from app.schemas.issue import BookIssueCreate, BookIssueResponse
+from app.db.database import AsyncSessionLocal
+from app.schemas.issue import BookIssueCreate, BookIssueResponse, BookIssuePage, BatchIssueCreate, BatchIssueResponse, BulkReturnRequest, BulkReturnResponse
 from app import crud
+from app.utils.export import export_response
+from app.crud.pagination import next_cursor, default_total_mode
+from app.services.idempotency import run_idempotent, IDEMPOTENCY_HEADER
 
 router = APIRouter()
 
+IDEMPOTENCY_KEY_DESCRIPTION = "Client-chosen key (e.g. a UUID) that makes retries safe: a repeat with the same key replays the first response"
+REPLAY_RESPONSES = {422: {"description": "The Idempotency-Key was already used with a different request body"}}
+
 @router.post(
     "/",
     response_model=BookIssueResponse,
     status_code=status.HTTP_201_CREATED,
     summary="Issue a book",
-    description="Create a new book issue record and decrement the available copies of the book.",
-    tags=["Book Issues"]
+    description="Create a new book issue record and decrement the available copies of the book. Send an Idempotency-Key header to make retries safe.",
+    tags=["Book Issues"],
+    responses=REPLAY_RESPONSES
 )
 async def issue_book(
     issue_in: BookIssueCreate,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=255, description=IDEMPOTENCY_KEY_DESCRIPTION)
 ) -> BookIssueResponse:
     """
     Issue a book to a user.
 
     - **issue_in**: Book issue data.
+    - **Idempotency-Key** (header): Optional; retries with the same key replay the first response.
+    """
+    return await run_idempotent(
+        request, db, idempotency_key,
+        lambda session: crud.book_issue.create_book_issue(db=session, issue_in=issue_in),
+        BookIssueResponse, status_code=status.HTTP_201_CREATED
+    )
+
+@router.post(
+    "/batch",
+    response_model=BatchIssueResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Issue several books at once",
+    description="Check out a cart of books to one student in a single transaction: either every book is issued or none is, with a reason per refused book.",
+    tags=["Book Issues"],
+    responses={409: {"description": "At least one book could not be issued; nothing was changed"}, **REPLAY_RESPONSES}
+)
+async def issue_books_batch(
+    batch: BatchIssueCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=255, description=IDEMPOTENCY_KEY_DESCRIPTION)
+) -> BatchIssueResponse:
     """
-    created_issue = await crud.book_issue.create_book_issue(db=db, issue_in=issue_in)
-    return created_issue
+    Issue a cart of books to a student.
+
+    - **student_id**: The borrowing student.
+    - **items**: Up to 20 books, each with an optional expected return date.
+    - **Idempotency-Key** (header): Optional; retries with the same key replay the first response.
+    """
+    async def checkout(session: AsyncSession) -> BatchIssueResponse:
+        issues = await crud.book_issue.create_book_issues_batch(db=session, batch=batch)
+        return BatchIssueResponse(student_id=batch.student_id, issues=issues)
+
+    return await run_idempotent(request, db, idempotency_key, checkout, BatchIssueResponse, status_code=status.HTTP_201_CREATED)
 
 # Placeholder for other book issue routes 
 
@@ -33,17 +78,21 @@ async def issue_book(
     response_model=BookIssueResponse,
     status_code=status.HTTP_200_OK,
     summary="Return a book",
-    description="Mark a book issue as returned and increment the available copies of the book.",
-    tags=["Book Issues"]
+    description="Mark a book issue as returned and increment the available copies of the book. Send an Idempotency-Key header to make retries safe.",
+    tags=["Book Issues"],
+    responses=REPLAY_RESPONSES
 )
 async def return_issued_book(
     issue_id: int,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=255, description=IDEMPOTENCY_KEY_DESCRIPTION)
 ) -> BookIssueResponse:
     """
     Return a previously issued book.
 
     - **issue_id**: ID of the book issue record to mark as returned.
+    - **Idempotency-Key** (header): Optional; a retry replays the first response instead of failing with "already returned".
     """
     # The crud_book_issue.return_book_issue function handles:
     # - Fetching the issue
@@ -52,5 +101,109 @@ async def return_issued_book(
     # - Incrementing book.num_copies_available
     # - Committing changes
     # - Returning the updated BookIssue object with eager loaded relations
-    returned_issue = await crud.book_issue.return_book_issue(db=db, issue_id=issue_id)
-    return returned_issue
+    return await run_idempotent(
+        request, db, idempotency_key,
+        lambda session: crud.book_issue.return_book_issue(db=session, issue_id=issue_id),
+        BookIssueResponse
+    )
+
+@router.post(
+    "/return",
+    response_model=BulkReturnResponse,
+    summary="Return many books at once",
+    description="Return a list of issues, each given by issue ID or by ISBN + student ID, in one transaction. Unknown and already returned items are reported per item.",
+    tags=["Book Issues"],
+    responses=REPLAY_RESPONSES
+)
+async def return_books_bulk(
+    returns: BulkReturnRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=255, description=IDEMPOTENCY_KEY_DESCRIPTION)
+) -> BulkReturnResponse:
+    """
+    Bulk return, e.g. after scanning the drop box.
+
+    - **items**: Up to 500 items with either **issue_id** or **isbn** and **student_id**.
+    - **Idempotency-Key** (header): Optional; retries with the same key replay the first response.
+    """
+    return await run_idempotent(
+        request, db, idempotency_key,
+        lambda session: crud.book_issue.return_book_issues_bulk(db=session, request=returns),
+        BulkReturnResponse
+    )
+
+@router.get(
+    "/export",
+    summary="Export book issues as NDJSON or CSV",
+    description="Stream every issue record matching the filters in one response, in ID order.",
+    tags=["Book Issues"],
+    response_class=StreamingResponse
+)
+async def export_book_issues(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    student_id: Optional[int] = Query(None, description="Filter by student ID"),
+    book_id: Optional[int] = Query(None, description="Filter by book ID"),
+    is_returned: Optional[bool] = Query(None, description="Only returned (true) or only active (false) issues"),
+    issued_from: Optional[date] = Query(None, description="Issued on or after this day (UTC)"),
+    issued_to: Optional[date] = Query(None, description="Issued on or before this day (UTC)")
+) -> StreamingResponse:
+    """
+    Export issue records for reporting without paging.
+
+    - **format**: ndjson (default) or csv.
+    """
+    async def rows():
+        # The export outlives the request-scoped session, so it uses its own
+        async with AsyncSessionLocal() as db:
+            async for row in crud.book_issue.stream_book_issues(
+                db, student_id=student_id, book_id=book_id, is_returned=is_returned,
+                issued_from=issued_from, issued_to=issued_to
+            ):
+                yield row
+
+    return export_response(rows, crud.book_issue.ISSUE_EXPORT_COLUMNS, export_format, filename="book_issues")
+
+@router.get(
+    "/",
+    response_model=BookIssuePage,
+    summary="List issue history with filtering and pagination",
+    description="Issue records, newest first, filterable by student, book, department, status, overdue and date ranges. Each item carries the book title/ISBN and student name/roll number/department.",
+    tags=["Book Issues"]
+)
+async def list_book_issues(
+    db: AsyncSession = Depends(get_db),
+    student_id: Optional[int] = Query(None, description="Filter by student ID"),
+    book_id: Optional[int] = Query(None, description="Filter by book ID"),
+    department: Optional[str] = Query(None, description="Filter by the student's department (case-insensitive, partial match)"),
+    is_returned: Optional[bool] = Query(None, description="Only returned (true) or only active (false) issues"),
+    overdue: Optional[bool] = Query(None, description="Only overdue (true) or only not overdue (false) issues"),
+    issued_from: Optional[date] = Query(None, description="Issued on or after this day (UTC)"),
+    issued_to: Optional[date] = Query(None, description="Issued on or before this day (UTC)"),
+    due_from: Optional[date] = Query(None, description="Due on or after this day (UTC)"),
+    due_to: Optional[date] = Query(None, description="Due on or before this day (UTC)"),
+    after: Optional[str] = Query(None, description="Opaque cursor from a previous response's next_cursor; overrides page"),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description="How to compute the total: exact, estimate (planner estimate) or none; defaults to exact, or none with `after`"),
+    page: int = Query(1, ge=1, description="Page number for pagination"),
+    limit: int = Query(20, ge=1, le=100, description="Number of items per page")
+) -> BookIssuePage:
+    """
+    Browse the issue history.
+
+    - Filters: student, book, department, returned/active, overdue, issue and due date ranges.
+    - **after**: Cursor for keyset pagination; constant cost however deep the page (unless an exact total is asked for).
+    - **total**: exact, estimate or none; skip the count when the total is not shown. Defaults to exact, or to none with **after**.
+    - **page**: Page number (default 1).
+    - **limit**: Items per page (default 20, max 100).
+    """
+    skip = (page - 1) * limit
+    items, total_issues = await crud.book_issue.get_book_issues(
+        db=db, skip=skip, limit=limit, student_id=student_id, book_id=book_id, is_returned=is_returned,
+        issued_from=issued_from, issued_to=issued_to, department=department, overdue=overdue,
+        due_from=due_from, due_to=due_to, after=after, total_mode=default_total_mode(total, after)
+    )
+    pages = -(-total_issues // limit) if total_issues is not None else None
+    return BookIssuePage(
+        items=items, total=total_issues, page=page, limit=limit, pages=pages,
+        next_cursor=next_cursor(items, limit, "issue_date")
+    )
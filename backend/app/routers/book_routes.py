@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.db.session import get_db
-from app.schemas.book import BookCreate, BookResponse, BookUpdate, BookListResponse
+from app.schemas.book import BookCreate, BookResponse, BookUpdate, BookListResponse, BookSearchResult, BookSearchResponse
+from app.schemas.bulk import BulkImportReport
+from app.utils.bulk_import import iter_records, upload_format
+from app.utils.export import export_response
+from app.db.database import AsyncSessionLocal
 from app.crud import crud_book
+from app.crud.pagination import next_cursor, default_total_mode
+from app.services.catalog_cache import book_cache
+from app.services.suggestion_index import book_suggestions
+from app.schemas.suggestion import SuggestionResponse
+from app.utils.etag import resource_etag, list_etag, not_modified_response
 
 router = APIRouter()
 
@@ -24,6 +34,30 @@ async def add_new_book(
     created_book = await crud_book.create_book(db=db, book_in=book_in)
     return created_book
 
+@router.post(
+    "/import",
+    response_model=BulkImportReport,
+    summary="Bulk import books",
+    description=(
+        "Stream many books in one request as CSV (text/csv, header row with BookCreate field names) "
+        "or NDJSON (application/x-ndjson, one BookCreate object per line). Rows are validated and "
+        "loaded in chunks; invalid rows and ISBN conflicts are reported per row and skipped."
+    ),
+    tags=["Books"]
+)
+async def import_books(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    chunk_size: int = Query(1000, ge=1, le=5000, description="Rows validated, conflict-checked and committed together")
+) -> BulkImportReport:
+    """
+    Bulk import books from a streamed CSV or NDJSON body.
+
+    - **chunk_size**: Rows per chunk (default 1000, max 5000). Each chunk is committed on its own.
+    """
+    upload_format(request) # Reject unsupported content types before reading the body
+    return await crud_book.import_books(db=db, records=iter_records(request), chunk_size=chunk_size)
+
 @router.put(
     "/{book_id}", 
     response_model=BookResponse, 
@@ -65,37 +99,135 @@ async def remove_book(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
     return
 
+@router.get(
+    "/export",
+    summary="Export books as NDJSON or CSV",
+    description="Stream every book matching the filters (same as the list endpoint) in one response, in ID order.",
+    tags=["Books"],
+    response_class=StreamingResponse
+)
+async def export_books(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    book_id: Optional[int] = Query(None, description="Filter by book ID (exact match)"),
+    title: Optional[str] = Query(None, description="Filter by book title (case-insensitive, partial match)"),
+    author: Optional[str] = Query(None, description="Filter by author name (case-insensitive, partial match)"),
+    category: Optional[str] = Query(None, description="Filter by category (case-insensitive, partial match)"),
+    isbn: Optional[str] = Query(None, description="Filter by ISBN (exact match)")
+) -> StreamingResponse:
+    """
+    Export books for reporting without paging.
+
+    - **format**: ndjson (default) or csv.
+    - Filters: same as listing books.
+    """
+    async def rows():
+        # The export outlives the request-scoped session, so it uses its own
+        async with AsyncSessionLocal() as db:
+            async for row in crud_book.stream_books(
+                db, book_id=book_id, title=title, author=author, category=category, isbn=isbn
+            ):
+                yield row
+
+    return export_response(rows, crud_book.BOOK_EXPORT_COLUMNS, export_format, filename="books")
+
+@router.get(
+    "/search",
+    response_model=BookSearchResponse,
+    summary="Full-text search across title, author and category",
+    description="Relevance-ranked search over title, author and category with highlighted matches. Every word is matched as a prefix.",
+    tags=["Books"]
+)
+async def search_books(
+    db: AsyncSession = Depends(get_db),
+    q: str = Query(..., min_length=1, max_length=200, description="Search text, e.g. 'adams hitchh'"),
+    page: int = Query(1, ge=1, description="Page number for pagination"),
+    limit: int = Query(10, ge=1, le=100, description="Number of items per page")
+) -> BookSearchResponse:
+    """
+    Search books by any combination of title, author and category words.
+
+    - **q**: Search text (required).
+    - **page**: Page number (default 1).
+    - **limit**: Items per page (default 10, max 100).
+    """
+    skip = (page - 1) * limit
+    hits, total = await crud_book.search_books(db=db, q=q, skip=skip, limit=limit)
+    results = [
+        BookSearchResult(**BookResponse.model_validate(book).model_dump(), rank=rank, highlight=highlight)
+        for book, rank, highlight in hits
+    ]
+    return BookSearchResponse(query=q, results=results, total=total, page=page, limit=limit)
+
+@router.get(
+    "/suggest",
+    response_model=SuggestionResponse,
+    summary="Typeahead suggestions for books",
+    description="Books whose title or author has a word starting with the prefix, answered from an in-memory index without a database round trip.",
+    tags=["Books"]
+)
+async def suggest_books(
+    prefix: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far, e.g. 'hitch'"),
+    limit: int = Query(8, ge=1, le=25, description="Maximum number of suggestions")
+) -> SuggestionResponse:
+    """
+    Suggest books while the user types.
+
+    - **prefix**: Start of any word in the title or author (case-insensitive).
+    - **limit**: Maximum suggestions (default 8, max 25).
+    """
+    return SuggestionResponse(prefix=prefix, suggestions=book_suggestions.search(prefix, limit=limit))
+
 @router.get(
     "/{book_id}", 
     response_model=BookResponse, 
     summary="Get a specific book by ID",
-    description="Retrieve detailed information for a specific book using its ID.",
-    tags=["Books"]
+    description="Retrieve detailed information for a specific book using its ID. Supports conditional requests via ETag / If-None-Match.",
+    tags=["Books"],
+    responses={304: {"description": "Not modified since the ETag sent in If-None-Match"}}
 )
 async def get_specific_book(
     *, 
     db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
     book_id: int
 ) -> BookResponse:
-    db_book = await crud_book.get_book(db=db, book_id=book_id)
-    if not db_book:
+    if request.headers.get("if-none-match"):
+        # Validate against the cached payload or the bare updated_at before building anything
+        cached = book_cache.get(book_id)
+        updated_at = cached.updated_at if cached else await crud_book.get_book_updated_at(db=db, book_id=book_id)
+        if updated_at is not None:
+            not_modified = not_modified_response(request, resource_etag("book", book_id, updated_at))
+            if not_modified:
+                return not_modified
+    book = await crud_book.get_book_response(db=db, book_id=book_id)
+    if not book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
-    return db_book
+    response.headers["ETag"] = resource_etag("book", book.id, book.updated_at)
+    return book
 
 @router.get(
     "/", 
     response_model=BookListResponse, 
     summary="List all books with filtering and pagination",
-    description="Retrieve a list of books. Supports filtering by title, author, category, book ID, and pagination.",
-    tags=["Books"]
+    description="Retrieve a list of books. Supports filtering by title, author, category, book ID, optional typo-tolerant (fuzzy) matching, and pagination. Supports conditional requests via ETag / If-None-Match.",
+    tags=["Books"],
+    responses={304: {"description": "Not modified since the ETag sent in If-None-Match"}}
 )
 async def list_all_books(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     book_id: Optional[int] = Query(None, description="Filter by book ID (exact match)"),
     title: Optional[str] = Query(None, description="Filter by book title (case-insensitive, partial match)"),
     author: Optional[str] = Query(None, description="Filter by author name (case-insensitive, partial match)"),
     category: Optional[str] = Query(None, description="Filter by category (case-insensitive, partial match)"),
     isbn: Optional[str] = Query(None, description="Filter by ISBN (case-insensitive, partial match)"),
+    fuzzy: bool = Query(False, description="Typo-tolerant matching on title, author and category, ranked by similarity"),
+    sort_by: str = Query("id", pattern="^(id|title|author|created_at)$", description="Sort key (ties broken by ID)"),
+    after: Optional[str] = Query(None, description="Opaque cursor from a previous response's next_cursor; overrides page"),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description="How to compute the total: exact, estimate (planner estimate) or none; defaults to exact, or none with `after`"),
+    facets: Optional[str] = Query(None, description="Comma-separated grouped counts to include: category, author, available"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
     limit: int = Query(10, ge=1, le=100, description="Number of items per page")
 ) -> BookListResponse:
@@ -107,19 +239,35 @@ async def list_all_books(
     - **author**: Filter by author (optional).
     - **category**: Filter by category (optional).
     - **isbn**: Filter by ISBN (optional).
+    - **fuzzy**: Use trigram similarity instead of partial matching (default false).
+    - **sort_by**: id, title, author or created_at (default id).
+    - **after**: Cursor for keyset pagination; constant cost however deep the page (unless an exact total is asked for).
+    - **total**: exact, estimate or none; skip the count when the total is not shown. Defaults to exact, or to none with **after**.
+    - **facets**: e.g. "category,available"; counts over all matches, computed in one grouped query.
     - **page**: Page number (default 1).
     - **limit**: Items per page (default 10, max 100).
     """
+    facet_names = crud_book.parse_facets(facets)
     # Add logging to debug search parameters
     import logging
     logger = logging.getLogger(__name__)
-    logger.info(f"Search parameters: book_id={book_id}, title={title}, author={author}, category={category}, isbn={isbn}")
+    logger.info(f"Search parameters: book_id={book_id}, title={title}, author={author}, category={category}, isbn={isbn}, fuzzy={fuzzy}")
     
     skip = (page - 1) * limit
     books, total_books = await crud_book.get_books(
-        db=db, skip=skip, limit=limit, book_id=book_id, title=title, author=author, category=category, isbn=isbn
+        db=db, skip=skip, limit=limit, book_id=book_id, title=title, author=author, category=category, isbn=isbn,
+        fuzzy=fuzzy, sort_by=sort_by, after=after, total_mode=default_total_mode(total, after)
     )
     
     # Log the number of books found
     logger.info(f"Found {total_books} books matching the search criteria")
-    return BookListResponse(books=books, total=total_books, page=page, limit=limit)
+    facet_counts = await crud_book.get_book_facets(
+        db=db, facets=facet_names, book_id=book_id, title=title, author=author, category=category, isbn=isbn, fuzzy=fuzzy
+    ) if facet_names else None
+    cursor = None if fuzzy else next_cursor(books, limit, sort_by)
+    etag = list_etag("books", books, total_books, cursor, facet_counts)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return BookListResponse(books=books, total=total_books, page=page, limit=limit, next_cursor=cursor, facets=facet_counts)
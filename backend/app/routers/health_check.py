@@ -1,8 +1,15 @@
 from fastapi import APIRouter
 
+from app.services.catalog_cache import book_cache, student_lookup_cache
+
 router = APIRouter()
 
 @router.get("/ping")
 async def ping():
     """Simple health check endpoint."""
-    return {"status": "ok", "message": "pong!"} 
\ No newline at end of file
+    return {"status": "ok", "message": "pong!"}
+
+@router.get("/cache")
+async def cache_stats():
+    """Hit/miss counters of this worker's in-process caches."""
+    return {"books": book_cache.stats(), "student_lookup": student_lookup_cache.stats()}
@@ -1,55 +1,48 @@
-from fastapi import APIRouter, Depends
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import func, text
 
+from app.db.database import AsyncSessionLocal
 from app.db.session import get_db
-from app.models.book import Book
-from app.models.student import Student
-from app.models.book_issue import BookIssue
+from app.schemas.stats import CirculationSeries
+from app.services.library_analytics_service import library_analytics_service, collection_stats_snapshot
+from app.services.circulation_rollup import circulation_series
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.get("/collection")
-async def get_collection_statistics(db: AsyncSession = Depends(get_db)):
+async def get_collection_statistics(
+    response: Response,
+    max_age: Optional[float] = Query(
+        None, ge=0, le=86400,
+        description="Accept figures up to this many seconds old (default: the snapshot TTL); 0 asks for fresh figures"
+    )
+):
     """
     Get statistics about the library collection:
     - Total number of books
     - Total number of registered students
     - Number of currently issued books
+
+    The figures come from an in-memory snapshot computed in one query; at most one request
+    refreshes it at a time while the others are served the current snapshot, except those
+    passing their own max_age (e.g. 0), which wait for the refresh. The Age header tells how
+    old the figures are.
     """
+    async def load_statistics():
+        # Its own session: the refresh may outlive this request if the client goes away
+        async with AsyncSessionLocal() as db:
+            return await library_analytics_service.get_collection_statistics(db)
+
     try:
-        # Use direct SQL queries for more reliable results
-        # Get total books count (sum of all copies)
-        books_query = text("SELECT COALESCE(SUM(num_copies_total), 0) FROM books")
-        books_result = await db.execute(books_query)
-        total_books = books_result.scalar_one_or_none() or 0
-        print(f"DEBUG: Total books count: {total_books}")
-        
-        # If total_books is 0, try counting the number of book records
-        if total_books == 0:
-            book_count_query = text("SELECT COUNT(*) FROM books")
-            book_count_result = await db.execute(book_count_query)
-            book_count = book_count_result.scalar_one_or_none() or 0
-            print(f"DEBUG: Book count: {book_count}")
-            
-            # If there are books but sum is 0, use the count instead
-            if book_count > 0:
-                total_books = book_count
-        
-        # Get total students count
-        students_query = text("SELECT COUNT(*) FROM students")
-        students_result = await db.execute(students_query)
-        total_students = students_result.scalar_one_or_none() or 0
-        print(f"DEBUG: Total students count: {total_students}")
-        
-        # Get currently issued books count
-        issued_query = text("SELECT COUNT(*) FROM book_issues WHERE is_returned = FALSE")
-        issued_result = await db.execute(issued_query)
-        currently_issued = issued_result.scalar_one_or_none() or 0
-        print(f"DEBUG: Currently issued books count: {currently_issued}")
+        stats, age = await collection_stats_snapshot.get(load_statistics, max_age=max_age)
     except Exception as e:
-        print(f"ERROR in statistics endpoint: {str(e)}")
+        logger.error(f"Error computing collection statistics: {e}", exc_info=True)
         # Return default values in case of error
         return {
             "total_books": 0,
@@ -57,9 +50,38 @@ async def get_collection_statistics(db: AsyncSession = Depends(get_db)):
             "currently_issued": 0,
             "error": str(e)
         }
-    
-    return {
-        "total_books": total_books,
-        "total_students": total_students,
-        "currently_issued": currently_issued
-    }
+
+    response.headers["Age"] = str(int(age))
+    return stats
+
+# Longest range a single series request may cover
+MAX_CIRCULATION_DAYS = 3660
+DEFAULT_CIRCULATION_DAYS = {"day": 30, "week": 7 * 26, "month": 365}
+
+@router.get(
+    "/circulation",
+    response_model=CirculationSeries,
+    summary="Borrows and returns over time",
+    description="Issues and returns per day, week or month, optionally split by department or category. Served from the daily circulation rollup; only the days not rolled up yet are aggregated from the issue history."
+)
+async def get_circulation_series(
+    db: AsyncSession = Depends(get_db),
+    granularity: str = Query("day", pattern="^(day|week|month)$", description="Bucket size: day, week (starting Monday) or month"),
+    group_by: Optional[str] = Query(None, pattern="^(department|category)$", description="Split each bucket by department or category"),
+    start: Optional[date] = Query(None, description="First day (UTC); defaults to 30 days, 26 weeks or 12 months before end"),
+    end: Optional[date] = Query(None, description="Last day (UTC); defaults to today")
+) -> CirculationSeries:
+    """
+    Time series for circulation charts.
+
+    - **granularity**: day (default), week or month.
+    - **group_by**: department or category (optional).
+    - **start** / **end**: Inclusive day range (UTC).
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=DEFAULT_CIRCULATION_DAYS[granularity] - 1)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end.")
+    if (end - start).days >= MAX_CIRCULATION_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"The range may cover at most {MAX_CIRCULATION_DAYS} days.")
+    return await circulation_series(db, start, end, granularity=granularity, group_by=group_by)
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.db.session import get_db
-from app.schemas.student import StudentCreate, StudentResponse, StudentUpdate, StudentListResponse
+from app.schemas.student import StudentCreate, StudentResponse, StudentUpdate, StudentListResponse, SemesterRolloverRequest, SemesterRolloverResult
 from app.crud import crud_student
+from app.crud.pagination import next_cursor, default_total_mode
+from app.utils.etag import resource_etag, list_etag, not_modified_response
+from app.utils.export import export_response
+from app.db.database import AsyncSessionLocal
 from app.schemas.issue import BookIssueResponse
 from app.crud import crud_book_issue
+from app.services.suggestion_index import student_suggestions
+from app.schemas.suggestion import SuggestionResponse
+from app.schemas.bulk import BulkImportReport
+from app.utils.bulk_import import iter_records, upload_format
 
 router = APIRouter()
 
@@ -35,20 +44,89 @@ async def add_new_student(
     created_student = await crud_student.create_student(db=db, student_in=student_in)
     return created_student
 
+@router.post(
+    "/import",
+    response_model=BulkImportReport,
+    summary="Bulk enroll students",
+    description=(
+        "Stream many students in one request as CSV (text/csv, header row with StudentCreate field names) "
+        "or NDJSON (application/x-ndjson, one StudentCreate object per line). Rows are validated and "
+        "loaded in chunks; invalid rows and roll number / email / phone conflicts are reported per row and skipped."
+    ),
+    tags=["Students"]
+)
+async def import_students(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    chunk_size: int = Query(1000, ge=1, le=5000, description="Rows validated, conflict-checked and committed together")
+) -> BulkImportReport:
+    """
+    Bulk enroll students from a streamed CSV or NDJSON body.
+
+    - **chunk_size**: Rows per chunk (default 1000, max 5000). Each chunk is committed on its own.
+    """
+    upload_format(request) # Reject unsupported content types before reading the body
+    return await crud_student.import_students(db=db, records=iter_records(request), chunk_size=chunk_size)
+
+@router.post(
+    "/semester-rollover",
+    response_model=SemesterRolloverResult,
+    summary="Advance or set the semester of a cohort",
+    description="Batch-update the semester of every student matching the department/semester filters in one statement. Students who would pass the last semester are skipped.",
+    tags=["Students"]
+)
+async def semester_rollover(
+    rollover: SemesterRolloverRequest,
+    db: AsyncSession = Depends(get_db)
+) -> SemesterRolloverResult:
+    """
+    Start-of-term semester rollover.
+
+    - **department** / **semester**: Cohort filters (optional; omit both for everyone).
+    - **advance_by** or **set_to**: Exactly one of the two.
+    - **dry_run**: Only report the counts.
+    """
+    return await crud_student.rollover_semesters(db=db, rollover=rollover)
+
+@router.get(
+    "/suggest",
+    response_model=SuggestionResponse,
+    summary="Typeahead suggestions for students",
+    description="Students whose name or roll number has a word starting with the prefix, answered from an in-memory index without a database round trip.",
+    tags=["Students"]
+)
+async def suggest_students(
+    prefix: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far, e.g. 'ana' or 'CS20'"),
+    limit: int = Query(8, ge=1, le=25, description="Maximum number of suggestions")
+) -> SuggestionResponse:
+    """
+    Suggest students while the user types.
+
+    - **prefix**: Start of any word in the name, or of the roll number (case-insensitive).
+    - **limit**: Maximum suggestions (default 8, max 25).
+    """
+    return SuggestionResponse(prefix=prefix, suggestions=student_suggestions.search(prefix, limit=limit))
+
 @router.get(
     "/",
     response_model=StudentListResponse,
     summary="List and search students",
-    description="Retrieve a list of students with filtering by department, semester, and partial match search on name, roll number, and phone.",
-    tags=["Students"]
+    description="Retrieve a list of students with filtering by department, semester, and partial match search on name, roll number, and phone. Supports conditional requests via ETag / If-None-Match.",
+    tags=["Students"],
+    responses={304: {"description": "Not modified since the ETag sent in If-None-Match"}}
 )
 async def list_all_students(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     department: Optional[str] = Query(None, description="Filter by department (case-insensitive, partial match)"),
     semester: Optional[int] = Query(None, description="Filter by semester"),
     name: Optional[str] = Query(None, description="Search by student name (case-insensitive, partial match)"),
     roll_number: Optional[str] = Query(None, description="Search by roll number (case-insensitive, partial match)"),
     phone: Optional[str] = Query(None, description="Search by phone number (case-insensitive, partial match)"),
+    sort_by: str = Query("id", pattern="^(id|name|roll_number|created_at)$", description="Sort key (ties broken by ID)"),
+    after: Optional[str] = Query(None, description="Opaque cursor from a previous response's next_cursor; overrides page"),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description="How to compute the total: exact, estimate (planner estimate) or none; defaults to exact, or none with `after`"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
     limit: int = Query(10, ge=1, le=100, description="Number of items per page")
 ) -> StudentListResponse:
@@ -60,6 +138,9 @@ async def list_all_students(
     - **name**: Search by student name.
     - **roll_number**: Search by roll number.
     - **phone**: Search by phone number.
+    - **sort_by**: id, name, roll_number or created_at (default id).
+    - **after**: Cursor for keyset pagination; constant cost however deep the page (unless an exact total is asked for).
+    - **total**: exact, estimate or none; skip the count when the total is not shown. Defaults to exact, or to none with **after**.
     - **page**: Page number (default 1).
     - **limit**: Items per page (default 10, max 100).
     """
@@ -67,9 +148,50 @@ async def list_all_students(
     students, total_students = await crud_student.get_students(
         db=db, skip=skip, limit=limit, 
         department=department, semester=semester, 
-        name=name, roll_number=roll_number, phone=phone
+        name=name, roll_number=roll_number, phone=phone,
+        sort_by=sort_by, after=after, total_mode=default_total_mode(total, after)
     )
-    return StudentListResponse(students=students, total=total_students, page=page, limit=limit)
+    cursor = next_cursor(students, limit, sort_by)
+    etag = list_etag("students", students, total_students, cursor)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return StudentListResponse(
+        students=students, total=total_students, page=page, limit=limit,
+        next_cursor=cursor
+    )
+
+@router.get(
+    "/export",
+    summary="Export students as NDJSON or CSV",
+    description="Stream every student matching the filters (same as the list endpoint) in one response, in ID order.",
+    tags=["Students"],
+    response_class=StreamingResponse
+)
+async def export_students(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    department: Optional[str] = Query(None, description="Filter by department (case-insensitive, partial match)"),
+    semester: Optional[int] = Query(None, description="Filter by semester"),
+    name: Optional[str] = Query(None, description="Search by student name (case-insensitive, partial match)"),
+    roll_number: Optional[str] = Query(None, description="Search by roll number (case-insensitive, partial match)"),
+    phone: Optional[str] = Query(None, description="Search by phone number (case-insensitive, partial match)")
+) -> StreamingResponse:
+    """
+    Export students for reporting without paging.
+
+    - **format**: ndjson (default) or csv.
+    - Filters: same as listing students.
+    """
+    async def rows():
+        # The export outlives the request-scoped session, so it uses its own
+        async with AsyncSessionLocal() as db:
+            async for row in crud_student.stream_students(
+                db, department=department, semester=semester, name=name, roll_number=roll_number, phone=phone
+            ):
+                yield row
+
+    return export_response(rows, crud_student.STUDENT_EXPORT_COLUMNS, export_format, filename="students")
 
 @router.get(
     "/{student_identifier}/issued-books",
@@ -99,11 +221,14 @@ async def list_student_issued_books(
     "/{student_id}",
     response_model=StudentResponse,
     summary="Get a student by ID",
-    description="Retrieve a single student by their ID.",
-    tags=["Students"]
+    description="Retrieve a single student by their ID. Supports conditional requests via ETag / If-None-Match.",
+    tags=["Students"],
+    responses={304: {"description": "Not modified since the ETag sent in If-None-Match"}}
 )
 async def get_student_by_id(
     student_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ) -> StudentResponse:
     """
@@ -111,12 +236,20 @@ async def get_student_by_id(
     
     - **student_id**: The numeric ID of the student.
     """
+    if request.headers.get("if-none-match"):
+        # Cheap validator check before loading the full row
+        updated_at = await crud_student.get_student_updated_at(db=db, student_id=student_id)
+        if updated_at is not None:
+            not_modified = not_modified_response(request, resource_etag("student", student_id, updated_at))
+            if not_modified:
+                return not_modified
     student = await crud_student.get_student(db=db, student_id=student_id)
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Student with ID {student_id} not found"
         )
+    response.headers["ETag"] = resource_etag("student", student.id, student.updated_at)
     return student
 
 @router.put(
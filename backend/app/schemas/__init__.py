@@ -1,6 +1,9 @@
 # This file makes 'schemas' a Python package 
 
-from .book import BookBase, BookCreate, BookUpdate, BookResponse, BookListResponse
-from .student import StudentBase, StudentCreate, StudentUpdate, StudentResponse, StudentListResponse
-from .issue import BookIssueBase, BookIssueCreate, BookIssueUpdate, BookIssueResponse, BookIssuePage
+from .book import BookBase, BookCreate, BookUpdate, BookResponse, BookListResponse, FacetBucket, BookSearchResult, BookSearchResponse
+from .student import StudentBase, StudentCreate, StudentUpdate, StudentResponse, StudentListResponse, SemesterRolloverRequest, SemesterRolloverResult
+from .issue import BookIssueBase, BookIssueCreate, BookIssueUpdate, BookIssueResponse, BookIssueSummary, BookIssuePage, BatchIssueItem, BatchIssueCreate, BatchItemError, BatchIssueResponse, BulkReturnItem, BulkReturnRequest, BulkReturnItemResult, BulkReturnResponse
+from .bulk import BulkRowError, BulkImportReport
+from .suggestion import Suggestion, SuggestionResponse
+from .stats import CirculationPoint, CirculationSeries
 # Import other schemas here as they are created 
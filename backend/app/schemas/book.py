@@ -78,8 +78,26 @@ class BookResponse(BookBase, TimestampModel): # TimestampModel adds created_at,
         }
     }
 
+class FacetBucket(BaseModel):
+    value: Optional[str] = None # Category/author name, or "true"/"false" for the available facet
+    count: int # Books matching the filters with this value
+    available: int # Of those, books with at least one copy available right now
+
 class BookListResponse(BaseModel):
     books: list[BookResponse]
+    total: Optional[int] = None # Exact or planner-estimated per the request's `total` mode; None when skipped
+    page: int
+    limit: int
+    next_cursor: Optional[str] = None # Pass as `after` to fetch the next page; None on the last page 
+    facets: Optional[dict[str, list[FacetBucket]]] = None # Only when requested via `facets`
+
+class BookSearchResult(BookResponse):
+    rank: float # Relevance, higher is better; only comparable within one search
+    highlight: Optional[str] = None # "title · author · category" as HTML-escaped text with matches wrapped in <mark> tags
+
+class BookSearchResponse(BaseModel):
+    query: str
+    results: list[BookSearchResult]
     total: int
     page: int
-    limit: int 
\ No newline at end of file
+    limit: int
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class BulkRowError(BaseModel):
+    row: int = Field(..., description="1-based data row of the upload (CSV header not counted)")
+    key: Optional[str] = Field(None, description="Natural key of the row when known, e.g. the ISBN or roll number")
+    errors: list[str]
+
+class BulkImportReport(BaseModel):
+    received: int # Data rows read from the upload
+    imported: int
+    failed: int
+    errors: list[BulkRowError]
@@ -44,10 +44,78 @@ class BookIssueResponse(BookIssueInDBBase):
             self.is_overdue = False
         return self
 
+# Multi-book checkout (cart)
+class BatchIssueItem(BaseModel):
+    book_id: int = Field(..., example=1)
+    expected_return_date: Optional[date] = Field(default=None, description="Defaults to the standard loan period")
+
+class BatchIssueCreate(BaseModel):
+    student_id: int = Field(..., example=1)
+    items: list[BatchIssueItem] = Field(..., min_length=1, max_length=20)
+
+class BatchItemError(BaseModel):
+    book_id: int
+    reason: str
+
+class BatchIssueResponse(BaseModel):
+    student_id: int
+    issues: list[BookIssueResponse]
+
+# Bulk return (drop-box scanning)
+class BulkReturnItem(BaseModel):
+    issue_id: Optional[int] = Field(default=None, example=1)
+    isbn: Optional[str] = Field(default=None, example="9780345391803")
+    student_id: Optional[int] = Field(default=None, example=1)
+
+    @model_validator(mode='after')
+    def check_reference(self) -> 'BulkReturnItem':
+        if self.issue_id is None and (self.isbn is None or self.student_id is None):
+            raise ValueError("Provide either issue_id or both isbn and student_id.")
+        return self
+
+class BulkReturnRequest(BaseModel):
+    items: list[BulkReturnItem] = Field(..., min_length=1, max_length=500)
+
+class BulkReturnItemResult(BaseModel):
+    issue_id: Optional[int] = None # Resolved issue, when one was found
+    isbn: Optional[str] = None
+    student_id: Optional[int] = None
+    status: str # "returned", "already_returned" or "not_found"
+    detail: Optional[str] = None
+
+class BulkReturnResponse(BaseModel):
+    returned: int
+    failed: int
+    results: list[BulkReturnItemResult] # In the order of the request items
+
+# Issue history row: the issue plus the few book/student columns a listing shows
+class BookIssueSummary(BaseModel):
+    id: int
+    book_id: int
+    student_id: int
+    issue_date: datetime
+    expected_return_date: date
+    actual_return_date: Optional[datetime] = None
+    is_returned: bool
+    is_overdue: Optional[bool] = None
+    book_title: str
+    book_isbn: str
+    student_name: str
+    student_roll_number: str
+    student_department: str
+
+    model_config = {"from_attributes": True}
+
+    @model_validator(mode='after')
+    def calculate_is_overdue(self) -> 'BookIssueSummary':
+        self.is_overdue = not self.is_returned and self.expected_return_date < date.today()
+        return self
+
 # For paginated list response
 class BookIssuePage(BaseModel):
-    items: list[BookIssueResponse]
-    total: int
+    items: list[BookIssueSummary]
+    total: Optional[int] = None # Exact or planner-estimated per the request's `total` mode; None when skipped
     page: int
     limit: int
-    pages: int 
\ No newline at end of file
+    pages: Optional[int] = None # None when the total is not computed
+    next_cursor: Optional[str] = None # Pass as `after` to fetch the next page; None on the last page 
\ No newline at end of file
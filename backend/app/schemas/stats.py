@@ -0,0 +1,17 @@
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class CirculationPoint(BaseModel):
+    bucket: date = Field(..., description="First day of the day / week (Monday) / month bucket")
+    group: Optional[str] = Field(None, description="Department or category; None without group_by, \"\" for books without a category")
+    issues: int
+    returns: int
+
+class CirculationSeries(BaseModel):
+    granularity: str
+    group_by: Optional[str] = None
+    start: date
+    end: date
+    rolled_through: Optional[date] = None # Days after this were aggregated on demand from the raw tables
+    points: list[CirculationPoint]
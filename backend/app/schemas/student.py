@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field, constr
+from pydantic import BaseModel, EmailStr, Field, constr, model_validator
 from typing import Optional
 
 from app.models.common import CoreModel, TimestampModel
@@ -83,6 +83,39 @@ class StudentResponse(StudentBase, TimestampModel):
 
 class StudentListResponse(BaseModel):
     students: list[StudentResponse]
-    total: int
+    total: Optional[int] = None # Exact or planner-estimated per the request's `total` mode; None when skipped
     page: int # For pagination context in response
-    limit: int # For pagination context in response 
\ No newline at end of file
+    limit: int # For pagination context in response
+    next_cursor: Optional[str] = None # Pass as `after` to fetch the next page; None on the last page 
+
+# 3.2.5. Semester rollover (batch update of a cohort)
+class SemesterRolloverRequest(BaseModel):
+    department: Optional[str] = Field(None, min_length=1, max_length=50, description="Only this department (case-insensitive, exact match); all departments when omitted")
+    semester: Optional[int] = Field(None, gt=0, le=12, description="Only students currently in this semester")
+    advance_by: Optional[int] = Field(None, ge=1, le=11, description="Add this many semesters")
+    set_to: Optional[int] = Field(None, gt=0, le=12, description="Set the semester to this value")
+    dry_run: bool = False # Only count what would change
+
+    @model_validator(mode='after')
+    def check_one_operation(self) -> 'SemesterRolloverRequest':
+        if (self.advance_by is None) == (self.set_to is None):
+            raise ValueError("Provide exactly one of advance_by or set_to.")
+        return self
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "department": "Computer Science",
+                    "semester": 3,
+                    "advance_by": 1
+                }
+            ]
+        }
+    }
+
+class SemesterRolloverResult(BaseModel):
+    matched: int # Students matching the filters
+    updated: int # Students whose semester changed (would change, for a dry run)
+    skipped_at_max: int # Matched students left alone because they would pass the last semester
+    dry_run: bool
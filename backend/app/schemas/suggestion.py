@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class Suggestion(BaseModel):
+    id: int
+    label: str = Field(..., description="Book title or student name")
+    detail: Optional[str] = Field(None, description="Book author or student roll number")
+
+class SuggestionResponse(BaseModel):
+    prefix: str
+    suggestions: list[Suggestion]
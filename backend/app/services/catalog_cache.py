@@ -0,0 +1,156 @@
+import logging
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator
+
+from app.core.cache import TTLCache, InvalidationBus, create_invalidation_bus
+from app.core.config import settings
+from app.schemas.book import BookResponse
+
+logger = logging.getLogger(__name__)
+
+BOOK_INVALIDATION_CHANNEL = "catalog.books"
+STUDENT_INVALIDATION_CHANNEL = "catalog.students"
+
+# Book invalidations made inside `book_invalidations_recorded` blocks of the current task
+_recorded_book_invalidations: ContextVar[list[int] | None] = ContextVar("recorded_book_invalidations", default=None)
+
+
+@contextmanager
+def book_invalidations_recorded() -> Iterator[list[int]]:
+    """
+    Collect the ids of the books invalidated inside the block, for callers that run
+    writers inside a transaction of their own and must repeat them once it really commits.
+    """
+    token = _recorded_book_invalidations.set([])
+    try:
+        yield _recorded_book_invalidations.get()
+    finally:
+        _recorded_book_invalidations.reset(token)
+
+
+class BookCatalogCache:
+    """
+    Read-through cache of `BookResponse` payloads by book id.
+
+    Writers call `invalidate` after committing; the invalidation is applied locally and
+    published on the bus so the caches of other workers drop the entry as well.
+    Entries also expire after the TTL, which bounds staleness if a message is lost.
+
+    A reader takes `read_token()` before querying the database and passes it to `put`; if any
+    invalidation happened in between, the (possibly stale) row is not cached.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, bus: InvalidationBus):
+        self._by_id = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self._bus = bus
+        self._origin = uuid.uuid4().hex
+        self._generation = 0
+        bus.subscribe(BOOK_INVALIDATION_CHANNEL, self._on_invalidation)
+
+    def get(self, book_id: int) -> BookResponse | None:
+        return self._by_id.get(book_id)
+
+    def read_token(self) -> int:
+        return self._generation
+
+    def put(self, book: BookResponse, token: int | None = None) -> None:
+        if token is not None and token != self._generation:
+            return
+        self._by_id.set(book.id, book)
+
+    def invalidate(self, book_id: int) -> None:
+        """Drop a book everywhere: in this worker now, in the others via the bus."""
+        self._drop(book_id)
+        self._bus.publish(BOOK_INVALIDATION_CHANNEL, {"origin": self._origin, "book_id": book_id})
+        recorded = _recorded_book_invalidations.get()
+        if recorded is not None:
+            recorded.append(book_id)
+
+    def clear(self) -> None:
+        self._by_id.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._by_id), **self._by_id.stats.as_dict()}
+
+    def _drop(self, book_id: int) -> None:
+        self._generation += 1
+        self._by_id.delete(book_id)
+
+    def _on_invalidation(self, message: dict) -> None:
+        if message.get("origin") == self._origin:
+            return
+        self._drop(message["book_id"])
+
+
+class StudentIdentifierCache:
+    """
+    Maps the identifiers patrons are looked up by (ID, roll number, email, phone) to student ids.
+
+    Only positive resolutions are stored. `invalidate` must be called when a student's
+    identifying fields change, so an old phone number or email stops resolving to them, and
+    `forget` with the identifiers of a new or changed student, which may have resolved to
+    someone else until now (e.g. "57" to the student with roll number 57, before student 57 existed).
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, bus: InvalidationBus):
+        self._ids = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self._bus = bus
+        self._origin = uuid.uuid4().hex
+        bus.subscribe(STUDENT_INVALIDATION_CHANNEL, self._on_invalidation)
+
+    def get(self, identifier: str) -> int | None:
+        return self._ids.get(identifier)
+
+    def put(self, identifier: str, student_id: int) -> None:
+        self._ids.set(identifier, student_id)
+
+    def invalidate(self, student_id: int) -> None:
+        self._drop(student_id)
+        self._bus.publish(STUDENT_INVALIDATION_CHANNEL, {"origin": self._origin, "student_id": student_id})
+
+    def forget(self, identifiers: Iterable[str]) -> None:
+        """Drop the resolutions of these identifiers everywhere, whoever they resolved to."""
+        identifiers = list(identifiers)
+        self._forget(identifiers)
+        self._bus.publish(STUDENT_INVALIDATION_CHANNEL, {"origin": self._origin, "identifiers": identifiers})
+
+    def discard(self, identifier: str) -> None:
+        self._ids.delete(identifier)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._ids), **self._ids.stats.as_dict()}
+
+    def _drop(self, student_id: int) -> None:
+        for identifier in self._ids.keys():
+            if self._ids.peek(identifier) == student_id:
+                self._ids.delete(identifier)
+
+    def _forget(self, identifiers: list[str]) -> None:
+        for identifier in identifiers:
+            self._ids.delete(identifier)
+
+    def _on_invalidation(self, message: dict) -> None:
+        if message.get("origin") == self._origin:
+            return
+        if "identifiers" in message:
+            self._forget(message["identifiers"])
+        else:
+            self._drop(message["student_id"])
+
+
+invalidation_bus = create_invalidation_bus(settings.CACHE_INVALIDATION_BUS)
+book_cache = BookCatalogCache(
+    maxsize=settings.BOOK_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.BOOK_CACHE_TTL_SECONDS,
+    bus=invalidation_bus,
+)
+student_lookup_cache = StudentIdentifierCache(
+    maxsize=settings.STUDENT_LOOKUP_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.STUDENT_LOOKUP_CACHE_TTL_SECONDS,
+    bus=invalidation_bus,
+)
@@ -0,0 +1,303 @@
+"""
+Daily circulation rollup: issues, returns, overdue loans and new books per UTC day, student
+department and book category, kept in `circulation_daily`.
+
+`refresh_circulation_rollup` (a scheduler job, run by one worker at a time) aggregates the closed days after the watermark
+in `rollup_watermarks` and advances it, so each run only touches the raw rows of the days it
+adds. Readers use `circulation_totals`, which sums the rollup rows for the rolled-up part of a
+range and aggregates the raw tables on demand only for the days after the watermark (today,
+or more if the job is behind). `circulation_series` does the same per day, week or month bucket.
+
+`new_books` counts the books added on a day that are still in the catalog, like the raw table
+it is aggregated from: `delete_book` calls `record_book_deletion` to take a book it deletes out
+of a day that is already rolled up.
+"""
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import select, insert, delete, func, and_, or_, union_all, literal, cast, Date, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.schemas.stats import CirculationPoint, CirculationSeries
+from app.db.utils import is_postgres
+from app.models.book import Book
+from app.models.book_issue import BookIssue
+from app.models.circulation import CirculationDaily, RollupWatermark
+from app.models.student import Student
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = "circulation_daily"
+MEASURES = ("issues", "returns", "overdue", "new_books")
+GROUP_COLUMNS = ("department", "category")
+GRANULARITIES = ("day", "week", "month")
+
+
+def _utc_midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _as_date(value) -> date:
+    """Dates come back as strings from SQLite and timestamps from min() over a datetime column."""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _utc_day(db: AsyncSession, column):
+    """The UTC calendar day of a timestamp column."""
+    if is_postgres(db):
+        return func.date(func.timezone("UTC", column))
+    return func.date(column)
+
+
+def _days(db: AsyncSession, start: date, end: date):
+    """Subquery with one row (day, day_start, day_end) per day start..end, bounded by UTC midnights."""
+    if is_postgres(db):
+        offsets = func.generate_series(0, (end - start).days).table_valued("offset").render_derived()
+        day = literal(start, Date) + offsets.c.offset
+        return select(
+            day.label("day"),
+            func.timezone("UTC", cast(day, DateTime)).label("day_start"),
+            func.timezone("UTC", cast(day + 1, DateTime)).label("day_end")
+        ).select_from(offsets).subquery("days")
+    return union_all(*(
+        select(
+            literal(current, Date).label("day"),
+            literal(_utc_midnight(current), DateTime(timezone=True)).label("day_start"),
+            literal(_utc_midnight(current + timedelta(days=1)), DateTime(timezone=True)).label("day_end")
+        )
+        for current in (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+    )).subquery("days")
+
+
+async def _aggregate(db: AsyncSession, start: date, end: date, with_overdue: bool) -> dict[tuple[date, str, str], dict[str, int]]:
+    """Aggregate the raw tables for the days start..end (inclusive) into rollup rows keyed by (day, department, category)."""
+    rows: dict[tuple[date, str, str], dict[str, int]] = {}
+
+    def add(day, department, category, measure, count):
+        key = (_as_date(day), department or "", category or "")
+        rows.setdefault(key, dict.fromkeys(MEASURES, 0))[measure] += count
+
+    lower, upper = _utc_midnight(start), _utc_midnight(end + timedelta(days=1))
+    category = func.coalesce(Book.category, "")
+    for measure, moment in (("issues", BookIssue.issue_date), ("returns", BookIssue.actual_return_date)):
+        day = _utc_day(db, moment)
+        result = await db.execute(
+            select(day, Student.department, category, func.count())
+            .select_from(BookIssue)
+            .join(Student, Student.id == BookIssue.student_id)
+            .join(Book, Book.id == BookIssue.book_id)
+            .filter(moment >= lower, moment < upper)
+            .group_by(day, Student.department, category)
+        )
+        for row in result:
+            add(*row[:3], measure, row[3])
+
+    day = _utc_day(db, Book.created_at)
+    result = await db.execute(
+        select(day, category, func.count())
+        .filter(Book.created_at >= lower, Book.created_at < upper)
+        .group_by(day, category)
+    )
+    for book_day, book_category, count in result:
+        add(book_day, "", book_category, "new_books", count)
+
+    if with_overdue:
+        # Loans still out at the end of each day although they were due before it began, for all days in one query
+        days = _days(db, start, end)
+        result = await db.execute(
+            select(days.c.day, Student.department, category, func.count())
+            .select_from(days)
+            .join(BookIssue, and_(
+                BookIssue.issue_date < days.c.day_end,
+                BookIssue.expected_return_date < days.c.day_start,
+                or_(
+                    and_(BookIssue.is_returned == False, BookIssue.actual_return_date.is_(None)),
+                    BookIssue.actual_return_date >= days.c.day_end
+                )
+            ))
+            .join(Student, Student.id == BookIssue.student_id)
+            .join(Book, Book.id == BookIssue.book_id)
+            .group_by(days.c.day, Student.department, category)
+        )
+        for day, department, book_category, count in result:
+            add(day, department, book_category, "overdue", count)
+    return rows
+
+
+async def rolled_through(db: AsyncSession) -> date | None:
+    """Last day the rollup is complete through, or None before its first run."""
+    return (await db.execute(
+        select(RollupWatermark.rolled_through).filter(RollupWatermark.name == ROLLUP_NAME)
+    )).scalar_one_or_none()
+
+
+async def _first_activity_day(db: AsyncSession) -> date | None:
+    first_issue = (await db.execute(select(func.min(BookIssue.issue_date)))).scalar_one_or_none()
+    first_book = (await db.execute(select(func.min(Book.created_at)))).scalar_one_or_none()
+    days = [_as_date(moment) for moment in (first_issue, first_book) if moment is not None]
+    return min(days) if days else None
+
+
+async def refresh_circulation_rollup(db: AsyncSession, max_days: int | None = None) -> int:
+    """
+    Roll up the closed (UTC) days after the watermark, at most `max_days` of them, and
+    advance the watermark in the same transaction. Returns the number of days added.
+    """
+    max_days = max_days or settings.CIRCULATION_ROLLUP_MAX_DAYS
+    yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+    watermark = await rolled_through(db)
+    if watermark is None:
+        first_day = await _first_activity_day(db)
+        watermark = (first_day or yesterday + timedelta(days=1)) - timedelta(days=1)
+    start = watermark + timedelta(days=1)
+    end = min(yesterday, start + timedelta(days=max_days - 1))
+
+    if end >= start:
+        rows = await _aggregate(db, start, end, with_overdue=True)
+        await db.execute(delete(CirculationDaily).filter(CirculationDaily.day >= start, CirculationDaily.day <= end))
+        if rows:
+            await db.execute(insert(CirculationDaily), [
+                {"day": day, "department": department, "category": category, **measures}
+                for (day, department, category), measures in rows.items()
+            ])
+    await db.merge(RollupWatermark(name=ROLLUP_NAME, rolled_through=max(watermark, end)))
+    await db.commit()
+    days = max((end - start).days + 1, 0)
+    if days:
+        logger.info(f"Circulation rollup extended through {end} ({days} days, {len(rows)} rows).")
+    return days
+
+
+async def record_book_deletion(db: AsyncSession, book: Book) -> None:
+    """
+    Take a deleted book out of the `new_books` of its (rolled-up) creation day, in the caller's
+    transaction. Days after the watermark need nothing: they are aggregated from the books table.
+    """
+    created_at = book.created_at
+    day = (created_at.astimezone(timezone.utc) if created_at.tzinfo else created_at).date()
+    watermark = await rolled_through(db)
+    if watermark is None or day > watermark:
+        return
+    await db.execute(
+        CirculationDaily.__table__.update()
+        .where(
+            CirculationDaily.day == day,
+            CirculationDaily.department == "",
+            CirculationDaily.category == (book.category or ""),
+            CirculationDaily.new_books > 0
+        )
+        .values(new_books=CirculationDaily.new_books - 1)
+    )
+
+
+async def circulation_totals(
+    db: AsyncSession, start: date, end: date, group_by: Iterable[str] = ()
+) -> dict[tuple, dict[str, int]]:
+    """
+    Issues, returns and new books for the days start..end (inclusive), summed per value of the
+    `group_by` columns ("department" and/or "category"; one total under () when empty).
+
+    Rolled-up days are read from `circulation_daily`; days after the watermark are aggregated
+    from the raw tables. Overdue counts are per-day snapshots and are not summed here.
+    """
+    group_by = tuple(group_by)
+    unknown = set(group_by) - set(GROUP_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown rollup group column(s): {', '.join(sorted(unknown))}")
+    measures = ("issues", "returns", "new_books")
+    totals: dict[tuple, dict[str, int]] = {}
+
+    def add(key, values):
+        bucket = totals.setdefault(key, dict.fromkeys(measures, 0))
+        for measure in measures:
+            bucket[measure] += values[measure] or 0
+
+    watermark = await rolled_through(db)
+    if watermark is not None and watermark >= start:
+        columns = [getattr(CirculationDaily, name) for name in group_by]
+        result = await db.execute(
+            select(*columns, *(func.sum(getattr(CirculationDaily, measure)).label(measure) for measure in measures))
+            .filter(CirculationDaily.day >= start, CirculationDaily.day <= min(end, watermark))
+            .group_by(*columns)
+        )
+        for row in result:
+            add(tuple(row[:len(group_by)]), row._mapping)
+
+    live_start = max(start, watermark + timedelta(days=1)) if watermark is not None else start
+    if live_start <= end:
+        for (_, department, category), values in (await _aggregate(db, live_start, end, with_overdue=False)).items():
+            fields = {"department": department, "category": category}
+            add(tuple(fields[name] for name in group_by), values)
+    return totals
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First day of the bucket holding `day`, matching PostgreSQL's date_trunc (weeks start on Monday)."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+async def circulation_series(
+    db: AsyncSession, start: date, end: date, granularity: str = "day", group_by: str | None = None
+) -> CirculationSeries:
+    """
+    Issues and returns per day, week or month between start and end (inclusive), optionally
+    split by department or category.
+
+    Rolled-up days come from `circulation_daily` in one grouped query (bucketed with date_trunc
+    on PostgreSQL, so a year at monthly resolution is a dozen rows per group); days after the
+    watermark, i.e. the current bucket, are aggregated on demand from the raw tables. Buckets
+    at the edges only cover the days inside the range.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'")
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        raise ValueError(f"Unknown rollup group column '{group_by}'")
+    points: dict[tuple[date, str | None], dict[str, int]] = {}
+
+    def add(day, group, issues, returns):
+        bucket = points.setdefault((bucket_start(_as_date(day), granularity), group), {"issues": 0, "returns": 0})
+        bucket["issues"] += issues or 0
+        bucket["returns"] += returns or 0
+
+    watermark = await rolled_through(db)
+    if watermark is not None and watermark >= start:
+        if is_postgres(db) and granularity != "day":
+            day = func.date(func.date_trunc(granularity, CirculationDaily.day))
+        else:
+            day = CirculationDaily.day # Bucketed below
+        group = getattr(CirculationDaily, group_by) if group_by else None
+        columns = [day] + ([group] if group is not None else [])
+        result = await db.execute(
+            select(*columns, func.sum(CirculationDaily.issues), func.sum(CirculationDaily.returns))
+            .filter(
+                CirculationDaily.day >= start,
+                CirculationDaily.day <= min(end, watermark),
+                or_(CirculationDaily.issues > 0, CirculationDaily.returns > 0)
+            )
+            .group_by(*columns)
+        )
+        for row in result:
+            add(row[0], row[1] if group_by else None, row[-2], row[-1])
+
+    live_start = max(start, watermark + timedelta(days=1)) if watermark is not None else start
+    if live_start <= end:
+        for (day, department, category), values in (await _aggregate(db, live_start, end, with_overdue=False)).items():
+            if values["issues"] or values["returns"]:
+                group = {"department": department, "category": category}.get(group_by) if group_by else None
+                add(day, group, values["issues"], values["returns"])
+
+    return CirculationSeries(
+        granularity=granularity, group_by=group_by, start=start, end=end, rolled_through=watermark,
+        points=[
+            CirculationPoint(bucket=bucket, group=group, **values)
+            for (bucket, group), values in sorted(points.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+        ]
+    )
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.utils import is_postgres
+from app.models.idempotency import IdempotencyRecord
+from app.services.catalog_cache import book_cache, book_invalidations_recorded
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: Any # JSON-compatible
+
+
+# Scoped keys ("<METHOD> <path> <client key>") whose first request is still running in this worker
+_in_flight: set[str] = set()
+
+# Runs the mutation with the given session and returns its outcome
+Attempt = Callable[[AsyncSession], Awaitable[StoredResponse]]
+
+
+class IdempotencyStore(ABC):
+    """Where the outcome of a keyed mutation is remembered until the key expires."""
+
+    @abstractmethod
+    async def get(self, db: AsyncSession, key: str) -> StoredResponse | None:
+        ...
+
+    @abstractmethod
+    async def put(self, db: AsyncSession, key: str, response: StoredResponse) -> None:
+        ...
+
+    async def execute(self, db: AsyncSession, key: str, attempt: Attempt) -> tuple[StoredResponse, bool]:
+        """
+        Return the stored outcome for `key` (and True), or run `attempt` with the request's
+        session, remember its outcome and return it (and False).
+
+        A duplicate arriving while the first request is still running in this worker gets 409;
+        duplicates in other workers are not seen until the outcome is stored.
+        """
+        stored = await self.get(db, key)
+        if stored is not None:
+            return stored, True
+        if key in _in_flight:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"A request with {IDEMPOTENCY_HEADER} '{key.split(' ', 2)[2]}' is still being processed."
+            )
+        _in_flight.add(key)
+        try:
+            stored = await attempt(db)
+            await self.put(db, key, stored)
+            return stored, False
+        finally:
+            _in_flight.discard(key)
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Bounded LRU of responses in this worker; a retry that lands on another worker runs again."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    async def get(self, db: AsyncSession, key: str) -> StoredResponse | None:
+        return self._cache.get(key)
+
+    async def put(self, db: AsyncSession, key: str, response: StoredResponse) -> None:
+        self._cache.set(key, response)
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """
+    Responses kept in the `idempotency_keys` table, shared by every worker; expired rows are
+    purged by the scheduler.
+
+    `execute` claims the key by inserting its row before the mutation runs, and the mutation
+    and its response are written in that same transaction: the mutation runs on a session
+    joined to the transaction, whose own commits only release savepoints. A duplicate in any
+    worker blocks on the uncommitted row and then replays the committed outcome, or runs
+    itself if the first attempt rolled back; a crash leaves neither the mutation nor the key.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+
+    def _select(self, key: str):
+        return (
+            select(IdempotencyRecord.request_hash, IdempotencyRecord.status_code, IdempotencyRecord.response_body)
+            .where(IdempotencyRecord.key == key, IdempotencyRecord.created_at >= self._cutoff())
+        )
+
+    async def get(self, db: AsyncSession, key: str) -> StoredResponse | None:
+        row = (await db.execute(self._select(key))).first()
+        if row is None:
+            return None
+        return StoredResponse(row.request_hash, row.status_code, json.loads(row.response_body))
+
+    async def put(self, db: AsyncSession, key: str, response: StoredResponse) -> None:
+        # An expired row under the same key would block the insert
+        await db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key == key))
+        db.add(IdempotencyRecord(
+            key=key, request_hash=response.request_hash, status_code=response.status_code,
+            response_body=json.dumps(response.body), created_at=datetime.now(timezone.utc)
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent duplicate in another worker stored its outcome first; keep that one
+            await db.rollback()
+
+    async def execute(self, db: AsyncSession, key: str, attempt: Attempt) -> tuple[StoredResponse, bool]:
+        records = IdempotencyRecord.__table__
+        dialect_insert = pg_insert if is_postgres(db) else sqlite_insert
+        async with db.bind.connect() as conn:
+            async with conn.begin():
+                # An expired row under the same key would make the claim look taken
+                await conn.execute(delete(records).where(records.c.key == key, records.c.created_at < self._cutoff()))
+                # The placeholder outcome is never visible to others: it commits only together with the real one
+                claimed = (await conn.execute(
+                    dialect_insert(records)
+                    .values(key=key, request_hash="", status_code=0, response_body="null", created_at=datetime.now(timezone.utc))
+                    .on_conflict_do_nothing(index_elements=[records.c.key])
+                    .returning(records.c.key)
+                )).first()
+                if claimed is None:
+                    row = (await conn.execute(self._select(key))).one()
+                    return StoredResponse(row.request_hash, row.status_code, json.loads(row.response_body)), True
+
+                session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False, autoflush=False)
+                try:
+                    with book_invalidations_recorded() as invalidated:
+                        stored = await attempt(session)
+                finally:
+                    await session.close()
+                await conn.execute(
+                    records.update()
+                    .where(records.c.key == key)
+                    .values(request_hash=stored.request_hash, status_code=stored.status_code, response_body=json.dumps(stored.body))
+                )
+        # Readers may have cached the books between the writer's invalidation and this commit
+        for book_id in invalidated:
+            book_cache.invalidate(book_id)
+        return stored, False
+
+    async def purge_expired(self, db: AsyncSession) -> int:
+        result = await db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.created_at < self._cutoff()))
+        await db.commit()
+        return result.rowcount
+
+
+def create_idempotency_store(backend: str) -> IdempotencyStore:
+    """Build the store named by the IDEMPOTENCY_STORE setting."""
+    if backend == "memory":
+        return MemoryIdempotencyStore(maxsize=settings.IDEMPOTENCY_MAX_ENTRIES, ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    if backend == "database":
+        return DatabaseIdempotencyStore(ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    raise ValueError(f"Unknown idempotency store backend '{backend}'")
+
+
+idempotency_store = create_idempotency_store(settings.IDEMPOTENCY_STORE)
+
+
+def _replay(stored: StoredResponse) -> JSONResponse:
+    return JSONResponse(status_code=stored.status_code, content=stored.body, headers={REPLAYED_HEADER: "true"})
+
+
+async def run_idempotent(
+    request: Request,
+    db: AsyncSession,
+    idempotency_key: str | None,
+    handler: Callable[[AsyncSession], Awaitable[Any]],
+    response_model: type[BaseModel],
+    status_code: int = status.HTTP_200_OK
+) -> Any:
+    """
+    Run a mutation at most once per Idempotency-Key.
+
+    `handler` performs the mutation with the session it is given (the store may pass one of
+    its own). Without a key it simply runs with `db`. With one, a stored outcome (success or
+    4xx refusal) for the same method, path and key is replayed without touching the mutation
+    path, and reusing a key with a different body is rejected with 422. Server errors are not
+    stored, so the client can retry them.
+    """
+    if idempotency_key is None:
+        return await handler(db)
+
+    key = f"{request.method} {request.url.path} {idempotency_key}"
+    request_hash = hashlib.sha256(await request.body()).hexdigest()
+    refusal: HTTPException | None = None
+
+    async def attempt(session: AsyncSession) -> StoredResponse:
+        nonlocal refusal
+        try:
+            result = await handler(session)
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            await session.rollback() # Nothing of the refused mutation may ride along with the stored record
+            refusal = e
+            return StoredResponse(request_hash, e.status_code, {"detail": jsonable_encoder(e.detail)})
+        return StoredResponse(request_hash, status_code, jsonable_encoder(response_model.model_validate(result)))
+
+    stored, replayed = await idempotency_store.execute(db, key, attempt)
+    if replayed:
+        if stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"{IDEMPOTENCY_HEADER} '{idempotency_key}' was already used with a different request body."
+            )
+        return _replay(stored)
+    if refusal is not None:
+        raise refusal
+    return JSONResponse(status_code=status_code, content=stored.body)
@@ -1,67 +1,81 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, select, text
-from datetime import datetime, timedelta, date as py_date
+from datetime import datetime, timedelta, timezone, time
 import logging
 
-from app.models.book import Book
-from app.models.student import Student
+from app.core.cache import Snapshot
+from app.core.config import settings
 from app.models.book_issue import BookIssue
+from app.services.circulation_rollup import circulation_totals
+from app.crud import counters
 
 logger = logging.getLogger(__name__)
 
 class LibraryAnalyticsService:
+    async def get_collection_statistics(self, db: AsyncSession) -> dict:
+        """
+        Total copies, registered students and active issues.
+
+        Read from the live counters the write paths maintain (a few rows, whatever the size of
+        the library); counted from the tables in one statement until the counters exist.
+        "Total books" is the sum of num_copies_total, or the number of book records when every
+        book has zero copies (as before).
+        """
+        totals = await counters.read_totals(db) or await counters.count_totals(db)
+        return {
+            "total_books": totals["copies_total"] or totals["books"],
+            "total_students": totals["students"],
+            "currently_issued": totals["issued"],
+            "as_of": datetime.now(timezone.utc).isoformat()
+        }
+
     async def get_overdue_books_count(self, db: AsyncSession) -> int:
-        """Gets the total number of books that are currently overdue."""
-        today = py_date.today()
-        stmt = select(func.count(BookIssue.id)).filter(
+        """
+        Gets the total number of books that are currently overdue.
+
+        This is a point-in-time figure (a return a minute ago must count), so it is not read
+        from the daily rollup, whose overdue column is an end-of-day snapshot.
+        """
+        # Due dates are midnight UTC; a bare range on the column is answered from the
+        # partial index on active issues without touching the (mostly returned) history.
+        start_of_today = datetime.combine(datetime.now(timezone.utc).date(), time.min, tzinfo=timezone.utc)
+        stmt = select(func.count()).select_from(BookIssue).filter(
             BookIssue.is_returned == False,
-            BookIssue.expected_return_date < today
+            BookIssue.expected_return_date < start_of_today
         )
         result = await db.execute(stmt)
         count = result.scalar_one_or_none()
         return count if count is not None else 0
 
     async def get_department_with_most_borrows_last_month(self, db: AsyncSession) -> dict:
-        """Identifies the department that borrowed the most books in the last calendar month."""
-        today = py_date.today()
+        """Identifies the department that borrowed the most books in the last calendar month (from the daily rollup)."""
+        today = datetime.now(timezone.utc).date()
         first_day_current_month = today.replace(day=1)
         last_day_last_month = first_day_current_month - timedelta(days=1)
         first_day_last_month = last_day_last_month.replace(day=1)
 
         logger.info(f"Calculating most borrows for period: {first_day_last_month} to {last_day_last_month}")
 
-        stmt = (
-            select(Student.department, func.count(BookIssue.id).label("borrow_count"))
-            .join(Student, BookIssue.student_id == Student.id)
-            .filter(BookIssue.issue_date >= first_day_last_month)
-            .filter(BookIssue.issue_date <= last_day_last_month)
-            .group_by(Student.department)
-            .order_by(func.count(BookIssue.id).desc())
-            .limit(1)
-        )
-        result = await db.execute(stmt)
-        record = result.first()
-        
-        if record and record.department:
-            return {"department": record.department, "borrow_count": record.borrow_count}
-        elif record and not record.department:
-            return {"department": "Unknown/Not Specified", "borrow_count": record.borrow_count}
-        return {"department": "No borrows", "borrow_count": 0}
+        totals = await circulation_totals(db, first_day_last_month, last_day_last_month, group_by=("department",))
+        borrows = [(values["issues"], department) for (department,), values in totals.items() if values["issues"]]
+        if not borrows:
+            return {"department": "No borrows", "borrow_count": 0}
+        borrow_count, department = max(borrows)
+        return {"department": department or "Unknown/Not Specified", "borrow_count": borrow_count}
 
     async def get_new_books_added_this_week_count(self, db: AsyncSession) -> int:
-        """Gets the total number of new books added to the library in the current week (Monday to Sunday)."""
-        today = py_date.today()
+        """Gets the total number of new books added to the library in the current week (Monday to Sunday), from the daily rollup."""
+        today = datetime.now(timezone.utc).date()
         start_of_week = today - timedelta(days=today.weekday())  # Monday
         end_of_week = start_of_week + timedelta(days=6)  # Sunday
         
         logger.info(f"Calculating new books for week: {start_of_week} to {end_of_week}")
 
-        stmt = select(func.count(Book.id)).filter(
-            func.date(Book.created_at) >= start_of_week,
-            func.date(Book.created_at) <= end_of_week
-        )
-        result = await db.execute(stmt)
-        count = result.scalar_one_or_none()
-        return count if count is not None else 0
+        # Days after today have nothing yet
+        totals = await circulation_totals(db, start_of_week, today)
+        return totals.get((), {}).get("new_books", 0)
+
+library_analytics_service = LibraryAnalyticsService()
 
-library_analytics_service = LibraryAnalyticsService() 
\ No newline at end of file
+# Dashboard figures shared by all /stats/collection requests of this worker
+collection_stats_snapshot = Snapshot(ttl_seconds=settings.STATS_SNAPSHOT_TTL_SECONDS) 
\ No newline at end of file
@@ -0,0 +1,180 @@
+import logging
+import re
+import uuid
+from bisect import bisect_left, insort
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import InvalidationBus
+from app.models.book import Book
+from app.models.student import Student
+from app.services.catalog_cache import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text.casefold()).strip()
+
+
+class PrefixIndex:
+    """
+    In-memory typeahead index: a sorted array of the distinct words of every indexed text, each
+    with the IDs of the items containing it, searched with bisect.
+
+    A query matches an item when every query word is the start of one of the item's words
+    ("pot harr" finds "Harry Potter"). Lookups walk the word array from the bisect position of
+    the longest query word and stop at the first word past the prefix, so they are
+    O(log n + k) and never touch the database. Writers keep the index current through `upsert`
+    / `upsert_many` / `remove`, and the change is broadcast on the invalidation bus so the
+    indexes of other workers follow.
+    """
+
+    def __init__(self, name: str, bus: InvalidationBus):
+        self.name = name
+        self.ready = False
+        self._words: list[str] = []
+        self._postings: dict[str, dict[int, None]] = {} # word -> item IDs in insertion order
+        self._items: dict[int, tuple[str, str | None]] = {}
+        self._words_by_id: dict[int, tuple[str, ...]] = {}
+        self._bus = bus
+        self._channel = f"suggest.{name}"
+        self._origin = uuid.uuid4().hex
+        bus.subscribe(self._channel, self._on_message)
+
+    @staticmethod
+    def _words_for(texts: Iterable[str | None]) -> tuple[str, ...]:
+        words = set()
+        for text in texts:
+            if text:
+                words.update(text.casefold().split())
+        return tuple(words)
+
+    def _add_local(self, item_id: int, label: str, detail: str | None, texts: Iterable[str | None]) -> list[str]:
+        """Index one item without touching the word array; returns the words it introduced."""
+        if item_id in self._items:
+            self._remove_local(item_id)
+        words = self._words_for(texts)
+        new_words = []
+        for word in words:
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = {}
+                new_words.append(word)
+            ids[item_id] = None
+        self._items[item_id] = (label, detail)
+        self._words_by_id[item_id] = words
+        return new_words
+
+    def load(self, items: Iterable[tuple[int, str, str | None, Iterable[str | None]]]) -> None:
+        """Rebuild from ``(id, label, detail, texts)`` tuples, sorting the words once."""
+        self._postings.clear()
+        self._items.clear()
+        self._words_by_id.clear()
+        self._words = []
+        for item_id, label, detail, texts in items:
+            self._add_local(item_id, label, detail, texts)
+        self._words = sorted(self._postings)
+        self.ready = True
+        logger.info(f"Suggestion index '{self.name}' loaded with {len(self._items)} items ({len(self._words)} words).")
+
+    def upsert(self, item_id: int, label: str, detail: str | None, texts: Iterable[str | None], publish: bool = True) -> None:
+        texts = list(texts)
+        for word in self._add_local(item_id, label, detail, texts):
+            insort(self._words, word)
+        if publish:
+            self._bus.publish(self._channel, {
+                "origin": self._origin, "op": "upsert", "id": item_id, "label": label, "detail": detail, "texts": texts
+            })
+
+    def upsert_many(self, items: Iterable[tuple[int, str, str | None, Iterable[str | None]]], publish: bool = True) -> None:
+        """Index a batch (e.g. an import chunk), merging its new words into the word array in one sort."""
+        items = [(item_id, label, detail, list(texts)) for item_id, label, detail, texts in items]
+        new_words = []
+        for item_id, label, detail, texts in items:
+            new_words.extend(self._add_local(item_id, label, detail, texts))
+        if new_words:
+            self._words.extend(new_words)
+            self._words.sort()
+        if publish and items:
+            self._bus.publish(self._channel, {"origin": self._origin, "op": "upsert_many", "items": items})
+
+    def remove(self, item_id: int) -> None:
+        self._remove_local(item_id)
+        self._bus.publish(self._channel, {"origin": self._origin, "op": "remove", "id": item_id})
+
+    def search(self, prefix: str, limit: int = 8) -> list[dict]:
+        query = normalize(prefix).split(" ")
+        if not query[0]:
+            return []
+        # Walk the most selective query word; the others are checked against each candidate's words
+        lead = max(query, key=len)
+        others = [word for word in query if word != lead]
+        results = []
+        seen = set()
+        position = bisect_left(self._words, lead)
+        while position < len(self._words) and len(results) < limit:
+            word = self._words[position]
+            if not word.startswith(lead):
+                break
+            position += 1
+            for item_id in self._postings[word]:
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                words = self._words_by_id[item_id]
+                if not all(any(candidate.startswith(other) for candidate in words) for other in others):
+                    continue
+                label, detail = self._items[item_id]
+                results.append({"id": item_id, "label": label, "detail": detail})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _remove_local(self, item_id: int) -> None:
+        for word in self._words_by_id.pop(item_id, ()):
+            ids = self._postings[word]
+            del ids[item_id]
+            if not ids:
+                del self._postings[word]
+                position = bisect_left(self._words, word)
+                if position < len(self._words) and self._words[position] == word:
+                    del self._words[position]
+        self._items.pop(item_id, None)
+
+    def _on_message(self, message: dict) -> None:
+        if message.get("origin") == self._origin:
+            return
+        if message["op"] == "remove":
+            self._remove_local(message["id"])
+        elif message["op"] == "upsert_many":
+            self.upsert_many(message["items"], publish=False)
+        else:
+            self.upsert(message["id"], message["label"], message["detail"], message["texts"], publish=False)
+
+
+book_suggestions = PrefixIndex("books", invalidation_bus)
+student_suggestions = PrefixIndex("students", invalidation_bus)
+
+
+def index_book(book: Book) -> None:
+    book_suggestions.upsert(book.id, book.title, book.author, (book.title, book.author))
+
+
+def index_student(student: Student) -> None:
+    student_suggestions.upsert(student.id, student.name, student.roll_number, (student.name, student.roll_number))
+
+
+async def load_suggestion_indexes(db: AsyncSession) -> None:
+    """Build both indexes from the database; called once at startup."""
+    books = await db.stream(select(Book.id, Book.title, Book.author).execution_options(yield_per=5000))
+    book_suggestions.load([(row.id, row.title, row.author, (row.title, row.author)) async for row in books])
+    students = await db.stream(select(Student.id, Student.name, Student.roll_number).execution_options(yield_per=5000))
+    student_suggestions.load([(row.id, row.name, row.roll_number, (row.name, row.roll_number)) async for row in students])
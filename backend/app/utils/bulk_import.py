@@ -0,0 +1,125 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+
+
+class RowParseError(Exception):
+    """A line of the upload that could not even be parsed into a record."""
+
+
+def upload_format(request: Request) -> str:
+    """'csv' or 'ndjson', from the request's Content-Type."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in CSV_CONTENT_TYPES:
+        return "csv"
+    if content_type in NDJSON_CONTENT_TYPES:
+        return "ndjson"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Upload must be sent as text/csv (with a header row) or application/x-ndjson."
+    )
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a streamed body into raw lines (without a leading UTF-8 BOM) without holding more than
+    one chunk in memory. Lines are left undecoded so a bad byte only spoils its own line; a
+    UTF-8 multi-byte sequence never contains the newline byte.
+    """
+    pending = b""
+    first = True
+    async for chunk in chunks:
+        pending += chunk
+        if first and len(pending) >= len(codecs.BOM_UTF8):
+            pending = pending.removeprefix(codecs.BOM_UTF8)
+            first = False
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if first:
+        pending = pending.removeprefix(codecs.BOM_UTF8)
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+async def iter_records(request: Request) -> AsyncIterator[tuple[int, dict[str, Any] | RowParseError]]:
+    """
+    Yield ``(row_number, record)`` for every non-blank data row of a CSV or NDJSON upload.
+
+    Row numbers are 1-based and do not count the CSV header. Rows that cannot be parsed are
+    yielded as a `RowParseError` so they end up in the report instead of aborting the import;
+    that includes lines that are not valid UTF-8. A CSV header that is not valid UTF-8 is
+    rejected with 400 before anything is imported. CSV fields must not contain line breaks;
+    empty CSV fields are treated as missing.
+    """
+    fmt = upload_format(request)
+    header: list[str] | None = None
+    row_number = 0
+    async for raw_line in iter_lines(request.stream()):
+        try:
+            line = raw_line.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if fmt == "csv" and header is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The CSV header row is not valid UTF-8.")
+            row_number += 1
+            yield row_number, RowParseError(f"not valid UTF-8 (byte {e.start + 1} of the line)")
+            continue
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_number += 1
+            if len(values) != len(header):
+                yield row_number, RowParseError(f"expected {len(header)} columns, got {len(values)}")
+                continue
+            yield row_number, {name: value for name, value in zip(header, values) if value != ""}
+        else:
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, RowParseError(f"invalid JSON: {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield row_number, RowParseError("each line must be a JSON object")
+                continue
+            yield row_number, record
+
+
+async def chunked(records: AsyncIterator[Any], size: int) -> AsyncIterator[list[Any]]:
+    chunk: list[Any] = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def record_key(record: dict[str, Any], field: str) -> str | None:
+    """The natural key of a raw record for its error report, as text whatever JSON type it was sent as."""
+    value = record.get(field)
+    return None if value is None else str(value)
+
+
+def validation_messages(error: ValidationError | RowParseError) -> list[str]:
+    """Flatten a validation/parse error into short human readable messages."""
+    if isinstance(error, RowParseError):
+        return [str(error)]
+    messages = []
+    for item in error.errors():
+        location = ".".join(str(part) for part in item.get("loc", ()))
+        messages.append(f"{location}: {item['msg']}" if location else item["msg"])
+    return messages
+
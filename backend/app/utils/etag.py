@@ -0,0 +1,38 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Iterable
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong entity tag over the given parts (their repr, so order and types matter)."""
+    digest = hashlib.sha1("|".join(repr(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def resource_etag(kind: str, resource_id: int, updated_at: datetime) -> str:
+    """ETag of a single row: it changes whenever the row's updated_at does."""
+    return make_etag(kind, resource_id, updated_at.isoformat())
+
+
+def list_etag(kind: str, rows: Iterable[Any], *extra: Any) -> str:
+    """ETag of a list page: the (id, updated_at) of every row plus e.g. the total and cursor."""
+    return make_etag(kind, [(row.id, row.updated_at.isoformat()) for row in rows], *extra)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so a W/ prefix on either side is ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == bare for candidate in if_none_match.split(","))
+
+
+def not_modified_response(request: Request, etag: str) -> Response | None:
+    """A bodiless 304 when the client already holds `etag`, otherwise None."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Mapping, Sequence
+
+from fastapi.responses import StreamingResponse
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Rows are written to the socket in batches of this many lines
+EXPORT_FLUSH_ROWS = 500
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+async def serialize_rows(
+    rows: AsyncIterator[Mapping[str, Any]], columns: Sequence[str], fmt: str
+) -> AsyncIterator[str]:
+    """Turn a stream of row mappings into NDJSON lines or CSV (with a header), batch by batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    pending = 0
+    async for row in rows:
+        if writer:
+            writer.writerow([_csv_value(row[name]) for name in columns])
+        else:
+            buffer.write(json.dumps({name: row[name] for name in columns}, default=_json_default))
+            buffer.write("\n")
+        pending += 1
+        if pending >= EXPORT_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(
+    open_rows: Callable[[], AsyncIterator[Mapping[str, Any]]], columns: Sequence[str], fmt: str, filename: str
+) -> StreamingResponse:
+    """
+    StreamingResponse for an export. `open_rows` is only called once the body starts streaming,
+    so it must own its database session: request-scoped sessions are closed by then.
+    """
+    return StreamingResponse(
+        serialize_rows(open_rows(), columns, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,80 @@
+"""
+Shared fixtures: every test gets the FastAPI app on a fresh SQLite database (aiosqlite) and
+empty in-process caches, so tests do not depend on each other or on a PostgreSQL server.
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import app.db  # noqa: F401  Registers the models before app.db.database builds its engine
+from app.db import Base
+from app.db import database
+from app.main import app as fastapi_app
+from app.services import idempotency
+from app.services.catalog_cache import book_cache, student_lookup_cache
+from app.services.library_analytics_service import collection_stats_snapshot
+from app.services.suggestion_index import book_suggestions, student_suggestions
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A migrated SQLite database that every AsyncSessionLocal() of the app connects to."""
+    # NullPool: tests drive the engine from more than one event loop (the client's and asyncio.run)
+    test_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'library.db'}", poolclass=NullPool)
+
+    async def create_tables():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(database._create_missing_indexes)
+
+    asyncio.run(create_tables())
+    original_bind = database.AsyncSessionLocal.kw["bind"]
+    database.AsyncSessionLocal.configure(bind=test_engine)
+    yield test_engine
+    database.AsyncSessionLocal.configure(bind=original_bind)
+    asyncio.run(test_engine.dispose())
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    book_cache.clear()
+    student_lookup_cache.clear()
+    collection_stats_snapshot.clear()
+    book_suggestions.load([])
+    student_suggestions.load([])
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    # Without the `with` block the lifespan (table creation, scheduler) does not run
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.create_idempotency_store("memory"))
+    return TestClient(fastapi_app)
+
+
+@pytest.fixture
+def run(engine):
+    """Run a coroutine function against a session of the test database: run(lambda db: ...)."""
+    def run_with_session(work):
+        async def main():
+            async with database.AsyncSessionLocal() as db:
+                return await work(db)
+        return asyncio.run(main())
+    return run_with_session
+
+
+
+@pytest.fixture
+def executed(engine):
+    """Every SQL statement run on the test database, in order; clear() it before the part being measured."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
@@ -0,0 +1,74 @@
+"""Builders for the rows most tests need, created through the API."""
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import update
+
+from app.models.book import Book
+from app.models.book_issue import BookIssue
+
+
+def create_book(client, number: int, **fields) -> dict:
+    payload = {"title": f"Book {number}", "author": "Author", "isbn": f"978{number:010d}", "num_copies_total": 2}
+    response = client.post("/api/v1/books/", json={**payload, **fields})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def create_student(client, number: int, **fields) -> dict:
+    payload = {
+        "name": f"Student {number}", "roll_number": f"R{number}", "department": "CS", "semester": 3,
+        "phone": f"9{number:09d}", "email": f"student{number}@example.com"
+    }
+    response = client.post("/api/v1/students/", json={**payload, **fields})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def due_in(days: int) -> str:
+    return str(date.today() + timedelta(days=days))
+
+
+def utc(day: date, hour: int = 12, minute: int = 0, second: int = 0) -> datetime:
+    return datetime.combine(day, time(hour, minute, second), tzinfo=timezone.utc)
+
+
+def create_circulation_history(client, run, today: date) -> None:
+    """
+    Three books (Fantasy, History, no category) and two students (CS, EE) with loans around day
+    boundaries, backdated after the fact:
+
+    - issued at 00:00:00 on day -9, due day -6, returned at 10:00 on day -3 (CS)
+    - issued at 23:59:59 on day -9, due day -2, still out (CS)
+    - issued on day -4, returned at 23:59:59 on day -1 (EE)
+    - issued today, still out (EE)
+
+    All books were added on day -12 except the uncategorized one, added at 00:00:00 on day -9.
+    """
+    books = [create_book(client, number, category=category) for number, category in enumerate(["Fantasy", "History", None])]
+    students = [create_student(client, 1, department="CS"), create_student(client, 2, department="EE")]
+    day = lambda offset: today + timedelta(days=offset)
+    loans = [
+        # (book, student, issued, due, returned)
+        (0, 0, utc(day(-9), 0), utc(day(-6), 0), utc(day(-3), 10)),
+        (1, 0, utc(day(-9), 23, 59, 59), utc(day(-2), 0), None),
+        (2, 1, utc(day(-4)), utc(day(3), 0), utc(day(-1), 23, 59, 59)),
+        (0, 1, utc(today), utc(day(7), 0), None),
+    ]
+    issue_ids = []
+    for book, student, _, _, _ in loans:
+        response = client.post("/api/v1/issues/", json={
+            "book_id": books[book]["id"], "student_id": students[student]["id"], "expected_return_date": due_in(7)
+        })
+        assert response.status_code == 201, response.text
+        issue_ids.append(response.json()["id"])
+
+    async def backdate(db):
+        await db.execute(update(Book).values(created_at=utc(day(-12))))
+        await db.execute(update(Book).filter(Book.id == books[2]["id"]).values(created_at=utc(day(-9), 0)))
+        for issue_id, (_, _, issued, due, returned) in zip(issue_ids, loans):
+            await db.execute(update(BookIssue).filter(BookIssue.id == issue_id).values(
+                issue_date=issued, expected_return_date=due, actual_return_date=returned, is_returned=returned is not None
+            ))
+        await db.commit()
+
+    run(backdate)
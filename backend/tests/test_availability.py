@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.crud import availability
+from app.models.book_copy_slot import BookCopySlot
+from tests.factories import create_book, create_student, due_in
+
+
+@pytest.fixture
+def book(client):
+    return create_book(client, 1, num_copies_total=4)
+
+
+def add_slots(run, book_id: int, copies: list[int]) -> None:
+    async def insert_slots(db):
+        await db.execute(insert(BookCopySlot), [
+            {"book_id": book_id, "slot": slot, "available": available} for slot, available in enumerate(copies)
+        ])
+        await db.commit()
+    run(insert_slots)
+
+
+def slot_copies(run, book_id: int) -> list[int]:
+    async def load(db):
+        return (await db.execute(
+            select(BookCopySlot.available).where(BookCopySlot.book_id == book_id).order_by(BookCopySlot.slot)
+        )).scalars().all()
+    return run(load)
+
+
+def claim(run, book_id: int) -> bool:
+    async def claim_and_commit(db):
+        claimed = await availability.claim_copy(db, book_id)
+        await db.commit()
+        return claimed
+    return run(claim_and_commit)
+
+
+def test_claim_takes_a_copy_from_a_slot_that_has_one(run, book):
+    add_slots(run, book["id"], [0, 0, 1, 0])
+    assert claim(run, book["id"]) is True
+    assert slot_copies(run, book["id"]) == [0, 0, 0, 0]
+    assert claim(run, book["id"]) is False
+
+
+def test_waiting_claim_moves_on_to_the_slot_that_still_has_stock(run, book, monkeypatch):
+    # As if every slot with a copy were locked by another issue: the skip-locked pass finds nothing
+    async def all_slots_busy(db, book_id, conditions):
+        return False
+    monkeypatch.setattr(availability, "_claim", all_slots_busy)
+    add_slots(run, book["id"], [0, 0, 0, 2])
+
+    assert claim(run, book["id"]) is True
+    assert claim(run, book["id"]) is True
+    assert slot_copies(run, book["id"]) == [0, 0, 0, 0]
+    assert claim(run, book["id"]) is False
+
+
+def test_first_claim_seeds_the_slots_from_the_books_row(run, book, monkeypatch):
+    monkeypatch.setattr(settings, "AVAILABILITY_SLOTS", 3)
+    assert claim(run, book["id"]) is True
+    assert sorted(slot_copies(run, book["id"])) == [1, 1, 1]
+
+
+def test_claim_of_a_missing_book_fails(run, book):
+    assert claim(run, 999) is False
+
+
+def test_slots_are_off_by_default(client, run, book):
+    assert settings.AVAILABILITY_SLOTS == 1
+    student = create_student(client, 1)
+    response = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+
+    assert response.status_code == 201
+    assert response.json()["book"]["num_copies_available"] == 3
+    assert slot_copies(run, book["id"]) == []
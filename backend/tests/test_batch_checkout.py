@@ -0,0 +1,57 @@
+from tests.factories import create_book, create_student, due_in
+
+
+def checkout(client, student_id: int, *book_ids: int):
+    return client.post("/api/v1/issues/batch", json={"student_id": student_id, "items": [{"book_id": book_id} for book_id in book_ids]})
+
+
+def available(client, *book_ids: int) -> list[int]:
+    return [client.get(f"/api/v1/books/{book_id}").json()["num_copies_available"] for book_id in book_ids]
+
+
+def test_cart_is_issued_in_order_with_one_claim_and_one_insert(client, executed):
+    books = [create_book(client, number) for number in range(3)]
+    student = create_student(client, 1)
+    executed.clear()
+    response = client.post("/api/v1/issues/batch", json={"student_id": student["id"], "items": [
+        {"book_id": books[2]["id"]}, {"book_id": books[0]["id"], "expected_return_date": due_in(3)}
+    ]})
+
+    assert response.status_code == 201
+    issues = response.json()["issues"]
+    assert [(issue["book_id"], issue["book"]["num_copies_available"]) for issue in issues] == [(books[2]["id"], 1), (books[0]["id"], 1)]
+    assert issues[1]["expected_return_date"] == due_in(3)
+    assert available(client, *(book["id"] for book in books)) == [1, 2, 1]
+    verbs = [statement.split()[0] for statement in executed if not statement.startswith(("BEGIN", "COMMIT", "ROLLBACK"))]
+    assert verbs[:3] == ["SELECT", "UPDATE", "INSERT"]
+
+
+def test_one_refused_book_issues_nothing_and_explains_every_refusal(client):
+    free, taken, held = (create_book(client, number, num_copies_total=copies) for number, copies in enumerate([1, 1, 2]))
+    student, other = create_student(client, 1), create_student(client, 2)
+    assert checkout(client, other["id"], taken["id"]).status_code == 201
+    assert checkout(client, student["id"], held["id"]).status_code == 201
+
+    response = checkout(client, student["id"], free["id"], taken["id"], held["id"], 99)
+    assert response.status_code == 409
+    assert response.json()["detail"]["errors"] == [
+        {"book_id": taken["id"], "reason": f"Book 'Book 1' (ID: {taken['id']}) has no available copies."},
+        {"book_id": held["id"], "reason": f"Student (ID: {student['id']}) already has an active issue for Book 'Book 2' (ID: {held['id']})."},
+        {"book_id": 99, "reason": "Book with ID 99 not found."},
+    ]
+    assert available(client, free["id"]) == [1]  # Its claim was rolled back with the rest
+
+
+def test_a_book_listed_twice_is_rejected(client):
+    book, student = create_book(client, 1), create_student(client, 1)
+    response = checkout(client, student["id"], book["id"], book["id"])
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"] == [{"book_id": book["id"], "reason": "Listed more than once."}]
+    assert available(client, book["id"]) == [2]
+
+
+def test_unknown_student_and_cart_limits(client):
+    book = create_book(client, 1)
+    assert checkout(client, 99, book["id"]).status_code == 404
+    assert checkout(client, 1).status_code == 422
+    assert checkout(client, 1, *range(1, 22)).status_code == 422
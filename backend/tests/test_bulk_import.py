@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+from app.utils.bulk_import import iter_lines
+from tests.factories import create_book, create_student
+
+CSV = {"content-type": "text/csv"}
+NDJSON = {"content-type": "application/x-ndjson"}
+BOOK_HEADER = "title,author,isbn,num_copies_total\n"
+
+
+def import_books(client, body, headers=CSV, **params):
+    return client.post("/api/v1/books/import", content=body, headers=headers, params=params)
+
+
+def ndjson(*records) -> str:
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def test_csv_import_reports_only_the_bad_rows(client):
+    body = BOOK_HEADER + "Dune,Herbert,9780441013593,2\n,Nobody,9780000000001,1\nEmma,Austen,9780141439587,0\n"
+    report = import_books(client, body).json()
+
+    assert (report["received"], report["imported"], report["failed"]) == (3, 1, 2)
+    assert [(error["row"], error["key"]) for error in report["errors"]] == [(2, "9780000000001"), (3, "9780141439587")]
+    assert client.get("/api/v1/books/", params={"isbn": "9780441013593"}).json()["total"] == 1
+
+
+def test_wrong_column_count_is_a_row_error(client):
+    report = import_books(client, BOOK_HEADER + "Dune,Herbert\n").json()
+    assert report["errors"] == [{"row": 1, "key": None, "errors": ["expected 4 columns, got 2"]}]
+
+
+def test_ndjson_keys_of_any_json_type_are_reported_as_text(client):
+    body = ndjson({"title": "T", "author": "A", "isbn": 9780441013593, "num_copies_total": "many"}, [1, 2]) + "{not json\n"
+    response = import_books(client, body, headers=NDJSON)
+
+    assert response.status_code == 200
+    errors = response.json()["errors"]
+    assert errors[0]["key"] == "9780441013593"
+    assert errors[1]["errors"] == ["each line must be a JSON object"]
+    assert errors[2]["errors"][0].startswith("invalid JSON")
+
+
+def test_duplicate_isbns_within_the_upload_and_with_the_catalog(client):
+    existing = create_book(client, 1)["isbn"]
+    body = BOOK_HEADER + f"A,X,9781111111111,1\nB,Y,9781111111111,1\nC,Z,{existing},1\n"
+    report = import_books(client, body).json()
+
+    assert report["imported"] == 1
+    assert [(error["row"], error["key"]) for error in report["errors"]] == [(2, "9781111111111"), (3, existing)]
+    assert "more than once in the upload (first at row 1)" in report["errors"][0]["errors"][0]
+    assert report["errors"][1]["errors"] == [f"Book with ISBN {existing} already exists."]
+
+
+def test_duplicate_in_a_later_chunk_is_caught_by_the_catalog_check(client):
+    report = import_books(client, BOOK_HEADER + "D,W,9782222222222,1\nE,V,9782222222222,1\n", chunk_size=1).json()
+    assert report["imported"] == 1
+    assert report["errors"] == [{"row": 2, "key": "9782222222222", "errors": ["Book with ISBN 9782222222222 already exists."]}]
+
+
+def test_invalid_utf8_only_spoils_its_own_row(client):
+    body = ("\ufeff" + BOOK_HEADER).encode() + b"Good,A,9781111111111,1\nBad \xff,A,9781111111112,1\r\n\xc3\x89mile,B,9781111111113,2"
+    report = import_books(client, body).json()
+
+    assert report["imported"] == 2
+    assert report["errors"] == [{"row": 2, "key": None, "errors": ["not valid UTF-8 (byte 5 of the line)"]}]
+    assert client.get("/api/v1/books/", params={"isbn": "9781111111113"}).json()["books"][0]["title"] == "Émile"
+
+
+def test_invalid_utf8_in_the_csv_header_is_rejected(client):
+    response = import_books(client, b"ti\xfftle,author\nx,y\n")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "The CSV header row is not valid UTF-8."
+
+
+def test_unsupported_content_type_is_rejected(client):
+    response = import_books(client, "title\nDune\n", headers={"content-type": "application/json"})
+    assert response.status_code == 415
+
+
+def test_student_import_reports_conflicts_with_existing_and_earlier_rows(client):
+    create_student(client, 1)
+    row = {"name": "N", "department": "CS", "semester": 1}
+    body = ndjson(
+        {**row, "roll_number": "R1", "phone": "9111111111", "email": "a@example.com"},  # roll number taken
+        {**row, "roll_number": "R2", "phone": "9222222222", "email": "b@example.com"},
+        {**row, "roll_number": "R3", "phone": "9222222222", "email": "c@example.com"},  # phone of row 2
+        {**row, "roll_number": 4, "phone": "9333333333"},  # no email
+    )
+    report = client.post("/api/v1/students/import", content=body, headers=NDJSON).json()
+
+    assert report["imported"] == 1
+    assert [(error["row"], error["key"]) for error in report["errors"]] == [(1, "R1"), (3, "R3"), (4, "4")]
+    assert "row 2" in report["errors"][1]["errors"][0]
+
+
+def test_iter_lines_handles_a_bom_and_characters_split_across_chunks():
+    async def chunks():
+        for chunk in [b"\xef", b"\xbb\xbfa\xc3", b"\xa9\nb\r", b"\n", b"c"]:
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(chunks())]
+
+    assert asyncio.run(collect()) == [b"a\xc3\xa9", b"b", b"c"]
@@ -0,0 +1,70 @@
+import pytest
+
+from tests.factories import create_book, create_student, due_in
+
+
+@pytest.fixture
+def loans(client) -> list[dict]:
+    """Student 1 borrowed books 1 and 2, student 2 borrowed book 1 (two copies each)."""
+    books = [create_book(client, number) for number in (1, 2)]
+    students = [create_student(client, number) for number in (1, 2)]
+    result = []
+    for book, student in [(books[0], students[0]), (books[1], students[0]), (books[0], students[1])]:
+        response = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+        assert response.status_code == 201
+        result.append(response.json())
+    return result
+
+
+def bulk_return(client, *items: dict) -> dict:
+    response = client.post("/api/v1/issues/return", json={"items": list(items)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def available(client, book_id: int) -> int:
+    return client.get(f"/api/v1/books/{book_id}").json()["num_copies_available"]
+
+
+def test_items_by_id_or_by_isbn_and_student_are_returned_together(client, executed, loans):
+    isbn = loans[1]["book"]["isbn"]
+    executed.clear()
+    report = bulk_return(client, {"issue_id": loans[0]["id"]}, {"isbn": isbn, "student_id": loans[1]["student_id"]}, {"issue_id": loans[2]["id"]})
+
+    assert (report["returned"], report["failed"]) == (3, 0)
+    assert [result["issue_id"] for result in report["results"]] == [loan["id"] for loan in loans]
+    assert report["results"][1]["isbn"] == isbn
+    assert [available(client, loans[index]["book_id"]) for index in (0, 1)] == [2, 2]
+    # Resolve, mark returned, restock and the live counter, whatever the number of items
+    verbs = [statement.split()[0] for statement in executed if statement.split()[0] in ("SELECT", "UPDATE")]
+    assert verbs[:4] == ["SELECT", "UPDATE", "UPDATE", "UPDATE"]
+
+
+def test_unknown_and_already_returned_items_do_not_stop_the_others(client, loans):
+    assert client.put(f"/api/v1/issues/{loans[0]['id']}/return").status_code == 200
+    report = bulk_return(
+        client,
+        {"issue_id": loans[0]["id"]},
+        {"issue_id": 99},
+        {"isbn": "9999999999999", "student_id": 1},
+        {"issue_id": loans[2]["id"]},
+        {"issue_id": loans[2]["id"]},  # Scanned twice
+    )
+
+    assert [result["status"] for result in report["results"]] == ["already_returned", "not_found", "not_found", "returned", "already_returned"]
+    assert report["results"][2]["detail"] == "Book issue for ISBN 9999999999999 and student ID 1 not found."
+    assert (report["returned"], report["failed"]) == (1, 4)
+    assert available(client, loans[0]["book_id"]) == 2
+
+
+def test_isbn_and_student_prefer_the_active_issue_over_past_ones(client, loans):
+    # Student 1 returns book 1, borrows it again, and drops it in the box
+    assert client.put(f"/api/v1/issues/{loans[0]['id']}/return").status_code == 200
+    again = client.post("/api/v1/issues/", json={"book_id": loans[0]["book_id"], "student_id": loans[0]["student_id"], "expected_return_date": due_in(7)}).json()
+    report = bulk_return(client, {"isbn": loans[0]["book"]["isbn"], "student_id": loans[0]["student_id"]})
+    assert report["results"] == [{"issue_id": again["id"], "isbn": loans[0]["book"]["isbn"], "student_id": loans[0]["student_id"], "status": "returned", "detail": None}]
+
+
+@pytest.mark.parametrize("items", [[], [{"isbn": "9780000000001"}], [{"student_id": 1}]])
+def test_items_must_name_an_issue(client, items):
+    assert client.post("/api/v1/issues/return", json={"items": items}).status_code == 422
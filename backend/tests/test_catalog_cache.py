@@ -0,0 +1,63 @@
+from app.core.cache import LocalInvalidationBus
+from app.schemas.book import BookResponse
+from app.services.catalog_cache import BookCatalogCache, book_cache
+from tests.factories import create_book, create_student, due_in
+
+
+def get_book(client, book_id: int) -> dict:
+    response = client.get(f"/api/v1/books/{book_id}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_repeat_reads_are_served_from_the_cache(client):
+    book = create_book(client, 1)
+    get_book(client, book["id"])
+    hits = book_cache.stats()["hits"]
+
+    assert get_book(client, book["id"]) == get_book(client, book["id"])
+    assert book_cache.stats()["hits"] == hits + 2
+
+
+def test_update_is_visible_on_the_next_read(client):
+    book = create_book(client, 1)
+    get_book(client, book["id"])
+    assert client.put(f"/api/v1/books/{book['id']}", json={"title": "Renamed"}).status_code == 200
+    assert get_book(client, book["id"])["title"] == "Renamed"
+
+
+def test_issue_and_return_change_the_cached_availability(client):
+    book = create_book(client, 1)
+    student = create_student(client, 1)
+    assert get_book(client, book["id"])["num_copies_available"] == 2
+
+    issue = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)}).json()
+    assert get_book(client, book["id"])["num_copies_available"] == 1
+    assert client.put(f"/api/v1/issues/{issue['id']}/return").status_code == 200
+    assert get_book(client, book["id"])["num_copies_available"] == 2
+
+
+def test_deleted_book_is_not_served_from_the_cache(client):
+    book = create_book(client, 1)
+    get_book(client, book["id"])
+    assert client.delete(f"/api/v1/books/{book['id']}").status_code == 204
+    assert client.get(f"/api/v1/books/{book['id']}").status_code == 404
+
+
+def test_invalidation_reaches_the_caches_of_other_workers(client):
+    bus = LocalInvalidationBus()
+    caches = [BookCatalogCache(maxsize=10, ttl_seconds=60, bus=bus) for _ in range(2)]
+    book = BookResponse.model_validate(create_book(client, 1))
+    for cache in caches:
+        cache.put(book)
+
+    caches[0].invalidate(book.id)
+    assert [cache.get(book.id) for cache in caches] == [None, None]
+
+
+def test_a_read_that_raced_an_invalidation_is_not_cached(client):
+    book = BookResponse.model_validate(create_book(client, 1))
+    token = book_cache.read_token()
+    book_cache.invalidate(book.id)  # A writer commits while the reader is querying
+    book_cache.put(book, token)
+    assert book_cache.get(book.id) is None
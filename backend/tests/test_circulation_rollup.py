@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.models.book import Book
+from app.models.circulation import CirculationDaily, RollupWatermark
+from app.services.circulation_rollup import circulation_totals, refresh_circulation_rollup, rolled_through
+from tests.factories import create_book, create_circulation_history, utc
+
+TODAY = datetime.now(timezone.utc).date()
+START = TODAY - timedelta(days=20)
+
+
+@pytest.fixture
+def history(client, run):
+    create_circulation_history(client, run, TODAY)
+
+
+def totals(run, start=START, end=TODAY, group_by=()):
+    return run(lambda db: circulation_totals(db, start, end, group_by=group_by))
+
+
+def day_totals(run, offset: int) -> dict:
+    day = TODAY + timedelta(days=offset)
+    return totals(run, start=day, end=day).get((), {"issues": 0, "returns": 0, "new_books": 0})
+
+
+async def _all(db, query):
+    return (await db.execute(query)).all()
+
+
+def test_totals_are_the_same_before_and_after_the_rollup(run, history):
+    group_bys = [(), ("department",), ("category",), ("department", "category")]
+    before = {group_by: totals(run, group_by=group_by) for group_by in group_bys}
+    assert run(refresh_circulation_rollup) > 0
+    after = {group_by: totals(run, group_by=group_by) for group_by in group_bys}
+
+    assert after == before
+    assert before[()] == {(): {"issues": 4, "returns": 2, "new_books": 3}}
+    assert before[("department",)][("EE",)] == {"issues": 2, "returns": 1, "new_books": 0}
+    assert before[("category",)][("",)] == {"issues": 1, "returns": 1, "new_books": 1}
+
+
+def test_days_are_split_at_utc_midnight(run, history):
+    run(refresh_circulation_rollup)
+
+    # Issued at 00:00:00 and at 23:59:59 of the same day, plus a book added at 00:00:00
+    assert day_totals(run, -9) == {"issues": 2, "returns": 0, "new_books": 1}
+    assert day_totals(run, -10)["issues"] == day_totals(run, -8)["issues"] == 0
+    # Returned a second before midnight: still yesterday, in the rolled-up part
+    assert day_totals(run, -1)["returns"] == 1
+    assert day_totals(run, 0) == {"issues": 1, "returns": 0, "new_books": 0}
+
+
+def test_rollup_stops_at_yesterday_and_today_is_aggregated_live(run, history):
+    assert run(rolled_through) is None
+    run(refresh_circulation_rollup)
+    assert run(rolled_through) == TODAY - timedelta(days=1)
+    rolled_days = {day for day, in run(lambda db: _all(db, select(CirculationDaily.day).distinct()))}
+    assert max(rolled_days) == TODAY - timedelta(days=1)
+
+    # Today's loan is counted without being rolled up, and a second run finds nothing to add
+    assert day_totals(run, 0)["issues"] == 1
+    assert run(refresh_circulation_rollup) == 0
+
+
+def test_rollup_advances_at_most_max_days_per_run(run, history):
+    # The first run starts at the first activity: the books added on day -12
+    assert run(lambda db: refresh_circulation_rollup(db, max_days=5)) == 5
+    assert run(rolled_through) == TODAY - timedelta(days=8)
+    # The split between rolled-up and live days can fall anywhere in the range
+    assert totals(run)[()] == {"issues": 4, "returns": 2, "new_books": 3}
+
+    while run(refresh_circulation_rollup):
+        pass
+    assert run(rolled_through) == TODAY - timedelta(days=1)
+
+
+def test_overdue_is_counted_for_each_day_the_loan_was_out_past_due(run, history):
+    run(refresh_circulation_rollup)
+    rows = run(lambda db: _all(db, select(CirculationDaily.day, CirculationDaily.department, CirculationDaily.overdue)
+                               .filter(CirculationDaily.overdue > 0)))
+    overdue = {}
+    for day, department, count in rows:
+        overdue[day] = overdue.get(day, 0) + count
+
+    # Loan 1: due day -6, returned on day -3, so out past due at the end of days -5 and -4;
+    # loan 2: due day -2 and still out (today is not rolled up). A loan is overdue from the day after its due date.
+    assert overdue == {TODAY - timedelta(days=offset): 1 for offset in (5, 4, 1)}
+    assert {department for _, department, _ in rows} == {"CS"}
+
+
+def test_deleting_a_book_takes_it_out_of_the_rolled_up_new_books(client, run, history):
+    added = [create_book(client, number, category="Fantasy") for number in (10, 11)]
+    added.append(create_book(client, 12, category="Fantasy"))  # Added today, not rolled up
+
+    async def backdate(db):
+        await db.execute(update(Book).filter(Book.id.in_([added[0]["id"], added[1]["id"]])).values(created_at=utc(TODAY - timedelta(days=12))))
+        await db.commit()
+    run(backdate)
+    run(refresh_circulation_rollup)
+    assert day_totals(run, -12)["new_books"] == 4
+
+    for book in (added[0], added[2]):
+        assert client.delete(f"/api/v1/books/{book['id']}").status_code == 204
+    assert day_totals(run, -12)["new_books"] == 3
+    assert day_totals(run, 0)["new_books"] == 0
+    rolled_up = totals(run, group_by=("category",))
+
+    # The same figures as aggregating everything from the raw tables again
+    async def drop_rollup(db):
+        await db.execute(delete(CirculationDaily))
+        await db.execute(delete(RollupWatermark))
+        await db.commit()
+    run(drop_rollup)
+    assert totals(run, group_by=("category",)) == rolled_up
+    assert rolled_up[("Fantasy",)]["new_books"] == 2
+
+
+def test_unknown_group_column_is_rejected(run, history):
+    with pytest.raises(ValueError):
+        totals(run, group_by=("semester",))
@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.services.circulation_rollup import bucket_start, circulation_series, refresh_circulation_rollup
+from tests.factories import create_circulation_history
+
+TODAY = datetime.now(timezone.utc).date()
+START = TODAY - timedelta(days=20)
+
+
+@pytest.fixture
+def history(client, run):
+    create_circulation_history(client, run, TODAY)
+
+
+def series(run, granularity="day", group_by=None, start=START, end=TODAY):
+    points = run(lambda db: circulation_series(db, start, end, granularity=granularity, group_by=group_by)).points
+    return [(point.bucket, point.group, point.issues, point.returns) for point in points]
+
+
+def test_series_is_the_same_before_and_after_the_rollup(run, history):
+    keys = [(granularity, group_by) for granularity in ["day", "week", "month"] for group_by in [None, "department", "category"]]
+    before = {key: series(run, *key) for key in keys}
+    run(refresh_circulation_rollup)
+    after = {key: series(run, *key) for key in keys}
+
+    assert after == before
+
+
+def test_daily_points(run, history):
+    run(refresh_circulation_rollup)
+    by_day = {bucket: (issues, returns) for bucket, _, issues, returns in series(run)}
+
+    assert by_day == {
+        TODAY - timedelta(days=9): (2, 0),
+        TODAY - timedelta(days=4): (1, 0),
+        TODAY - timedelta(days=3): (0, 1),
+        TODAY - timedelta(days=1): (0, 1),
+        TODAY: (1, 0),
+    }
+
+
+def test_weekly_buckets_merge_rolled_up_and_live_days(run, history):
+    run(refresh_circulation_rollup)
+    points = series(run, "week", group_by="department")
+
+    assert {bucket for bucket, _, _, _ in points} <= {bucket_start(TODAY - timedelta(days=offset), "week") for offset in range(21)}
+    assert sum(issues for _, _, issues, _ in points) == 4
+    assert sum(issues for _, group, issues, _ in points if group == "EE") == 2
+    # The current week holds today's live loan plus whichever rolled-up issue days fall in it
+    current_week = bucket_start(TODAY, "week")
+    expected = sum(1 for offset in (-9, -9, -4, 0) if bucket_start(TODAY + timedelta(days=offset), "week") == current_week)
+    assert sum(issues for bucket, _, issues, _ in points if bucket == current_week) == expected
+
+
+def test_edge_buckets_only_cover_days_inside_the_range(run, history):
+    run(refresh_circulation_rollup)
+    # Starting the day after the two midnight-straddling issues leaves them out of their week's bucket
+    start = TODAY - timedelta(days=8)
+    points = series(run, "week", start=start)
+    assert sum(issues for _, _, issues, _ in points) == 2
+    assert all(bucket >= bucket_start(start, "week") for bucket, _, _, _ in points)
+
+
+@pytest.mark.parametrize("day, granularity, expected", [
+    (date(2024, 3, 17), "week", date(2024, 3, 11)),  # Sunday -> Monday before
+    (date(2024, 3, 18), "week", date(2024, 3, 18)),  # Monday
+    (date(2023, 1, 1), "week", date(2022, 12, 26)),  # Across the year boundary
+    (date(2024, 2, 29), "month", date(2024, 2, 1)),
+    (date(2024, 3, 1), "month", date(2024, 3, 1)),
+    (date(2024, 3, 17), "day", date(2024, 3, 17)),
+])
+def test_bucket_start(day, granularity, expected):
+    assert bucket_start(day, granularity) == expected
+
+
+def test_circulation_endpoint(client, history):
+    response = client.get("/api/v1/stats/circulation", params={"granularity": "month", "end": str(TODAY)})
+    assert response.status_code == 200
+    assert sum(point["issues"] for point in response.json()["points"]) == 4
+
+
+@pytest.mark.parametrize("params", [
+    {"start": str(TODAY), "end": str(TODAY - timedelta(days=1))},
+    {"start": str(TODAY - timedelta(days=4000)), "end": str(TODAY)},
+])
+def test_circulation_endpoint_validates_the_range(client, params):
+    assert client.get("/api/v1/stats/circulation", params=params).status_code == 400
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.core.config import settings
+from app.crud import counters
+from app.models.counter import LibraryCounter
+from app.models.student import Student
+from tests.factories import create_book, create_student, due_in
+
+
+def totals(run) -> tuple[dict | None, dict]:
+    """(what the counters say, what COUNT(*) says)."""
+    return run(counters.read_totals), run(counters.count_totals)
+
+
+def issue(client, book_id: int, student_id: int):
+    return client.post("/api/v1/issues/", json={"book_id": book_id, "student_id": student_id, "expected_return_date": due_in(7)})
+
+
+def test_counters_start_at_the_counts_and_are_read_only_once_initialized(client, run):
+    create_book(client, 1, num_copies_total=3)
+    create_student(client, 1)
+    assert run(counters.read_totals) is None
+    # Until then the statistics are counted
+    assert client.get("/api/v1/stats/collection").json()["total_books"] == 3
+
+    assert run(counters.reconcile_counters) == {}
+    assert run(counters.read_totals) == {"books": 1, "copies_total": 3, "students": 1, "issued": 0}
+
+
+def test_every_write_path_keeps_the_counters_equal_to_the_counts(client, run):
+    run(counters.reconcile_counters)
+    books = [create_book(client, number) for number in range(3)]
+    students = [create_student(client, number) for number in (1, 2)]
+    import_body = "title,author,isbn,num_copies_total\nImported,Author,9781111111111,4\n"
+    assert client.post("/api/v1/books/import", content=import_body, headers={"content-type": "text/csv"}).json()["imported"] == 1
+    student = {"name": "Imported", "roll_number": "R9", "department": "EE", "semester": 1, "phone": "9999999999", "email": "imported@example.com"}
+    assert client.post("/api/v1/students/import", content=json.dumps(student) + "\n", headers={"content-type": "application/x-ndjson"}).json()["imported"] == 1
+    assert client.put(f"/api/v1/books/{books[0]['id']}", json={"num_copies_total": 5}).status_code == 200
+
+    loan = issue(client, books[0]["id"], students[0]["id"]).json()
+    batch = client.post("/api/v1/issues/batch", json={"student_id": students[1]["id"], "items": [{"book_id": books[0]["id"]}, {"book_id": books[1]["id"]}]})
+    assert batch.status_code == 201
+    # A refused checkout rolls its counter update back with it
+    refused = client.post("/api/v1/issues/batch", json={"student_id": students[0]["id"], "items": [{"book_id": books[2]["id"]}, {"book_id": 99}]})
+    assert refused.status_code == 409
+    stored, actual = totals(run)
+    assert stored == actual == {"books": 4, "copies_total": 13, "students": 3, "issued": 3}
+
+    assert client.put(f"/api/v1/issues/{loan['id']}/return").status_code == 200
+    returned = client.post("/api/v1/issues/return", json={"items": [{"issue_id": issue["id"]} for issue in batch.json()["issues"]]})
+    assert returned.json()["returned"] == 2
+    assert client.delete(f"/api/v1/books/{books[2]['id']}").status_code == 204
+    stored, actual = totals(run)
+    assert stored == actual == {"books": 3, "copies_total": 11, "students": 3, "issued": 0}
+
+
+def test_statistics_are_read_from_the_counters(client, run, executed):
+    create_book(client, 1, num_copies_total=3)
+    run(counters.reconcile_counters)
+    executed.clear()
+    statistics = client.get("/api/v1/stats/collection").json()
+
+    assert (statistics["total_books"], statistics["total_students"], statistics["currently_issued"]) == (3, 0, 0)
+    assert any("FROM library_counters" in statement for statement in executed)
+    assert not any("FROM books" in statement or "FROM book_issues" in statement for statement in executed)
+
+
+def test_reconcile_corrects_drift_from_changes_made_outside_the_application(client, run):
+    create_student(client, 1)
+    create_student(client, 2)
+    run(counters.reconcile_counters)
+
+    async def delete_behind_the_counters(db):
+        await db.execute(delete(Student).filter(Student.roll_number == "R1"))
+        await db.execute(update(LibraryCounter).filter(LibraryCounter.name == "issued", LibraryCounter.shard == 3).values(value=-2))
+        await db.commit()
+
+    run(delete_behind_the_counters)
+    assert run(counters.reconcile_counters) == {"students": 1, "issued": -2}
+    stored, actual = totals(run)
+    assert stored == actual
+    assert run(counters.reconcile_counters) == {}
+
+
+def test_reconcile_follows_a_change_of_shard_count(client, run, monkeypatch):
+    create_book(client, 1)
+    run(counters.reconcile_counters)
+    monkeypatch.setattr(settings, "LIVE_COUNTER_SHARDS", 2)
+    assert run(counters.reconcile_counters) == {}
+    create_book(client, 2)
+
+    async def shards(db):
+        return set((await db.execute(select(LibraryCounter.shard).distinct())).scalars())
+
+    assert run(shards) == {0, 1}
+    stored, actual = totals(run)
+    assert stored == actual == {"books": 2, "copies_total": 4, "students": 0, "issued": 0}
+
+    monkeypatch.setattr(settings, "LIVE_COUNTER_SHARDS", 4)
+    assert run(counters.reconcile_counters) == {}
+    assert run(shards) == {0, 1, 2, 3}
+    assert run(counters.read_totals) == actual
+
+
+def test_unknown_counter_is_an_error(run):
+    with pytest.raises(ValueError):
+        run(lambda db: counters.bump(db, loans=1))
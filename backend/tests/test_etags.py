@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.models.book import Book
+from app.models.student import Student
+from tests.factories import create_book, create_student, due_in
+
+
+def written_a_minute_ago(run, model, row_id: int) -> None:
+    """SQLite's CURRENT_TIMESTAMP has whole seconds: move updated_at back so the next write changes it."""
+    async def backdate(db):
+        await db.execute(update(model).filter(model.id == row_id).values(updated_at=datetime.now(timezone.utc) - timedelta(minutes=1)))
+        await db.commit()
+    run(backdate)
+
+
+def conditional_get(client, path: str, etag: str, **params):
+    return client.get(path, params=params, headers={"If-None-Match": etag})
+
+
+@pytest.mark.parametrize("kind", ["books", "students"])
+def test_unchanged_resource_is_not_modified(client, kind):
+    created = (create_book if kind == "books" else create_student)(client, 1)
+    path = f"/api/v1/{kind}/{created['id']}"
+    first = client.get(path)
+    etag = first.headers["ETag"]
+
+    response = conditional_get(client, path, etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    # Weak and listed validators match as well
+    assert conditional_get(client, path, f'"other", W/{etag}').status_code == 304
+    assert conditional_get(client, path, '"other"').status_code == 200
+
+
+def test_book_update_changes_its_etag(client, run):
+    book = create_book(client, 1)
+    written_a_minute_ago(run, Book, book["id"])
+    etag = client.get(f"/api/v1/books/{book['id']}").headers["ETag"]
+    assert client.put(f"/api/v1/books/{book['id']}", json={"title": "Renamed"}).status_code == 200
+
+    response = conditional_get(client, f"/api/v1/books/{book['id']}", etag)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Renamed"
+
+
+def test_issue_changes_the_books_etag(client, run):
+    book, student = create_book(client, 1), create_student(client, 1)
+    written_a_minute_ago(run, Book, book["id"])
+    etag = client.get(f"/api/v1/books/{book['id']}").headers["ETag"]
+    response = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+    assert response.status_code == 201
+
+    response = conditional_get(client, f"/api/v1/books/{book['id']}", etag)
+    assert response.status_code == 200
+    assert response.json()["num_copies_available"] == 1
+
+
+def test_student_update_changes_its_etag(client, run):
+    student = create_student(client, 1)
+    written_a_minute_ago(run, Student, student["id"])
+    path = f"/api/v1/students/{student['id']}"
+    etag = client.get(path).headers["ETag"]
+    assert client.put(f"{path}/", json={"semester": 4}).status_code == 200
+
+    response = conditional_get(client, path, etag)
+    assert response.status_code == 200
+    assert response.json()["semester"] == 4
+
+
+def test_list_etag_follows_the_page(client):
+    for number in range(3):
+        create_book(client, number)
+    etag = client.get("/api/v1/books/", params={"limit": 2}).headers["ETag"]
+    assert conditional_get(client, "/api/v1/books/", etag, limit=2).status_code == 304
+    # Another page, and the same page after a new book changed the total, are new representations
+    assert conditional_get(client, "/api/v1/books/", etag, limit=2, page=2).status_code == 200
+    create_book(client, 3)
+    assert conditional_get(client, "/api/v1/books/", etag, limit=2).status_code == 200
+
+
+def test_missing_resource_is_404_even_with_a_validator(client):
+    assert conditional_get(client, "/api/v1/books/99", '"anything"').status_code == 404
@@ -0,0 +1,76 @@
+from sqlalchemy.dialects import postgresql
+
+from app.crud import crud_book
+from tests.factories import create_book
+
+
+def facets(client, names: str, **params) -> dict:
+    response = client.get("/api/v1/books/", params={"facets": names, "limit": 1, **params})
+    assert response.status_code == 200, response.text
+    return response.json()["facets"]
+
+
+def catalog(client):
+    # Fantasy: 2 books, one of them out of stock; History: 1; uncategorized: 1
+    create_book(client, 1, category="Fantasy", author="Tolkien")
+    create_book(client, 2, category="Fantasy", author="Tolkien", num_copies_available=0)
+    create_book(client, 3, category="History", author="Beard")
+    create_book(client, 4, category=None, author="Beard")
+
+
+def test_counts_cover_every_match_not_just_the_page(client):
+    catalog(client)
+    result = facets(client, "category,author,available")
+
+    assert result["category"] == [
+        {"value": "Fantasy", "count": 2, "available": 1},
+        {"value": None, "count": 1, "available": 1},
+        {"value": "History", "count": 1, "available": 1},
+    ]
+    assert result["author"] == [{"value": "Beard", "count": 2, "available": 2}, {"value": "Tolkien", "count": 2, "available": 1}]
+    assert result["available"] == [{"value": "true", "count": 3, "available": 3}, {"value": "false", "count": 1, "available": 0}]
+
+
+def test_counts_follow_the_filters(client):
+    catalog(client)
+    result = facets(client, "category,available", author="tolk")
+    assert result["category"] == [{"value": "Fantasy", "count": 2, "available": 1}]
+    assert result["available"] == [{"value": "true", "count": 1, "available": 1}, {"value": "false", "count": 1, "available": 0}]
+
+
+def test_only_the_largest_buckets_are_returned(client, monkeypatch):
+    monkeypatch.setattr(crud_book, "FACET_BUCKET_LIMIT", 2)
+    for number, author in enumerate(["A", "B", "B", "C", "C", "C"]):
+        create_book(client, number, author=author)
+    assert [bucket["value"] for bucket in facets(client, "author")["author"]] == ["C", "B"]
+
+
+def test_no_facets_unless_asked(client):
+    catalog(client)
+    assert client.get("/api/v1/books/").json()["facets"] is None
+
+
+def test_unknown_facet_is_rejected(client):
+    response = client.get("/api/v1/books/", params={"facets": "category,publisher"})
+    assert response.status_code == 400
+    assert "publisher" in response.json()["detail"]
+
+
+def test_postgres_query_uses_grouping_sets(run, monkeypatch):
+    # Compile the PostgreSQL statement without a server: capture it instead of executing it
+    captured = []
+
+    class Result:
+        def all(self):
+            return []
+
+    async def compile_only(db):
+        async def execute(query):
+            captured.append(str(query.compile(dialect=postgresql.dialect())))
+            return Result()
+        monkeypatch.setattr(db, "execute", execute)
+        monkeypatch.setattr(crud_book, "is_postgres", lambda db: True)
+        return await crud_book.get_book_facets(db, ["category", "author", "available"])
+
+    assert run(compile_only) == {"category": [], "author": [], "available": []}
+    assert "GROUPING SETS((books.category), (books.author), ())" in captured[0]
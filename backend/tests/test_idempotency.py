@@ -0,0 +1,140 @@
+import pytest
+from fastapi import HTTPException
+
+from app import crud
+from app.services import idempotency
+from tests.factories import create_book, create_student, due_in
+
+
+@pytest.fixture(params=["memory", "database"])
+def store(request, client, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.create_idempotency_store(request.param))
+    return request.param
+
+
+@pytest.fixture
+def loan(client):
+    book = create_book(client, 1, num_copies_total=2)
+    student = create_student(client, 1)
+    return {"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)}
+
+
+def issue_count(client) -> int:
+    return client.get("/api/v1/issues/").json()["total"]
+
+
+def available(client, book_id: int) -> int:
+    return client.get(f"/api/v1/books/{book_id}").json()["num_copies_available"]
+
+
+def test_retry_with_the_same_key_replays_the_first_response(client, store, loan):
+    headers = {"Idempotency-Key": "issue-1"}
+    first = client.post("/api/v1/issues/", json=loan, headers=headers)
+    retry = client.post("/api/v1/issues/", json=loan, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert issue_count(client) == 1
+    assert available(client, loan["book_id"]) == 1
+
+
+def test_reusing_a_key_with_another_body_is_rejected(client, store, loan):
+    headers = {"Idempotency-Key": "issue-1"}
+    assert client.post("/api/v1/issues/", json=loan, headers=headers).status_code == 201
+    other = client.post("/api/v1/issues/", json={**loan, "expected_return_date": due_in(14)}, headers=headers)
+
+    assert other.status_code == 422
+    assert "issue-1" in other.json()["detail"]
+    assert issue_count(client) == 1
+
+
+def test_keys_are_scoped_to_method_and_path(client, store, loan):
+    headers = {"Idempotency-Key": "same"}
+    issue = client.post("/api/v1/issues/", json=loan, headers=headers).json()
+    returned = client.put(f"/api/v1/issues/{issue['id']}/return", headers=headers)
+
+    assert returned.status_code == 200
+    assert "Idempotent-Replayed" not in returned.headers
+    assert returned.json()["is_returned"] is True
+
+
+def test_return_is_replayed_without_returning_twice(client, store, loan):
+    issue = client.post("/api/v1/issues/", json=loan).json()
+    headers = {"Idempotency-Key": "return-1"}
+    first = client.put(f"/api/v1/issues/{issue['id']}/return", headers=headers)
+    retry = client.put(f"/api/v1/issues/{issue['id']}/return", headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert available(client, loan["book_id"]) == 2
+
+
+def test_refusals_are_stored_and_replayed(client, store, loan):
+    headers = {"Idempotency-Key": "missing"}
+    first = client.put("/api/v1/issues/999/return", headers=headers)
+    retry = client.put("/api/v1/issues/999/return", headers=headers)
+
+    assert first.status_code == retry.status_code == 404
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+
+def test_refused_mutation_leaves_no_partial_writes(client, store, loan):
+    client.post("/api/v1/issues/", json=loan)
+    # The student already has this book, so the batch is refused as a whole
+    batch = {"student_id": loan["student_id"], "items": [{"book_id": create_book(client, 2)["id"]}, {"book_id": loan["book_id"]}]}
+    response = client.post("/api/v1/issues/batch", json=batch, headers={"Idempotency-Key": "batch-1"})
+
+    assert 400 <= response.status_code < 500
+    assert issue_count(client) == 1
+    assert available(client, 2) == 2
+
+
+def test_server_errors_are_not_stored(client, store, loan, monkeypatch):
+    create_book_issue = crud.book_issue.create_book_issue
+    calls = []
+
+    async def fail_once(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise HTTPException(status_code=503, detail="Try again")
+        return await create_book_issue(**kwargs)
+
+    monkeypatch.setattr(crud.book_issue, "create_book_issue", fail_once)
+    headers = {"Idempotency-Key": "flaky"}
+    assert client.post("/api/v1/issues/", json=loan, headers=headers).status_code == 503
+    retry = client.post("/api/v1/issues/", json=loan, headers=headers)
+
+    assert retry.status_code == 201
+    assert "Idempotent-Replayed" not in retry.headers
+    assert len(calls) == 2
+    assert issue_count(client) == 1
+
+
+def test_batch_checkout_is_replayed(client, store, loan):
+    batch = {"student_id": loan["student_id"], "items": [{"book_id": loan["book_id"]}]}
+    headers = {"Idempotency-Key": "batch-1"}
+    first = client.post("/api/v1/issues/batch", json=batch, headers=headers)
+    retry = client.post("/api/v1/issues/batch", json=batch, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert issue_count(client) == 1
+
+
+def test_database_store_replays_across_workers(client, loan, monkeypatch):
+    # Two stores stand in for two workers sharing the database
+    headers = {"Idempotency-Key": "shared"}
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.create_idempotency_store("database"))
+    first = client.post("/api/v1/issues/", json=loan, headers=headers)
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.create_idempotency_store("database"))
+    retry = client.post("/api/v1/issues/", json=loan, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert issue_count(client) == 1
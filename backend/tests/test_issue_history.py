@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.factories import create_circulation_history
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def day(offset: int) -> str:
+    return str(TODAY + timedelta(days=offset))
+
+
+@pytest.fixture
+def history(client, run):
+    # Issue IDs 1-4 in the order create_circulation_history lists them; newest first is 4, 3, 2, 1
+    create_circulation_history(client, run, TODAY)
+
+
+def history_page(client, **params) -> dict:
+    response = client.get("/api/v1/issues/", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def issue_ids(client, **params) -> list[int]:
+    return [item["id"] for item in history_page(client, **params)["items"]]
+
+
+def test_newest_first_with_the_book_and_student_columns(client, history):
+    page = history_page(client)
+
+    assert [item["id"] for item in page["items"]] == [4, 3, 2, 1]
+    assert (page["total"], page["pages"], page["next_cursor"]) == (4, 1, None)
+    latest = page["items"][0]
+    assert (latest["book_title"], latest["book_isbn"]) == ("Book 0", "9780000000000")
+    assert (latest["student_name"], latest["student_roll_number"], latest["student_department"]) == ("Student 2", "R2", "EE")
+
+
+@pytest.mark.parametrize("params, expected", [
+    ({"book_id": 1}, [4, 1]),
+    ({"student_id": 2}, [4, 3]),
+    ({"department": "ee"}, [4, 3]),
+    ({"is_returned": True}, [3, 1]),
+    ({"is_returned": False}, [4, 2]),
+    ({"overdue": True}, [2]),
+    ({"overdue": False}, [4, 3, 1]),
+    ({"department": "CS", "is_returned": False}, [2]),
+])
+def test_filters(client, history, params, expected):
+    assert issue_ids(client, **params) == expected
+
+
+def test_date_ranges_are_inclusive_whole_days(client, history):
+    # Both loans of day -9, issued at 00:00:00 and at 23:59:59
+    assert issue_ids(client, issued_from=day(-9), issued_to=day(-9)) == [2, 1]
+    assert issue_ids(client, issued_to=day(-10)) == []
+    assert issue_ids(client, issued_from=day(-4)) == [4, 3]
+    assert issue_ids(client, due_from=day(-2), due_to=day(3)) == [3, 2]
+
+
+def test_cursor_and_page_reach_the_same_rows(client, history):
+    first = history_page(client, limit=3)
+    assert [item["id"] for item in first["items"]] == [4, 3, 2]
+    assert (first["total"], first["pages"]) == (4, 2)
+
+    second = history_page(client, limit=3, after=first["next_cursor"])
+    assert [item["id"] for item in second["items"]] == [1]
+    assert (second["total"], second["next_cursor"]) == (None, None)
+    assert issue_ids(client, limit=3, page=2) == [1]
+
+
+def test_cursor_keeps_the_filters(client, history):
+    first = history_page(client, limit=1, is_returned=False)
+    assert [item["id"] for item in first["items"]] == [4]
+    assert issue_ids(client, limit=1, is_returned=False, after=first["next_cursor"]) == [2]
+
+
+def test_invalid_total_mode_is_rejected(client):
+    assert client.get("/api/v1/issues/", params={"total": "all"}).status_code == 422
@@ -0,0 +1,71 @@
+import pytest
+
+from tests.factories import create_book, create_student, due_in
+
+
+def issue(client, book_id: int, student_id: int, **fields):
+    return client.post("/api/v1/issues/", json={"book_id": book_id, "student_id": student_id, "expected_return_date": due_in(7), **fields})
+
+
+def available(client, book_id: int) -> int:
+    return client.get(f"/api/v1/books/{book_id}").json()["num_copies_available"]
+
+
+def test_issue_takes_a_copy_and_returns_the_loan_with_its_book_and_student(client):
+    book, student = create_book(client, 1), create_student(client, 1)
+    response = issue(client, book["id"], student["id"])
+
+    assert response.status_code == 201
+    loan = response.json()
+    assert (loan["book"]["id"], loan["student"]["id"], loan["is_returned"]) == (book["id"], student["id"], False)
+    assert loan["book"]["num_copies_available"] == 1
+    assert loan["expected_return_date"] == due_in(7)
+    assert available(client, book["id"]) == 1
+
+
+def test_happy_path_statements(client, executed):
+    book, student = create_book(client, 1), create_student(client, 1)
+    executed.clear()
+    assert issue(client, book["id"], student["id"]).status_code == 201
+
+    # Student lookup, conditional decrement, insert, plus the live counter
+    verbs = [statement.split()[0] for statement in executed if not statement.startswith(("BEGIN", "COMMIT", "ROLLBACK"))]
+    assert verbs == ["SELECT", "UPDATE", "INSERT", "UPDATE"]
+
+
+@pytest.mark.parametrize("book_id, student_id, status, detail", [
+    (99, 1, 404, "Book with ID 99 not found."),
+    (1, 99, 404, "Student with ID 99 not found."),
+])
+def test_unknown_book_or_student(client, book_id, student_id, status, detail):
+    create_book(client, 1)
+    create_student(client, 1)
+    response = issue(client, book_id, student_id)
+    assert (response.status_code, response.json()["detail"]) == (status, detail)
+
+
+def test_last_copy_then_no_copies(client):
+    book = create_book(client, 1, num_copies_total=1)
+    students = [create_student(client, number) for number in (1, 2)]
+    assert issue(client, book["id"], students[0]["id"]).status_code == 201
+
+    response = issue(client, book["id"], students[1]["id"])
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Book 'Book 1' (ID: {book['id']}) has no available copies."
+    assert available(client, book["id"]) == 0
+
+
+def test_a_student_cannot_hold_two_copies_of_a_book(client):
+    book, student = create_book(client, 1), create_student(client, 1)
+    assert issue(client, book["id"], student["id"]).status_code == 201
+
+    assert issue(client, book["id"], student["id"]).status_code == 409
+    assert available(client, book["id"]) == 1  # The refused issue did not take a copy
+
+
+def test_a_returned_book_can_be_issued_again(client):
+    book, student = create_book(client, 1), create_student(client, 1)
+    loan = issue(client, book["id"], student["id"]).json()
+    assert client.put(f"/api/v1/issues/{loan['id']}/return").status_code == 200
+    assert issue(client, book["id"], student["id"]).status_code == 201
+
@@ -0,0 +1,46 @@
+import pytest
+
+from tests.factories import create_book, create_student
+
+# (path, response key and table name, factory)
+LISTINGS = [("/api/v1/books/", "books", create_book), ("/api/v1/students/", "students", create_student)]
+
+
+@pytest.mark.parametrize("path, key, create", LISTINGS)
+@pytest.mark.parametrize("total, expected", [("exact", 5), ("estimate", 5), ("none", None)])
+def test_total_modes(client, path, key, create, total, expected):
+    for number in range(5):
+        create(client, number)
+    body = client.get(path, params={"limit": 2, "total": total}).json()
+
+    assert len(body[key]) == 2
+    assert body["total"] == expected
+
+
+@pytest.mark.parametrize("path, key, create", LISTINGS)
+def test_exact_total_and_page_come_from_one_query(client, executed, path, key, create):
+    for number in range(5):
+        create(client, number)
+    executed.clear()
+    body = client.get(path, params={"limit": 2, "page": 2}).json()
+
+    assert (len(body[key]), body["total"]) == (2, 5)
+    assert len([statement for statement in executed if f"FROM {key}" in statement]) == 1
+
+
+def test_exact_total_of_an_empty_page_past_the_end(client):
+    for number in range(3):
+        create_book(client, number)
+    body = client.get("/api/v1/books/", params={"limit": 2, "page": 5}).json()
+    assert (body["books"], body["total"]) == ([], 3)
+
+
+def test_total_counts_only_the_filtered_rows(client):
+    for number in range(4):
+        create_book(client, number, category="Fantasy" if number % 2 else "History")
+    assert client.get("/api/v1/books/", params={"category": "fantasy", "limit": 1}).json()["total"] == 2
+    assert client.get("/api/v1/books/", params={"category": "poetry"}).json()["total"] == 0
+
+
+def test_unknown_total_mode_is_rejected(client):
+    assert client.get("/api/v1/books/", params={"total": "approximate"}).status_code == 422
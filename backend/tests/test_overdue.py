@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, update
+
+from app.crud import crud_book_issue
+from app.models.book_issue import BookIssue
+from app.services.library_analytics_service import LibraryAnalyticsService
+from tests.factories import create_book, create_student, due_in, utc
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+@pytest.fixture
+def loans(client, run) -> dict[str, int]:
+    """One loan per due day (relative to today), backdated after the fact; "returned" was due 3 days ago but came back."""
+    due_days = {"late_5": -5, "late_1": -1, "today": 0, "in_5": 5, "in_6": 6, "returned": -3}
+    student = create_student(client, 1)
+    issue_ids = {}
+    for number, name in enumerate(due_days):
+        book = create_book(client, number)
+        response = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+        assert response.status_code == 201, response.text
+        issue_ids[name] = response.json()["id"]
+    assert client.put(f"/api/v1/issues/{issue_ids['returned']}/return").status_code == 200
+
+    async def backdate(db):
+        for name, offset in due_days.items():
+            due = utc(TODAY + timedelta(days=offset), 0)
+            await db.execute(update(BookIssue).filter(BookIssue.id == issue_ids[name]).values(expected_return_date=due))
+        await db.commit()
+
+    run(backdate)
+    return issue_ids
+
+
+def test_overdue_is_active_and_due_before_today_oldest_first(run, loans):
+    overdue = run(crud_book_issue.get_overdue_book_issues)
+    assert [issue.id for issue in overdue] == [loans["late_5"], loans["late_1"]]
+    assert all(issue.book and issue.student for issue in overdue)  # The reminder job reads both
+
+
+def test_due_soon_runs_from_today_through_the_last_day_of_the_window(run, loans):
+    due_soon = run(crud_book_issue.get_due_soon_book_issues)
+    assert [issue.id for issue in due_soon] == [loans["today"], loans["in_5"]]
+    assert [issue.id for issue in run(lambda db: crud_book_issue.get_due_soon_book_issues(db, days_window=6))][-1] == loans["in_6"]
+
+
+def test_overdue_count(run, loans):
+    assert run(LibraryAnalyticsService().get_overdue_books_count) == 2
+
+
+def test_overdue_count_is_answered_from_the_partial_index(engine, run, loans):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        run(LibraryAnalyticsService().get_overdue_books_count)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    [(statement, parameters)] = [(statement, parameters) for statement, parameters in statements if statement.startswith("SELECT")]
+
+    async def explain(db):
+        connection = await db.connection()
+        result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return " ".join(row[-1] for row in result)
+
+    plan = run(explain)
+    assert "ix_book_issues_active_expected_return" in plan
+    assert "SCAN book_issues" not in plan
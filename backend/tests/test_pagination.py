@@ -0,0 +1,107 @@
+import pytest
+
+from app.crud.pagination import encode_cursor
+from tests.factories import create_book, create_student, due_in
+
+
+def walk(client, path: str, key: str, **params) -> list[list[dict]]:
+    """Follow next_cursor from the first page to the last, returning every page."""
+    pages, after = [], None
+    while True:
+        response = client.get(path, params={**params, **({"after": after} if after else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append(body[key])
+        after = body["next_cursor"]
+        if after is None:
+            return pages
+
+
+@pytest.mark.parametrize("sort_by", ["id", "title", "author", "created_at"])
+def test_book_cursor_walk_visits_every_book_once_in_order(client, sort_by):
+    # Repeated authors make the tie-break on id part of the order
+    for number in range(7):
+        create_book(client, number, title=f"Title {6 - number}", author=f"Author {number % 2}")
+    pages = walk(client, "/api/v1/books/", "books", limit=3, sort_by=sort_by)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    books = [book for page in pages for book in page]
+    assert sorted(book["id"] for book in books) == list(range(1, 8))
+    keys = [(book[sort_by], book["id"]) for book in books]
+    assert keys == sorted(keys)
+
+
+def test_book_cursor_is_none_when_the_page_is_short(client):
+    create_book(client, 1)
+    body = client.get("/api/v1/books/", params={"limit": 5}).json()
+    assert body["next_cursor"] is None
+
+
+def test_book_cursor_matches_offset_pages(client):
+    for number in range(6):
+        create_book(client, number)
+    first = client.get("/api/v1/books/", params={"limit": 2, "sort_by": "title"}).json()
+    by_cursor = client.get("/api/v1/books/", params={"limit": 2, "sort_by": "title", "after": first["next_cursor"]}).json()
+    by_offset = client.get("/api/v1/books/", params={"limit": 2, "sort_by": "title", "page": 2}).json()
+    assert by_cursor["books"] == by_offset["books"]
+
+
+def test_book_cursor_respects_filters(client):
+    for number in range(5):
+        create_book(client, number, category="Fantasy" if number % 2 else "History")
+    pages = walk(client, "/api/v1/books/", "books", limit=1, category="fantasy")
+    assert [book["id"] for page in pages for book in page] == [2, 4]
+
+
+def test_cursor_from_another_sort_order_is_rejected(client):
+    create_book(client, 1)
+    response = client.get("/api/v1/books/", params={"sort_by": "title", "after": encode_cursor("id", 1, 1)})
+    assert response.status_code == 400
+    assert "sort_by='id'" in response.json()["detail"]
+
+
+def test_garbage_cursor_is_rejected(client):
+    response = client.get("/api/v1/students/", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("sort_by", ["id", "name", "roll_number", "created_at"])
+def test_student_cursor_walk(client, sort_by):
+    for number in range(5):
+        create_student(client, number, name=f"Name {number % 2}")
+    pages = walk(client, "/api/v1/students/", "students", limit=2, sort_by=sort_by)
+
+    students = [student for page in pages for student in page]
+    assert sorted(student["id"] for student in students) == list(range(1, 6))
+    keys = [(student[sort_by], student["id"]) for student in students]
+    assert keys == sorted(keys)
+
+
+def test_issue_history_cursor_walks_newest_first(client):
+    student = create_student(client, 1)
+    for number in range(5):
+        book = create_book(client, number)
+        response = client.post("/api/v1/issues/", json={
+            "book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)
+        })
+        assert response.status_code == 201, response.text
+    pages = walk(client, "/api/v1/issues/", "items", limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [issue["id"] for page in pages for issue in page] == [5, 4, 3, 2, 1]
+
+
+@pytest.mark.parametrize("path, key", [("/api/v1/books/", "books"), ("/api/v1/students/", "students"), ("/api/v1/issues/", "items")])
+def test_cursor_pages_skip_the_total_unless_asked(client, path, key):
+    student = create_student(client, 1)
+    for number in range(3):
+        book = create_book(client, number)
+        client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+    create_student(client, 2)
+    create_student(client, 3)
+
+    first = client.get(path, params={"limit": 2}).json()
+    assert first["total"] == 3
+    after = first["next_cursor"]
+    assert client.get(path, params={"limit": 2, "after": after}).json()["total"] is None
+    assert client.get(path, params={"limit": 2, "after": after, "total": "exact"}).json()["total"] == 3
@@ -0,0 +1,73 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.crud import crud_book_issue
+from tests.factories import create_book, create_student, due_in
+
+
+@pytest.fixture
+def loan(client) -> dict:
+    book, student = create_book(client, 1), create_student(client, 1)
+    response = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+    assert response.status_code == 201
+    return response.json()
+
+
+def give_back(client, issue_id: int):
+    return client.put(f"/api/v1/issues/{issue_id}/return")
+
+
+def test_return_restocks_the_book_and_returns_the_loan(client, loan):
+    response = give_back(client, loan["id"])
+
+    assert response.status_code == 200
+    returned = response.json()
+    assert returned["is_returned"] is True
+    assert returned["actual_return_date"] is not None
+    assert (returned["book"]["num_copies_available"], returned["student"]["id"]) == (2, loan["student_id"])
+    assert client.get(f"/api/v1/books/{loan['book_id']}").json()["num_copies_available"] == 2
+
+
+def test_second_return_and_unknown_issue_are_refused(client, loan):
+    assert give_back(client, loan["id"]).status_code == 200
+
+    response = give_back(client, loan["id"])
+    assert (response.status_code, response.json()["detail"]) == (400, f"Book issue ID {loan['id']} has already been returned.")
+    assert give_back(client, 99).status_code == 404
+    assert client.get(f"/api/v1/books/{loan['book_id']}").json()["num_copies_available"] == 2
+
+
+def test_restock_never_exceeds_the_total(client, loan):
+    # The book lost a copy while it was out: the returned copy fills it up to the new total only
+    assert client.put(f"/api/v1/books/{loan['book_id']}", json={"num_copies_total": 1, "num_copies_available": 1}).status_code == 200
+    assert give_back(client, loan["id"]).json()["book"]["num_copies_available"] == 1
+
+
+def test_postgres_return_is_one_statement(run, monkeypatch):
+    # Compile the PostgreSQL statement without a server: capture it instead of executing it
+    captured = []
+
+    class NoRows:
+        def first(self):
+            return None
+
+        def scalar_one_or_none(self):
+            return None
+
+    async def compile_only(db):
+        async def execute(statement, *args, **kwargs):
+            captured.append(str(statement.compile(dialect=postgresql.dialect())))
+            return NoRows()
+        monkeypatch.setattr(db, "execute", execute)
+        monkeypatch.setattr(crud_book_issue, "is_postgres", lambda db: True)
+        with pytest.raises(HTTPException) as refused:
+            await crud_book_issue.return_book_issue(db, 1)
+        return refused.value.status_code
+
+    assert run(compile_only) == 404
+    statement = " ".join(captured[0].split())
+    assert statement.startswith("WITH returned AS (UPDATE book_issues SET")
+    assert "restocked AS (UPDATE books SET" in statement
+    # The refusal is explained by a second query only because nothing matched
+    assert len(captured) == 2
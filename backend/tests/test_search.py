@@ -0,0 +1,36 @@
+from app.crud.crud_book import _highlight
+from tests.factories import create_book
+
+
+def search(client, q: str, **params) -> dict:
+    response = client.get("/api/v1/books/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_results_are_ranked_with_title_matches_first(client):
+    create_book(client, 1, title="A History of Rome", author="Beard", category="Classics")
+    create_book(client, 2, title="Dune", author="Herbert", category="History")
+    found = search(client, "hist")
+
+    assert found["total"] == 2
+    assert [result["title"] for result in found["results"]] == ["A History of Rome", "Dune"]
+    assert found["results"][0]["highlight"] == "A <mark>History</mark> of Rome · Beard · Classics"
+
+
+def test_highlight_escapes_the_book_text(client):
+    create_book(client, 1, title="<script>alert(1)</script> & Tom", author="O'Neil <b>", category=None)
+    highlight = search(client, "script")["results"][0]["highlight"]
+
+    assert highlight == "&lt;<mark>script</mark>&gt;alert(1)&lt;/<mark>script</mark>&gt; &amp; Tom · O'Neil &lt;b&gt;"
+
+
+def test_highlight_leaves_no_markup_from_the_text_even_where_tokens_match_entity_names():
+    assert _highlight("Fish & Chips <lt>", ["amp", "lt", "fish"]) == "<mark>Fish</mark> &amp; Chips &lt;<mark>lt</mark>&gt;"
+
+
+def test_every_word_must_match(client):
+    create_book(client, 1, title="Dune", author="Herbert")
+    create_book(client, 2, title="Dune Messiah", author="Herbert")
+    assert [result["title"] for result in search(client, "dune mess")["results"]] == ["Dune Messiah"]
+    assert search(client, "!!!")["total"] == 0
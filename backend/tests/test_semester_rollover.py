@@ -0,0 +1,65 @@
+import pytest
+
+from app import cli
+from tests.factories import create_student
+
+
+@pytest.fixture
+def cohort(client):
+    # CS: semesters 3, 3, 12; EE: semester 3
+    for number, (department, semester) in enumerate([("CS", 3), ("CS", 3), ("CS", 12), ("EE", 3)]):
+        create_student(client, number, department=department, semester=semester)
+
+
+def rollover(client, **body) -> dict:
+    response = client.post("/api/v1/students/semester-rollover", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def semesters(client, **params) -> list[int]:
+    students = client.get("/api/v1/students/", params={"limit": 100, **params}).json()["students"]
+    return [student["semester"] for student in students]
+
+
+def test_advance_skips_students_in_the_last_semester(client, cohort):
+    result = rollover(client, department="cs", advance_by=1)
+
+    assert result == {"matched": 3, "updated": 2, "skipped_at_max": 1, "dry_run": False}
+    assert semesters(client, department="CS") == [4, 4, 12]
+    assert semesters(client, department="EE") == [3]
+
+
+def test_set_to_counts_students_already_there_as_unchanged(client, cohort):
+    result = rollover(client, semester=3, set_to=3)
+    assert result == {"matched": 3, "updated": 0, "skipped_at_max": 0, "dry_run": False}
+
+    assert rollover(client, semester=12, set_to=1)["updated"] == 1
+    assert sorted(semesters(client)) == [1, 3, 3, 3]
+
+
+def test_dry_run_changes_nothing(client, cohort):
+    result = rollover(client, semester=3, advance_by=2, dry_run=True)
+    assert result == {"matched": 3, "updated": 3, "skipped_at_max": 0, "dry_run": True}
+    assert sorted(semesters(client)) == [3, 3, 3, 12]
+
+
+@pytest.mark.parametrize("body", [{}, {"advance_by": 1, "set_to": 2}, {"advance_by": 0}, {"set_to": 13}])
+def test_exactly_one_valid_operation_is_required(client, body):
+    assert client.post("/api/v1/students/semester-rollover", json=body).status_code == 422
+
+
+def test_cli(client, cohort, capsys):
+    assert cli.main(["semester-rollover", "--department", "EE", "--advance-by", "1", "--dry-run"]) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "[dry run] matched=1 updated=1 skipped_at_max=0"
+
+    assert cli.main(["semester-rollover", "--semester", "3", "--advance-by", "1"]) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "matched=3 updated=3 skipped_at_max=0"
+    assert sorted(semesters(client)) == [4, 4, 4, 12]
+
+
+def test_cli_rejects_invalid_arguments(capsys):
+    assert cli.main(["semester-rollover", "--set-to", "13"]) == 2
+    assert capsys.readouterr().err.startswith("Invalid arguments:")
+    with pytest.raises(SystemExit):
+        cli.main(["semester-rollover", "--advance-by", "1", "--set-to", "2"])
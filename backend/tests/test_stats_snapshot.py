@@ -0,0 +1,86 @@
+import asyncio
+
+from app.core.cache import Snapshot
+
+
+class Loader:
+    """Counts its calls and returns the call number once `release` is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return call
+
+
+def test_waiters_get_the_refresh_even_if_the_caller_that_started_it_is_cancelled():
+    async def main():
+        snapshot, load = Snapshot(ttl_seconds=60), Loader()
+        starter = asyncio.create_task(snapshot.get(load))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(snapshot.get(load, max_age=0)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        starter.cancel()
+        await asyncio.sleep(0)
+        load.release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert starter.cancelled()
+        assert results == [(1, 0.0)] * 3
+        assert load.calls == 1
+        assert (await snapshot.get(load))[0] == 1  # Stored for later callers too
+
+    asyncio.run(main())
+
+
+def test_default_callers_get_the_old_value_while_max_age_callers_wait():
+    async def main():
+        now = [0.0]
+        snapshot, load = Snapshot(ttl_seconds=10, clock=lambda: now[0]), Loader()
+        load.release.set()
+        await snapshot.get(load)
+        load.release.clear()
+        now[0] = 11.0
+
+        refresh = asyncio.create_task(snapshot.get(load))
+        await asyncio.sleep(0)
+        assert await snapshot.get(load) == (1, 11.0)
+        waiter = asyncio.create_task(snapshot.get(load, max_age=0))
+        await asyncio.sleep(0)
+        load.release.set()
+
+        assert await refresh == (2, 0.0)
+        assert await waiter == (2, 0.0)
+        assert load.calls == 2
+
+    asyncio.run(main())
+
+
+def test_a_failed_refresh_fails_its_waiters_and_the_next_call_retries():
+    async def main():
+        snapshot, attempts = Snapshot(ttl_seconds=60), []
+
+        async def load():
+            attempts.append(None)
+            await asyncio.sleep(0)
+            if len(attempts) == 1:
+                raise RuntimeError("database down")
+            return "figures"
+
+        results = await asyncio.gather(snapshot.get(load), snapshot.get(load), return_exceptions=True)
+        assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+        assert await snapshot.get(load) == ("figures", 0.0)
+
+    asyncio.run(main())
+
+
+def test_collection_stats_endpoint(client):
+    response = client.get("/api/v1/stats/collection", params={"max_age": 0})
+    assert response.status_code == 200
+    assert response.headers["Age"] == "0"
+    assert response.json()["total_books"] == 0
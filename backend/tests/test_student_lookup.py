@@ -0,0 +1,89 @@
+from app.core.cache import LocalInvalidationBus
+from app.services.catalog_cache import StudentIdentifierCache, student_lookup_cache
+from tests.factories import create_book, create_student, due_in
+
+
+def issue(client, book: dict, student: dict) -> dict:
+    response = client.post("/api/v1/issues/", json={"book_id": book["id"], "student_id": student["id"], "expected_return_date": due_in(7)})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def borrower_of(client, identifier: str) -> set[int]:
+    """Whose active loans an identifier brings up at the issue desk."""
+    response = client.get(f"/api/v1/students/{identifier}/issued-books")
+    assert response.status_code == 200, response.text
+    return {loan["student_id"] for loan in response.json()}
+
+
+def test_new_student_whose_id_was_another_students_roll_number(client):
+    book = create_book(client, 1)
+    first = create_student(client, 1, roll_number="2")
+    issue(client, book, first)
+    assert borrower_of(client, "2") == {first["id"]}  # No student 2 yet: the roll number matches, and is cached
+
+    second = create_student(client, 2)
+    issue(client, book, second)
+    assert second["id"] == 2
+    assert borrower_of(client, "2") == {second["id"]}  # An ID match wins
+
+
+def test_updated_phone_that_is_another_students_roll_number(client):
+    book = create_book(client, 1)
+    first, second = create_student(client, 1), create_student(client, 2, roll_number="9876543210")
+    for student in (first, second):
+        issue(client, book, student)
+    assert borrower_of(client, "9876543210") == {second["id"]}
+
+    # Now both match; the lower ID is preferred, as without the cache
+    assert client.put(f"/api/v1/students/{first['id']}/", json={"phone": "9876543210"}).status_code == 200
+    assert borrower_of(client, "9876543210") == {first["id"]}
+
+
+def test_imported_students_replace_stale_resolutions(client):
+    book = create_book(client, 1)
+    first = create_student(client, 1, roll_number="2")
+    issue(client, book, first)
+    assert borrower_of(client, "2") == {first["id"]}
+
+    row = '{"name": "N", "roll_number": "R2", "department": "CS", "semester": 1, "phone": "9222222222", "email": "n@example.com"}\n'
+    report = client.post("/api/v1/students/import", content=row, headers={"content-type": "application/x-ndjson"}).json()
+    assert report["imported"] == 1
+    assert client.get("/api/v1/students/2/issued-books").json() == []
+    assert student_lookup_cache.get("2") == 2
+
+
+def test_forgotten_identifiers_are_dropped_by_other_workers_too():
+    bus = LocalInvalidationBus()
+    caches = [StudentIdentifierCache(maxsize=10, ttl_seconds=60, bus=bus) for _ in range(2)]
+    for cache in caches:
+        cache.put("2", 1)
+        cache.put("R1", 1)
+
+    caches[0].forget(["2"])
+    assert [(cache.get("2"), cache.get("R1")) for cache in caches] == [(None, 1), (None, 1)]
+
+
+def test_each_identifier_finds_the_student_and_only_their_active_loans(client):
+    books = [create_book(client, number) for number in range(3)]
+    student, other = create_student(client, 1), create_student(client, 2)
+    loans = [issue(client, book, student) for book in books[:2]]
+    issue(client, books[2], other)
+    assert client.put(f"/api/v1/issues/{loans[0]['id']}/return").status_code == 200
+
+    for identifier in (str(student["id"]), student["roll_number"], student["email"], student["phone"]):
+        response = client.get(f"/api/v1/students/{identifier}/issued-books")
+        assert [loan["id"] for loan in response.json()] == [loans[1]["id"]], identifier
+        assert response.json()[0]["book"]["id"] == books[1]["id"]
+
+
+def test_student_without_loans_gets_an_empty_list(client):
+    student = create_student(client, 1)
+    assert client.get(f"/api/v1/students/{student['roll_number']}/issued-books").json() == []
+
+
+def test_unknown_identifiers_are_404(client):
+    create_student(client, 1)
+    # Non-ASCII digits and numbers beyond an INTEGER id are roll numbers / phones, not IDs
+    for identifier in ("R404", "nobody@example.com", "١", str(2**40)):
+        assert client.get(f"/api/v1/students/{identifier}/issued-books").status_code == 404, identifier
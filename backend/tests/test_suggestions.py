@@ -0,0 +1,68 @@
+from app.core.cache import LocalInvalidationBus
+from app.services.suggestion_index import PrefixIndex, book_suggestions, load_suggestion_indexes
+from tests.factories import create_book, create_student
+
+
+def suggest(client, kind: str, prefix: str, **params) -> list[str]:
+    response = client.get(f"/api/v1/{kind}/suggest", params={"prefix": prefix, **params})
+    assert response.status_code == 200, response.text
+    return [suggestion["label"] for suggestion in response.json()["suggestions"]]
+
+
+def test_every_typed_word_is_a_prefix_of_some_word(client):
+    create_book(client, 1, title="Harry Potter and the Goblet of Fire", author="J. K. Rowling")
+    create_book(client, 2, title="Pottery for Beginners", author="Harriet Smith")
+    create_book(client, 3, title="Dune", author="Frank Herbert")
+
+    assert sorted(suggest(client, "books", "pot harr")) == ["Harry Potter and the Goblet of Fire", "Pottery for Beginners"]
+    assert suggest(client, "books", "  POT   row ") == ["Harry Potter and the Goblet of Fire"]
+    assert suggest(client, "books", "herb") == ["Dune"]
+    assert suggest(client, "books", "xyz") == []
+
+
+def test_limit_stops_the_walk(client):
+    for number in range(5):
+        create_book(client, number, title=f"Algebra volume {number}")
+    assert len(suggest(client, "books", "alg", limit=3)) == 3
+
+
+def test_writes_keep_the_index_current(client):
+    book = create_book(client, 1, title="Dune")
+    assert client.put(f"/api/v1/books/{book['id']}", json={"title": "Children of Dune"}).status_code == 200
+    assert suggest(client, "books", "child") == ["Children of Dune"]
+    assert client.delete(f"/api/v1/books/{book['id']}").status_code == 204
+    assert suggest(client, "books", "dune") == []
+
+
+def test_students_by_name_or_roll_number(client):
+    create_student(client, 1, name="Ana Lopez", roll_number="CS2021-001")
+    create_student(client, 2, name="Anand Rao", roll_number="EE2021-002")
+    response = client.get("/api/v1/students/suggest", params={"prefix": "cs2021"}).json()
+
+    assert response["suggestions"] == [{"id": 1, "label": "Ana Lopez", "detail": "CS2021-001"}]
+    assert sorted(suggest(client, "students", "ana")) == ["Ana Lopez", "Anand Rao"]
+
+
+def test_imported_books_are_suggested(client):
+    body = "title,author,isbn,num_copies_total\nThe Hobbit,Tolkien,9780261102217,1\n"
+    assert client.post("/api/v1/books/import", content=body, headers={"content-type": "text/csv"}).json()["imported"] == 1
+    assert suggest(client, "books", "tolk") == ["The Hobbit"]
+
+
+def test_startup_load_reads_the_catalog(client, run):
+    create_book(client, 1, title="Dune")
+    book_suggestions.load([])
+    assert suggest(client, "books", "dune") == []
+    run(load_suggestion_indexes)
+    assert suggest(client, "books", "dune") == ["Dune"]
+
+
+def test_changes_reach_the_indexes_of_other_workers():
+    bus = LocalInvalidationBus()
+    indexes = [PrefixIndex("books", bus) for _ in range(2)]
+    indexes[0].upsert(1, "Dune", "Herbert", ["Dune", "Herbert"])
+    indexes[0].upsert_many([(2, "Emma", "Austen", ["Emma", "Austen"])])
+    assert [len(index.search("dune")) + len(index.search("emma")) for index in indexes] == [2, 2]
+
+    indexes[1].remove(1)
+    assert [index.search("dune") for index in indexes] == [[], []]